@@ -42,9 +42,9 @@ SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "data/craftsaver.db")
 init_db(db_path=SQLITE_DB_PATH)
 startup_logger.info(f"Database config initialized (Path: {SQLITE_DB_PATH})")
 
-# 3. 初始化腾讯云 COS
-from src.services.cos import init_cos
-init_cos()
+# 3. 初始化对象存储（STORAGE_BACKEND=cos / local）
+from src.services.storage import init_storage
+init_storage()
 
 # 应用配置
 APP_PORT = int(os.getenv("APP_PORT", "8002"))
@@ -67,34 +67,31 @@ async def startup_event():
     """启动时运行后台任务"""
     # 初始化数据库表
     try:
-        from src.services.database import DatabaseService
-        conn = DatabaseService.get_connection()
-        cursor = conn.cursor()
-
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        sql_dir = os.path.join(base_dir, "src/sql")
-
-        sql_files = [
-            os.path.join(sql_dir, "create_unified_messages.sql"),
-            os.path.join(sql_dir, "create_user_mappings.sql")
-        ]
-
-        for sql_file in sql_files:
-            if os.path.exists(sql_file):
-                with open(sql_file, "r") as f:
-                    sql_script = f.read()
-                    cursor.executescript(sql_script)
-                    startup_logger.info(f"Executed SQL: {sql_file}")
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        from src.services.database import init_schema
+        init_schema()
         startup_logger.info("Database tables initialized.")
     except Exception as e:
         startup_logger.error(f"Failed to init database: {e}")
 
-    # 启动 WeCom 轮询
-    asyncio.create_task(run_wecom_polling())
+    # 预热消息去重过滤器
+    try:
+        from src.services.database import seed_dedup_filter
+        seed_dedup_filter()
+    except Exception as e:
+        startup_logger.error(f"Failed to seed dedup filter: {e}")
+
+    # 建立媒体缓存索引（扫描目录，超出容量时淘汰）
+    try:
+        from src.services.media_cache import media_cache
+        await asyncio.to_thread(media_cache.load)
+    except Exception as e:
+        startup_logger.error(f"Failed to load media cache: {e}")
+
+    # 启动消息分发 worker 与 WeCom 轮询（分发队列满时轮询暂停）
+    from src.services.dispatcher import get_dispatcher
+    dispatcher = get_dispatcher()
+    await dispatcher.start()
+    dispatcher.add_producer(asyncio.create_task(run_wecom_polling()))
 
     # 打印访问地址
     startup_logger.info(f"API 文档: http://localhost:{APP_PORT}/scalar")
@@ -103,7 +100,21 @@ async def startup_event():
 
 async def shutdown_event():
     """关闭时清理资源"""
-    pass
+    from src.services.binding_service import binding_cache
+    from src.services.craft_writer import close_daily_writer
+    from src.services.database import close_db
+    from src.services.dispatcher import close_dispatcher
+    from src.services.link_preview import close_link_preview_service
+    from src.services.media_transform import media_transform
+    from src.services.upload_service import close_upload_service
+    # 先停止拉取并处理完（或保存）队列中的消息，再关闭其依赖的写入器与连接
+    await close_dispatcher()
+    await close_daily_writer()
+    await close_link_preview_service()
+    binding_cache.close()
+    await asyncio.to_thread(close_upload_service)
+    await asyncio.to_thread(media_transform.shutdown)
+    await asyncio.to_thread(close_db)
 
 
 # 6. 创建 FastAPI 应用
@@ -137,11 +148,21 @@ app.add_middleware(
 )
 
 # 7. 注册路由
-from src.api.routers import wecom_router, craft_router, binding_router
+from src.api.routers import wecom_router, craft_router, binding_router, messages_router, stats_router, uploads_router
 
 app.include_router(wecom_router)
 app.include_router(craft_router)
 app.include_router(binding_router)
+app.include_router(messages_router)
+app.include_router(stats_router)
+app.include_router(uploads_router)
+
+# 本地存储后端：通过静态路由提供媒体访问
+from src.services.storage import STORAGE_LOCAL_MOUNT, LocalStorageBackend, get_storage
+from fastapi.staticfiles import StaticFiles
+
+if isinstance(get_storage(), LocalStorageBackend):
+    app.mount(STORAGE_LOCAL_MOUNT, StaticFiles(directory=get_storage().root), name="storage")
 
 
 @app.get("/")
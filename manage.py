@@ -0,0 +1,278 @@
+"""
+craftSaver 运维命令行
+
+用法:
+    python manage.py migrate-raw-data [--batch-size 500] [--train-dict] [--vacuum]
+    python manage.py payload-report
+    python manage.py media-report
+    python manage.py media-cache [--evict]
+    python manage.py link-previews [--purge]
+    python manage.py archive [--dry-run] [--no-vacuum] [--now 2024-06-30]
+    python manage.py partitions
+    python manage.py rebuild-stats
+    python manage.py export [--format ndjson|csv] [--gzip] [-o FILE] [--since ...] [--until ...]
+"""
+import argparse
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from src.utils.logger import setup_logging
+
+load_dotenv()
+setup_logging()
+logger = logging.getLogger("craftsaver.manage")
+
+
+def _init_db(args) -> str:
+    from src.services.database import init_db, init_schema
+
+    db_path = args.db or os.getenv("SQLITE_DB_PATH", "data/craftsaver.db")
+    init_db(db_path=db_path)
+    init_schema()
+    return db_path
+
+
+def _file_size(db_path: str) -> int:
+    """数据库文件（含 WAL）占用字节数"""
+    return sum(os.path.getsize(p) for p in (db_path, f"{db_path}-wal") if os.path.exists(p))
+
+
+def _print_json(data) -> None:
+    print(json.dumps(data, indent=2, ensure_ascii=False, default=str))
+
+
+def cmd_migrate_raw_data(args) -> None:
+    """将内联的 raw_data 迁移为旁路表中的压缩数据"""
+    from src.services import payload_store
+    from src.services.database import get_connection, transaction
+
+    db_path = _init_db(args)
+    size_before = _file_size(db_path)
+    with get_connection(readonly=True) as conn:
+        before = payload_store.storage_report(conn)
+
+    if args.train_dict:
+        with transaction() as conn:
+            payload_store.train_dict(conn, samples=args.dict_samples)
+        if payload_store.CODEC != "zstd" or not payload_store.RAW_DATA_ZSTD_DICT:
+            logger.warning("字典已训练，但需设置 RAW_DATA_CODEC=zstd 与 RAW_DATA_ZSTD_DICT=true 才会使用")
+
+    last_id = 0
+    migrated = 0
+    while True:
+        with transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, raw_data FROM unified_messages WHERE raw_data IS NOT NULL AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (last_id, args.batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            items = []
+            for row in rows:
+                try:
+                    items.append((row[0], json.loads(row[1])))
+                except ValueError:
+                    items.append((row[0], row[1]))
+            payload_store.save_payloads(conn, items)
+            conn.executemany("UPDATE unified_messages SET raw_data = NULL WHERE id = ?", [(row[0],) for row in rows])
+        last_id = rows[-1][0]
+        migrated += len(rows)
+        logger.info(f"已迁移 {migrated} 行 (last_id={last_id})")
+
+    if args.vacuum:
+        logger.info("执行 VACUUM ...")
+        with get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    with get_connection(readonly=True) as conn:
+        after = payload_store.storage_report(conn)
+    stored_delta = after["payload_stored_bytes"] - before["payload_stored_bytes"]
+    _print_json({
+        "migrated_rows": migrated,
+        "inline_bytes_before": before["inline_bytes"],
+        "compressed_bytes_written": stored_delta,
+        "bytes_saved": before["inline_bytes"] - after["inline_bytes"] - stored_delta,
+        "file_bytes_before": size_before,
+        "file_bytes_after": _file_size(db_path),
+        "codec": payload_store.CODEC,
+    })
+
+
+def cmd_payload_report(args) -> None:
+    """输出原始数据存储占用报告"""
+    from src.services import payload_store
+    from src.services.database import get_connection
+
+    db_path = _init_db(args)
+    with get_connection(readonly=True) as conn:
+        report = payload_store.storage_report(conn)
+    report["file_bytes"] = _file_size(db_path)
+    _print_json(report)
+
+
+def cmd_media_report(args) -> None:
+    """输出媒体去重报告"""
+    from src.services import media_store
+    from src.services.database import get_connection
+
+    _init_db(args)
+    with get_connection(readonly=True) as conn:
+        report = media_store.storage_report(conn)
+    _print_json(report)
+
+
+def cmd_media_cache(args) -> None:
+    """输出本地媒体缓存占用，可选立即按容量上限淘汰"""
+    from src.services.media_cache import media_cache
+
+    if args.evict:
+        media_cache.evict()
+    _print_json(media_cache.report())
+
+
+def cmd_link_previews(args) -> None:
+    """输出链接预览缓存报告，可选删除过期条目"""
+    from src.services import link_preview
+    from src.services.database import get_connection, transaction
+
+    _init_db(args)
+    purged = 0
+    if args.purge:
+        with transaction() as conn:
+            purged = link_preview.purge_expired(conn)
+    with get_connection(readonly=True) as conn:
+        report = link_preview.cache_report(conn)
+    report["purged"] = purged
+    _print_json(report)
+
+
+def cmd_archive(args) -> None:
+    """按保留策略把过期消息归档到按月分区"""
+    from datetime import datetime
+
+    from src.services import archive
+    from src.services.database import get_connection
+
+    _init_db(args)
+    now = datetime.fromisoformat(args.now) if args.now else None
+    with get_connection() as conn:
+        report = archive.archive_expired(conn, now=now, vacuum=not args.no_vacuum, dry_run=args.dry_run)
+    _print_json(report)
+
+
+def cmd_partitions(args) -> None:
+    """列出归档分区"""
+    from src.services import archive
+    from src.services.database import get_connection
+
+    _init_db(args)
+    with get_connection(readonly=True) as conn:
+        report = archive.partition_report(conn)
+    _print_json(report)
+
+
+def cmd_rebuild_stats(args) -> None:
+    """按主库与归档分区重建消息统计汇总"""
+    from src.services import stats
+    from src.services.database import get_connection
+
+    _init_db(args)
+    with get_connection() as conn:
+        buckets = stats.rebuild(conn)
+    _print_json({"buckets": buckets})
+
+
+def cmd_export(args) -> None:
+    """流式导出消息到文件或标准输出"""
+    import sys
+    from datetime import datetime
+
+    from src.services.export import export_stream
+
+    _init_db(args)
+    stream = export_stream(
+        args.format,
+        gzip=args.gzip,
+        source=args.source,
+        from_user=args.from_user,
+        msg_type=args.msg_type,
+        since=datetime.fromisoformat(args.since) if args.since else None,
+        until=datetime.fromisoformat(args.until) if args.until else None,
+        include_archive=args.include_archive,
+        include_raw=args.include_raw,
+    )
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="craftSaver management commands")
+    parser.add_argument("--db", default=None, help="SQLite 路径，默认读取 SQLITE_DB_PATH")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("migrate-raw-data", help="迁移内联 raw_data 到压缩旁路表")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--train-dict", action="store_true", help="迁移前训练 zstd 共享字典")
+    p.add_argument("--dict-samples", type=int, default=2000)
+    p.add_argument("--vacuum", action="store_true", help="迁移后 VACUUM 回收空间")
+    p.set_defaults(func=cmd_migrate_raw_data)
+
+    p = subparsers.add_parser("payload-report", help="原始数据存储占用报告")
+    p.set_defaults(func=cmd_payload_report)
+
+    p = subparsers.add_parser("media-report", help="媒体去重报告（按内容哈希跳过的上传）")
+    p.set_defaults(func=cmd_media_report)
+
+    p = subparsers.add_parser("media-cache", help="本地媒体缓存占用报告")
+    p.add_argument("--evict", action="store_true", help="立即按 MEDIA_CACHE_MAX_BYTES 淘汰最久未使用的文件")
+    p.set_defaults(func=cmd_media_cache)
+
+    p = subparsers.add_parser("link-previews", help="链接预览缓存报告")
+    p.add_argument("--purge", action="store_true", help="删除过期条目")
+    p.set_defaults(func=cmd_link_previews)
+
+    p = subparsers.add_parser("archive", help="按保留策略归档过期消息到按月分区")
+    p.add_argument("--dry-run", action="store_true", help="只输出归档计划")
+    p.add_argument("--no-vacuum", action="store_true", help="归档后不压实分区")
+    p.add_argument("--now", default=None, help="计算保留期的基准时间 (ISO 格式)，默认当前时间")
+    p.set_defaults(func=cmd_archive)
+
+    p = subparsers.add_parser("partitions", help="列出归档分区")
+    p.set_defaults(func=cmd_partitions)
+
+    p = subparsers.add_parser("rebuild-stats", help="重建消息统计汇总")
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = subparsers.add_parser("export", help="流式导出消息 (NDJSON / CSV)")
+    p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("-o", "--output", default=None, help="输出文件，默认标准输出")
+    p.add_argument("--source", default=None)
+    p.add_argument("--from-user", default=None)
+    p.add_argument("--msg-type", default=None)
+    p.add_argument("--since", default=None, help="起始时间 (ISO 格式，含)")
+    p.add_argument("--until", default=None, help="结束时间 (ISO 格式，不含)")
+    p.add_argument("--include-archive", action="store_true", help="包含已归档分区")
+    p.add_argument("--include-raw", action="store_true", help="附带原始数据")
+    p.set_defaults(func=cmd_export)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    finally:
+        from src.services.database import close_db
+        close_db()
+
+
+if __name__ == "__main__":
+    main()
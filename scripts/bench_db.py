@@ -0,0 +1,145 @@
+"""
+SQLite 写入 / 查询吞吐压测
+
+对比“每次查询新建连接 + rollback journal”（旧实现）与长连接池 + WAL
+（经单写线程 / 读线程池）的插入与查询吞吐。
+
+用法:
+    python scripts/bench_db.py -n 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_messages(n: int):
+    from src.models.chat_record import UnifiedMessage
+
+    now = int(time.time())
+    return [
+        UnifiedMessage(
+            msg_id=f"bench-{i}",
+            source="wecom",
+            msg_type="text",
+            content=f"bench message {i} " * 4,
+            from_user=f"user_{i % 20}",
+            create_time=now,
+            raw_data={"msgid": f"bench-{i}", "text": {"content": f"bench message {i}"}},
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_insert(db_path: str, msg) -> None:
+    """旧实现：每条消息新建连接，先查后插"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
+                       (msg.source, msg.msg_id))
+        if cursor.fetchone():
+            return
+        cursor.execute(
+            "INSERT INTO unified_messages (msg_id, source, msg_type, from_user, content, raw_data, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+            (msg.msg_id, msg.source, msg.msg_type, msg.from_user, msg.content,
+             json.dumps(msg.raw_data, ensure_ascii=False)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def legacy_lookup(db_path: str, msg) -> bool:
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute("SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
+                              (msg.source, msg.msg_id))
+        return cursor.fetchone() is not None
+    finally:
+        conn.close()
+
+
+def timed(label: str, n: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {n:>7} ops  {elapsed:7.2f}s  {n / elapsed:10.1f} ops/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite insert / lookup benchmark")
+    parser.add_argument("-n", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100, help="save_many 每页条数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from src.utils.logger import setup_logging
+    setup_logging()
+
+    from src.services import database
+    from src.services.database import DatabaseService
+
+    messages = build_messages(args.n)
+    workdir = tempfile.mkdtemp(prefix="craftsaver-db-bench-")
+
+    # 旧实现
+    legacy_db = os.path.join(workdir, "legacy.db")
+    database.init_db(db_path=legacy_db)
+    database.init_schema()
+    database.close_db()
+    with sqlite3.connect(legacy_db) as conn:
+        conn.execute("PRAGMA journal_mode = DELETE")
+    timed("legacy insert", args.n, lambda: [legacy_insert(legacy_db, m) for m in messages])
+    timed("legacy lookup", args.n, lambda: [legacy_lookup(legacy_db, m) for m in messages])
+
+    # 连接池 + WAL，经单写线程 / 读线程池
+    pooled_db = os.path.join(workdir, "pooled.db")
+    database.init_db(db_path=pooled_db)
+    database.init_schema()
+
+    async def _sequential(fn, items):
+        for item in items:
+            await fn(item)
+
+    async def _concurrent(fn, items):
+        await asyncio.gather(*(fn(item) for item in items))
+
+    timed("pooled insert", args.n,
+          lambda: asyncio.run(_sequential(DatabaseService.save_unified_message, messages)))
+    timed("pooled lookup", args.n,
+          lambda: asyncio.run(_sequential(DatabaseService.message_exists, messages)))
+    database.close_db()
+
+    concurrent_db = os.path.join(workdir, "concurrent.db")
+    database.init_db(db_path=concurrent_db)
+    database.init_schema()
+    timed("pooled insert (concurrent)", args.n,
+          lambda: asyncio.run(_concurrent(DatabaseService.save_unified_message, messages)))
+    timed("pooled lookup (concurrent)", args.n,
+          lambda: asyncio.run(_concurrent(DatabaseService.message_exists, messages)))
+    database.close_db()
+
+    # 整页批量落库（save_many）
+    batch_db = os.path.join(workdir, "batch.db")
+    database.init_db(db_path=batch_db)
+    database.init_schema()
+    pages = [messages[i:i + args.page_size] for i in range(0, len(messages), args.page_size)]
+    timed(f"save_many (page={args.page_size})", args.n,
+          lambda: asyncio.run(_sequential(DatabaseService.save_many, pages)))
+    timed("save_many (all duplicates)", args.n,
+          lambda: asyncio.run(_sequential(DatabaseService.save_many, pages)))
+    database.close_db()
+
+    print(f"workdir: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+消息格式化压测
+
+分别统计：
+- 纯 block 构建 (build_blocks)：媒体已解析，不做任何 I/O
+- 批量格式化 (format_batch)：媒体为本地文件，使用本地存储后端并发上传
+
+用法:
+    python scripts/bench_formatter.py -n 100000 --types text,link,image,file,video
+    python scripts/bench_formatter.py -n 2000 --media 200 --media-size 65536
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_messages(n: int, types: list, media_paths: list = None):
+    """合成消息；media_paths 为空时媒体消息使用 URL"""
+    from src.models.chat_record import UnifiedMessage
+
+    now = int(time.time())
+    messages = []
+    for i in range(n):
+        msg_type = types[i % len(types)]
+        raw_data = {"msgid": f"bench-{i}", "msgtype": msg_type}
+        if msg_type in ("image", "file", "video"):
+            if media_paths:
+                content = media_paths[i % len(media_paths)]
+            else:
+                content = f"https://cdn.example.com/media/{i}.bin"
+            if msg_type == "file":
+                raw_data["file"] = {"filename": f"report-{i}.pdf"}
+        elif msg_type == "link":
+            content = f"https://example.com/articles/{i}"
+        else:
+            content = f"bench message #{i} " + "lorem ipsum " * 8
+        messages.append(UnifiedMessage(
+            msg_id=f"bench-{now}-{i}",
+            source="wecom",
+            msg_type=msg_type,
+            content=content,
+            from_user="bench_user",
+            create_time=now,
+            raw_data=raw_data,
+        ))
+    return messages
+
+
+def bench_build(messages) -> float:
+    from src.services.formatter import build_blocks, resolve_media
+
+    # URL 媒体的解析不涉及 I/O，预先完成，只计构建耗时
+    async def _resolve_all():
+        return [await resolve_media(msg) for msg in messages]
+
+    resolved = asyncio.run(_resolve_all())
+    start = time.perf_counter()
+    for msg, media in zip(messages, resolved):
+        build_blocks(msg, media)
+    return time.perf_counter() - start
+
+
+def bench_batch(messages, batch_size: int) -> float:
+    from src.services.formatter import get_formatter
+    from src.services.upload_service import close_upload_service
+
+    async def _run():
+        formatter = get_formatter()
+        start = time.perf_counter()
+        for i in range(0, len(messages), batch_size):
+            await formatter.format_batch(messages[i:i + batch_size])
+        return time.perf_counter() - start
+
+    try:
+        return asyncio.run(_run())
+    finally:
+        close_upload_service()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CraftSaver message formatter benchmark")
+    parser.add_argument("-n", type=int, default=100000, help="合成消息条数")
+    parser.add_argument("--types", default="text,link,image,file,video", help="消息类型，逗号分隔")
+    parser.add_argument("--media", type=int, default=0, help="本地媒体文件数，>0 时额外测试批量格式化（含上传）")
+    parser.add_argument("--media-size", type=int, default=65536, help="单个媒体文件字节数")
+    parser.add_argument("--batch-size", type=int, default=50, help="format_batch 每批条数")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="craftsaver-bench-")
+    # 必须在导入 src.services 之前设置
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_LOCAL_DIR"] = os.path.join(work_dir, "storage")
+    os.environ["IMAGE_SAVE_DIR"] = os.path.join(work_dir, "images")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from src.utils.logger import setup_logging
+    setup_logging()
+
+    types = args.types.split(",")
+    messages = build_messages(args.n, types)
+    elapsed = bench_build(messages)
+    print(f"messages:     {len(messages)}")
+    print(f"types:        {','.join(types)}")
+    print(f"build:        {elapsed:.3f}s ({len(messages) / elapsed:.0f} msgs/sec, "
+          f"{elapsed / len(messages) * 1e6:.2f} us/msg)")
+
+    if args.media > 0:
+        from src.services.database import init_db, init_schema
+        from src.services.storage import init_storage
+
+        init_db(db_path=os.path.join(work_dir, "bench.db"))
+        init_schema()
+        init_storage()
+
+        media_dir = os.environ["IMAGE_SAVE_DIR"]
+        os.makedirs(media_dir, exist_ok=True)
+        media_paths = []
+        for i in range(args.media):
+            path = os.path.join(media_dir, f"bench-{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.media_size))
+            media_paths.append(path)
+
+        media_types = [t for t in types if t in ("image", "file", "video")] or ["file"]
+        media_messages = build_messages(args.media, media_types, media_paths)
+        elapsed = bench_batch(media_messages, args.batch_size)
+        print(f"batch:        {len(media_messages)} media msgs, batch size {args.batch_size}, "
+              f"{elapsed:.2f}s ({len(media_messages) / elapsed:.1f} msgs/sec)")
+    print(f"work dir:     {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
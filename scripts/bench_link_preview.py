@@ -0,0 +1,78 @@
+"""
+链接预览压测
+
+启动本地模拟网页服务，对 N 条链接消息（共 --unique 个不同页面）做两轮预览：
+第一轮抓取页面，第二轮应全部命中缓存。输出耗时、实际抓取次数与峰值并发。
+
+用法:
+    python scripts/bench_link_preview.py -n 500 --unique 50 --concurrency 8 --latency-ms 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def run_round(urls, concurrency: int):
+    from src.services.link_preview import LinkPreviewService
+
+    # 模拟网页服务在本机，需放开内网地址检查
+    service = LinkPreviewService(concurrency=concurrency, fetch=True, allow_private=True)
+    start = time.perf_counter()
+    previews = await asyncio.gather(*(service.preview(url) for url in urls))
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed, previews, service.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CraftSaver link preview benchmark")
+    parser.add_argument("-n", type=int, default=500, help="链接消息条数")
+    parser.add_argument("--unique", type=int, default=50, help="不同页面数")
+    parser.add_argument("--concurrency", type=int, default=8, help="抓取并发上限")
+    parser.add_argument("--latency-ms", type=float, default=50, help="模拟页面响应延迟")
+    parser.add_argument("--port", type=int, default=9200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from src.utils.logger import setup_logging
+    setup_logging()
+
+    from src.sim.craft_server import BackgroundServer
+    from src.sim.link_server import FakeLinkState, create_app
+    from src.services.database import init_db, init_schema
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="craftsaver-bench-"), "bench.db")
+    init_db(db_path=db_path)
+    init_schema()
+
+    state = FakeLinkState(latency_ms=args.latency_ms)
+    server = BackgroundServer(create_app(state), port=args.port).start()
+    base = server.base_url
+    # 同一页面的不同写法（跟踪参数、片段）规范化后是同一个缓存键
+    urls = [
+        f"{base}/pages/{i % args.unique}" + ("?utm_source=wecom" if i % 3 == 1 else "#top" if i % 3 == 2 else "")
+        for i in range(args.n)
+    ]
+    try:
+        first, previews, first_stats = asyncio.run(run_round(urls, args.concurrency))
+        fetched = state.snapshot()
+        second, _, second_stats = asyncio.run(run_round(urls, args.concurrency))
+        total = state.snapshot()
+    finally:
+        server.stop()
+
+    print(f"links:         {len(urls)} ({args.unique} unique pages)")
+    print(f"round 1:       {first:.2f}s, {fetched['requests']} page fetches, "
+          f"max concurrent {fetched['max_active']} (limit {args.concurrency}), {first_stats}")
+    print(f"round 2:       {second:.2f}s, {total['requests'] - fetched['requests']} page fetches, {second_stats}")
+    print(f"sample:        {previews[0].title} / {previews[0].description} / {previews[0].image_url}")
+    print(f"database:      {db_path}")
+
+
+if __name__ == "__main__":
+    main()
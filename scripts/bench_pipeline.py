@@ -0,0 +1,148 @@
+"""
+端到端吞吐压测
+
+启动本地模拟 Craft 服务，将 N 条合成 UnifiedMessage 送入 process_message，
+统计吞吐 (msgs/sec) 与单条延迟 p50 / p99。
+
+用法:
+    python scripts/bench_pipeline.py -n 500 --concurrency 20 --latency-ms 30 --rate-429 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def build_messages(n: int, users: int, types: list):
+    from src.models.chat_record import UnifiedMessage
+
+    now = int(time.time())
+    messages = []
+    for i in range(n):
+        msg_type = types[i % len(types)]
+        if msg_type == "link":
+            content = f"https://example.com/articles/{i}"
+        else:
+            content = f"bench message #{i} " + "lorem ipsum " * 8
+        messages.append(UnifiedMessage(
+            msg_id=f"bench-{now}-{i}",
+            source="wecom",
+            msg_type=msg_type,
+            content=content,
+            from_user=f"bench_user_{i % users}",
+            create_time=now,
+            raw_data={"msgid": f"bench-{now}-{i}", "msgtype": msg_type},
+        ))
+    return messages
+
+
+async def run_bench(messages, concurrency: int):
+    from src.services.craft_writer import close_daily_writer
+    from src.services.message_processor import process_message
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def _one(msg):
+        async with semaphore:
+            start = time.perf_counter()
+            await process_message(msg)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(msg) for msg in messages))
+    # daily 模式下消息缓冲后即返回，计时包含缓冲批次的写入
+    await close_daily_writer()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CraftSaver end-to-end pipeline benchmark")
+    parser.add_argument("-n", type=int, default=200, help="合成消息条数")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=5, help="模拟的发送者数量")
+    parser.add_argument("--types", default="text,link", help="消息类型，逗号分隔")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--request-interval", type=float, default=0.0,
+                        help="Craft 请求间隔 (CRAFT_REQUEST_INTERVAL)")
+    parser.add_argument("--group-mode", default="flat", choices=["flat", "daily"],
+                        help="绑定写入方式：flat 逐条追加，daily 按天子页面批量写入")
+    parser.add_argument("--db", default=None, help="SQLite 路径，默认使用临时文件")
+    args = parser.parse_args()
+
+    # 必须在导入 src.services 之前设置
+    os.environ["CRAFT_API_BASE_URL"] = f"http://127.0.0.1:{args.port}/links"
+    os.environ["CRAFT_REQUEST_INTERVAL"] = str(args.request_interval)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # 合成链接指向外网，不抓取页面
+    os.environ.setdefault("LINK_PREVIEW_FETCH", "false")
+
+    from src.utils.logger import setup_logging
+    setup_logging()
+
+    from src.sim.craft_server import BackgroundServer, FakeCraftState, create_app
+    from src.services.database import init_db, init_schema
+    from src.services.binding_service import BindingService
+    from src.models.binding import BindingCreate
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="craftsaver-bench-"), "bench.db")
+    init_db(db_path=db_path)
+    init_schema()
+
+    async def _create_bindings():
+        for i in range(args.users):
+            await BindingService.create_binding(BindingCreate(
+                wecom_openid=f"bench_user_{i}",
+                craft_link_id="bench-link",
+                craft_document_id=f"bench-doc-{i}",
+                craft_token="pdk_bench",
+                display_name=f"Bench {i}",
+                group_mode=args.group_mode,
+            ))
+
+    asyncio.run(_create_bindings())
+
+    state = FakeCraftState(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+    )
+    server = BackgroundServer(create_app(state), port=args.port).start()
+    try:
+        messages = build_messages(args.n, args.users, args.types.split(","))
+        elapsed, latencies = asyncio.run(run_bench(messages, args.concurrency))
+    finally:
+        server.stop()
+
+    snapshot = state.snapshot()
+    print(f"messages:     {len(messages)}")
+    print(f"concurrency:  {args.concurrency}")
+    print(f"elapsed:      {elapsed:.2f}s")
+    print(f"throughput:   {len(messages) / elapsed:.1f} msgs/sec")
+    print(f"group mode:   {args.group_mode}")
+    print(f"latency p50:  {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p99:  {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"craft stats:  {snapshot['stats']}")
+    print(f"database:     {db_path}")
+
+
+if __name__ == "__main__":
+    main()
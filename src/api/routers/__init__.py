@@ -5,9 +5,15 @@ API 路由分组模块
 from .wecom import wecom_router
 from .craft import craft_router
 from .binding import binding_router
+from .messages import messages_router
+from .stats import stats_router
+from .uploads import uploads_router
 
 __all__ = [
     "wecom_router",
     "craft_router",
     "binding_router",
+    "messages_router",
+    "stats_router",
+    "uploads_router",
 ]
\ No newline at end of file
@@ -16,14 +16,14 @@ binding_router = APIRouter(prefix="/bindings", tags=["Bindings"])
 @binding_router.get("", response_model=list[BindingResponse])
 async def list_bindings():
     """获取所有用户绑定"""
-    bindings = BindingService.get_all_bindings()
+    bindings = await BindingService.get_all_bindings()
     return bindings
 
 
 @binding_router.get("/{openid}", response_model=BindingResponse)
 async def get_binding(openid: str):
     """根据企微 OpenID 获取绑定"""
-    binding = BindingService.get_binding_by_openid(openid)
+    binding = await BindingService.get_binding_by_openid(openid)
     if not binding:
         raise HTTPException(status_code=404, detail="绑定不存在")
     return binding
@@ -41,7 +41,7 @@ async def create_binding(create: BindingCreate):
     if not ok:
         raise HTTPException(status_code=400, detail=f"Craft 验证失败: {msg}")
 
-    binding = BindingService.create_binding(create)
+    binding = await BindingService.create_binding(create)
     if not binding:
         raise HTTPException(status_code=500, detail="创建绑定失败")
     return binding
@@ -51,7 +51,7 @@ async def create_binding(create: BindingCreate):
 async def update_binding(openid: str, create: BindingCreate):
     """更新用户绑定"""
     create.wecom_openid = openid
-    binding = BindingService.create_binding(create)
+    binding = await BindingService.create_binding(create)
     if not binding:
         raise HTTPException(status_code=500, detail="更新绑定失败")
     return binding
@@ -60,7 +60,7 @@ async def update_binding(openid: str, create: BindingCreate):
 @binding_router.delete("/{openid}")
 async def delete_binding(openid: str):
     """删除用户绑定"""
-    success = BindingService.delete_binding(openid)
+    success = await BindingService.delete_binding(openid)
     if not success:
         raise HTTPException(status_code=404, detail="绑定不存在或删除失败")
     return {"status": "success", "message": "绑定已删除"}
@@ -0,0 +1,94 @@
+"""
+消息查询路由
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from src.models.message import MessagePage
+from src.services.database import DatabaseService
+from src.services.export import EXPORT_FORMATS, export_stream
+from src.services.search import SearchService
+
+logger = logging.getLogger(__name__)
+
+messages_router = APIRouter(prefix="/messages", tags=["Messages"])
+
+
+@messages_router.get("", response_model=MessagePage)
+async def list_messages(
+    from_user: Optional[str] = Query(None, description="发送者"),
+    msg_type: Optional[str] = Query(None, description="消息类型"),
+    source: Optional[str] = Query(None, description="消息来源"),
+    since: Optional[datetime] = Query(None, description="起始时间（含）"),
+    until: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    include_archive: bool = Query(False, description="包含已归档到分区的消息"),
+):
+    """按时间倒序浏览消息历史"""
+    try:
+        return await DatabaseService.list_messages(
+            from_user=from_user, msg_type=msg_type, source=source,
+            since=since, until=until, limit=limit, cursor=cursor,
+            include_archive=include_archive,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@messages_router.get("/search", response_model=MessagePage)
+async def search_messages(
+    q: str = Query(..., min_length=1, description="检索词，空格分隔的多个词为 AND"),
+    source: Optional[str] = Query(None, description="消息来源"),
+    from_user: Optional[str] = Query(None, description="发送者"),
+    msg_type: Optional[str] = Query(None, description="消息类型"),
+    since: Optional[datetime] = Query(None, description="起始时间（含）"),
+    until: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（仅在索引未变化时有效）"),
+):
+    """
+    全文检索已存档消息（内容、链接标题、文件名），按相关度排序
+
+    相关度分数随新消息写入 / 归档变化，翻页期间索引有变化时结果可能漏掉或重复，需从第一页重新检索。
+    """
+    try:
+        return await SearchService.search(
+            q, source=source, from_user=from_user, msg_type=msg_type,
+            since=since, until=until, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@messages_router.get("/export")
+async def export_messages(
+    fmt: str = Query("ndjson", alias="format", description="ndjson 或 csv"),
+    gzip: bool = Query(False, description="gzip 压缩输出"),
+    source: Optional[str] = Query(None, description="消息来源"),
+    from_user: Optional[str] = Query(None, description="发送者"),
+    msg_type: Optional[str] = Query(None, description="消息类型"),
+    since: Optional[datetime] = Query(None, description="起始时间（含）"),
+    until: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    include_archive: bool = Query(False, description="包含已归档到分区的消息"),
+    include_raw: bool = Query(False, description="附带解压后的原始数据"),
+):
+    """流式导出消息（按时间升序），内存占用与导出规模无关"""
+    try:
+        stream = export_stream(
+            fmt, gzip=gzip, source=source, from_user=from_user, msg_type=msg_type,
+            since=since, until=until, include_archive=include_archive, include_raw=include_raw,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"messages-{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream,
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,34 @@
+"""
+消息统计路由
+"""
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from src.models.message import StatsResponse
+from src.services.stats import StatsService
+
+logger = logging.getLogger(__name__)
+
+stats_router = APIRouter(prefix="/stats", tags=["Stats"])
+
+
+@stats_router.get("", response_model=StatsResponse)
+async def get_stats(
+    group_by: str = Query("day", description="分组维度，逗号分隔：day, source, from_user, msg_type；为空则只返回总数"),
+    source: Optional[str] = Query(None, description="消息来源"),
+    from_user: Optional[str] = Query(None, description="发送者"),
+    msg_type: Optional[str] = Query(None, description="消息类型"),
+    since: Optional[date] = Query(None, description="起始日期（含）"),
+    until: Optional[date] = Query(None, description="结束日期（不含）"),
+):
+    """按天 / 发送者 / 类型汇总消息数（读取增量维护的汇总表）"""
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    try:
+        return await StatsService.query(
+            dimensions, source=source, from_user=from_user, msg_type=msg_type, since=since, until=until,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,37 @@
+"""
+上传状态路由
+"""
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from src.models.upload import UploadStatus
+from src.services.upload_service import get_upload_service
+
+logger = logging.getLogger(__name__)
+
+uploads_router = APIRouter(prefix="/uploads", tags=["Uploads"])
+
+
+@uploads_router.get("", response_model=List[UploadStatus])
+async def list_uploads(
+    state: Optional[str] = Query(None, description="按状态过滤：pending / uploading / done / failed"),
+):
+    """最近的 COS 上传任务（新的在前）"""
+    return get_upload_service().list_statuses(state)
+
+
+@uploads_router.get("/report")
+async def get_upload_report():
+    """媒体去重报告（按内容哈希复用 COS 对象节省的上传量）"""
+    return await get_upload_service().report()
+
+
+@uploads_router.get("/{upload_id}", response_model=UploadStatus)
+async def get_upload(upload_id: str):
+    """单个上传任务的进度与错误信息"""
+    status = get_upload_service().get_status(upload_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="upload not found")
+    return status
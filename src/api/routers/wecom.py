@@ -15,7 +15,7 @@ wecom_router = APIRouter(prefix="/wecom", tags=["WeCom"])
 
 
 from src.models.chat_record import UnifiedMessage
-from src.services.message_processor import process_message
+from src.services.dispatcher import get_dispatcher
 
 async def _process_wecom_messages() -> dict:
     """
@@ -26,12 +26,13 @@ async def _process_wecom_messages() -> dict:
     """
     from src.services.database import DatabaseService
 
-    start_seq = DatabaseService.get_last_seq()
+    start_seq = await DatabaseService.get_last_seq()
     messages = WeComService.fetch_messages()
     logger.info(f"[WeCom] 获取到 {len(messages)} 条消息, 起始 seq={start_seq}")
 
     processed_count = 0
-    
+    batch = []
+
     for i, msg in enumerate(messages):
         try:
             msg_id = msg.get('msgid')
@@ -115,13 +116,16 @@ async def _process_wecom_messages() -> dict:
                 raw_data=msg
             )
             
-            # 统一处理
-            await process_message(unified_msg)
+            batch.append(unified_msg)
             processed_count += 1
-            
+
         except Exception as e:
             logger.error(f"[WeCom] 消息转换/处理失败: {msg.get('msgid')}, error={e}")
 
+    # 与轮询共用有界分发队列：整页落库去重后入队，队列满时在此等待
+    if batch:
+        await get_dispatcher().submit(batch)
+
     logger.info(f"[WeCom] 处理完成: 总数={len(messages)}, 成功处理={processed_count}")
 
     return {
@@ -1,11 +1,19 @@
 from .forward import ForwardHandler
+from .registry import HandlerIndex
 
 # 定义 Handler 链表 (按优先级排序)
 HANDLERS = [
     ForwardHandler(),    # 企微消息自动转发到 Craft
 ]
 
+HANDLER_INDEX = HandlerIndex(HANDLERS)
+
 
 def get_handlers():
     """获取所有 handler"""
-    return HANDLERS
\ No newline at end of file
+    return HANDLERS
+
+
+def get_handler_index() -> HandlerIndex:
+    """获取按来源 / 类型建立的 handler 索引"""
+    return HANDLER_INDEX
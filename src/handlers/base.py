@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import logging
+from typing import FrozenSet, Optional
 from src.models.chat_record import UnifiedMessage
 
 logger = logging.getLogger(__name__)
@@ -7,14 +8,27 @@ logger = logging.getLogger(__name__)
 class BaseHandler(ABC):
     """
     消息处理器基类
+
+    子类通过类属性声明接受的消息，分发器据此建立索引，只对匹配的消息调用 check / handle：
+    - sources / msg_types：接受的来源与消息类型，None 表示不限
+    - exclusive：独占处理器按优先级依次 check，第一个通过的处理后即停止；
+      非独占处理器（归档、旁路输出等）check 通过即执行，与其他处理器并发、互不影响
     """
 
-    @abstractmethod
+    sources: Optional[FrozenSet[str]] = None
+    msg_types: Optional[FrozenSet[str]] = None
+    exclusive: bool = True
+
+    def accepts(self, source: str, msg_type: str) -> bool:
+        """按声明判断是否接受该来源 / 类型的消息"""
+        return (self.sources is None or source in self.sources) and \
+            (self.msg_types is None or msg_type in self.msg_types)
+
     async def check(self, msg: UnifiedMessage) -> bool:
-        """检查是否应该处理该消息"""
-        pass
+        """声明之外的细粒度检查，默认全部接受"""
+        return True
 
     @abstractmethod
     async def handle(self, msg: UnifiedMessage):
         """执行处理逻辑"""
-        pass
\ No newline at end of file
+        pass
@@ -7,6 +7,8 @@ from src.handlers.base import BaseHandler
 from src.services.binding_service import BindingService, BindingCreate
 from src.services.formatter import format_unified_message_as_craft_blocks
 from src.services.craft import save_blocks_to_craft
+from src.services.craft_writer import get_daily_writer
+from src.services.dispatcher import defer_ack
 
 logger = logging.getLogger(__name__)
 
@@ -14,17 +16,8 @@ logger = logging.getLogger(__name__)
 class ForwardHandler(BaseHandler):
     """消息转发处理器 - 将消息转发到绑定的 Craft 文档"""
 
-    async def check(self, msg: UnifiedMessage) -> bool:
-        """
-        检查是否应该处理该消息
-        条件：
-        1. 来源是企微
-        2. 消息类型是有效的转发类型（非命令）
-        """
-        if msg.source != "wecom":
-            return False
-
-        return True
+    # 只处理企微消息（含绑定命令），所有类型
+    sources = frozenset({"wecom"})
 
     async def handle(self, msg: UnifiedMessage):
         """处理消息转发"""
@@ -49,7 +42,7 @@ class ForwardHandler(BaseHandler):
                     craft_token=token_id,
                     display_name=display_name
                 )
-                binding = BindingService.create_binding(create)
+                binding = await BindingService.create_binding(create)
                 if binding:
                     logger.info(f"[Forward] 用户 {from_user} 绑定成功: link={link_id}, doc={doc_id}, name={display_name}")
                 else:
@@ -57,7 +50,7 @@ class ForwardHandler(BaseHandler):
                 return
 
         # 查询用户绑定配置
-        binding = BindingService.get_binding_by_openid(from_user)
+        binding = await BindingService.get_binding_by_openid(from_user)
 
         if not binding:
             logger.warning(f"[Forward] 用户 {from_user} 未绑定，跳过转发")
@@ -69,7 +62,7 @@ class ForwardHandler(BaseHandler):
         logger.info(f"[Forward] 用户 {from_user} -> link={link_id}, doc={document_id}")
 
         # 格式化为 Craft blocks
-        blocks = format_unified_message_as_craft_blocks(msg)
+        blocks = await format_unified_message_as_craft_blocks(msg, binding)
 
         if not blocks:
             logger.warning(f"[Forward] 消息格式化为空: msgid={msg.msg_id}")
@@ -77,6 +70,12 @@ class ForwardHandler(BaseHandler):
 
         # 发送到 Craft
         try:
+            if binding.group_mode == "daily":
+                # 按天写入子页面（批量合并请求）：缓冲后即返回，批次写入成功后消息才确认，失败时留待重放
+                defer_ack(get_daily_writer().submit(binding, msg, blocks))
+                logger.info(f"[Forward] 已加入按天写入批次: msgid={msg.msg_id}")
+                return
+
             success = await save_blocks_to_craft(
                 blocks,
                 link_id=link_id,
@@ -0,0 +1,26 @@
+"""
+处理器索引
+
+按处理器声明的 sources / msg_types 建立 (来源, 类型) -> 处理器 的索引，
+分发时不再逐个 await check 所有处理器。索引按需为每个 (来源, 类型) 计算一次并缓存。
+"""
+from typing import Dict, List, Sequence, Tuple
+
+from src.handlers.base import BaseHandler
+
+
+class HandlerIndex:
+    """(来源, 类型) -> (独占处理器列表, 非独占处理器列表)，均保持注册顺序（优先级）"""
+
+    def __init__(self, handlers: Sequence[BaseHandler]):
+        self.handlers = list(handlers)
+        self._routes: Dict[Tuple[str, str], Tuple[List[BaseHandler], List[BaseHandler]]] = {}
+
+    def lookup(self, source: str, msg_type: str) -> Tuple[List[BaseHandler], List[BaseHandler]]:
+        key = (source, msg_type)
+        route = self._routes.get(key)
+        if route is None:
+            matched = [h for h in self.handlers if h.accepts(source, msg_type)]
+            route = ([h for h in matched if h.exclusive], [h for h in matched if not h.exclusive])
+            self._routes[key] = route
+        return route
@@ -12,6 +12,9 @@ class UserBinding(BaseModel):
     craft_token: str = Field(..., description="Craft文档Token")
     display_name: Optional[str] = Field(None, description="显示名称")
     is_enabled: bool = Field(default=True, description="是否启用")
+    image_max_dimension: Optional[int] = Field(None, description="图片最长边（像素），为空使用全局设置，0 表示不处理")
+    image_quality: Optional[int] = Field(None, description="图片压缩质量 (1-100)，为空使用全局设置")
+    group_mode: str = Field(default="flat", description="写入方式：flat 逐条追加到文档末尾，daily 按天写入子页面")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
@@ -26,6 +29,9 @@ class BindingCreate(BaseModel):
     craft_document_id: str
     craft_token: Optional[str] = None
     display_name: Optional[str] = None
+    image_max_dimension: Optional[int] = Field(None, ge=0)
+    image_quality: Optional[int] = Field(None, ge=1, le=100)
+    group_mode: str = Field("flat", pattern="^(flat|daily)$")
 
 
 class BindingResponse(BaseModel):
@@ -36,4 +42,7 @@ class BindingResponse(BaseModel):
     craft_document_id: str
     display_name: Optional[str]
     is_enabled: bool
+    image_max_dimension: Optional[int] = None
+    image_quality: Optional[int] = None
+    group_mode: str = "flat"
     created_at: datetime
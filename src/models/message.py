@@ -0,0 +1,38 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class MessageItem(BaseModel):
+    """已存档消息"""
+    id: int
+    msg_id: str
+    source: str
+    msg_type: Optional[str] = None
+    from_user: Optional[str] = None
+    content: Optional[str] = None
+    created_at: Optional[str] = None
+    created_ts: Optional[int] = Field(None, description="消息时间 (Unix 秒)")
+    seq: Optional[int] = Field(None, description="企微消息序号")
+    score: Optional[float] = Field(None, description="检索相关度 (bm25，越小越相关)")
+
+
+class MessagePage(BaseModel):
+    """消息分页结果"""
+    items: List[MessageItem]
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多")
+
+
+class StatsBucket(BaseModel):
+    """统计桶（未参与分组的维度为空）"""
+    day: Optional[str] = None
+    source: Optional[str] = None
+    from_user: Optional[str] = None
+    msg_type: Optional[str] = None
+    count: int
+
+
+class StatsResponse(BaseModel):
+    """消息统计结果"""
+    group_by: List[str]
+    total: int
+    buckets: List[StatsBucket]
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class UploadStatus(BaseModel):
+    """单个上传任务的状态"""
+    id: str
+    local_path: str
+    size: int = 0
+    uploaded: int = Field(0, description="已上传字节数")
+    state: str = Field("pending", description="pending / uploading / done / failed")
+    url: Optional[str] = None
+    sha256: Optional[str] = None
+    deduplicated: bool = Field(False, description="内容已存在于 COS，未重新上传")
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def progress(self) -> float:
+        return self.uploaded / self.size if self.size else 0.0
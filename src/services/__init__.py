@@ -2,11 +2,13 @@
 业务服务模块
 """
 
-from .database import DatabaseService, init_db
+from .database import DatabaseService, init_db, init_schema
 from .wecom import WeComService, init_wecom, fetch_messages
 from .craft import save_blocks_to_craft
 from .formatter import (
     MessageFormatter,
+    build_blocks,
+    resolve_media,
     format_unified_message_as_craft_blocks,
 )
 from .wecom_crypto import WXBizMsgCrypt
@@ -15,11 +17,14 @@ from . import ierror
 __all__ = [
     "DatabaseService",
     "init_db",
+    "init_schema",
     "WeComService",
     "init_wecom",
     "fetch_messages",
     "save_blocks_to_craft",
     "MessageFormatter",
+    "build_blocks",
+    "resolve_media",
     "format_unified_message_as_craft_blocks",
     "WXBizMsgCrypt",
     "ierror",
@@ -0,0 +1,297 @@
+"""
+消息归档模块（按月分区）
+
+超过保留期的 unified_messages 行（连同 message_payloads）按 created_at 所在月份
+移入独立的 SQLite 文件 <ARCHIVE_DIR>/messages_YYYY_MM.db，主库只保留近期数据，
+插入与去重查询不随历史增长而变慢。
+
+- 保留期按来源配置：ARCHIVE_RETENTION_DAYS 为默认值，ARCHIVE_RETENTION_OVERRIDES
+  形如 "wecom=90,wechat=365" 覆盖单个来源，0 表示该来源不归档
+- 归档由 `python manage.py archive` 执行：分批 ATTACH 分区文件搬运数据，
+  完成后对分区 VACUUM 压实；重复执行是幂等的
+- 归档的消息同时从全文索引 messages_fts 中移除
+- 跨分区读取：unified_view(conn) 将分区 ATTACH 到连接上，并创建临时视图
+  all_messages（主库 + 各分区 UNION ALL，额外的 part 列标明所在库）
+
+注意：(source, msg_id) 唯一索引只覆盖主库，已归档的消息若被再次投递会重新写入主库。
+"""
+import glob
+import logging
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.services import search
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+
+def _parse_overrides(value: str) -> Dict[str, int]:
+    overrides = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        source, days = item.split("=", 1)
+        try:
+            overrides[source.strip()] = int(days)
+        except ValueError:
+            logger.warning(f"[Archive] 无效的保留期配置: {item}")
+    return overrides
+
+
+ARCHIVE_RETENTION_OVERRIDES = _parse_overrides(os.getenv("ARCHIVE_RETENTION_OVERRIDES", ""))
+
+# 随消息一起归档的表
+ARCHIVED_TABLES = ("unified_messages", "message_payloads")
+# 统一视图不包含的列（原始数据按需从 message_payloads 读取）
+VIEW_EXCLUDED_COLUMNS = ("raw_data",)
+VIEW_NAME = "all_messages"
+
+_PARTITION_RE = re.compile(r"^messages_(\d{4}_\d{2})\.db$")
+_INDEX_RE = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) (\w+)")
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def retention_days(source: str) -> int:
+    """来源的保留天数，0 表示不归档"""
+    return ARCHIVE_RETENTION_OVERRIDES.get(source, ARCHIVE_RETENTION_DAYS)
+
+
+def _main_db_path(conn) -> str:
+    for row in conn.execute("PRAGMA database_list"):
+        if row[1] == "main":
+            return row[2]
+    return ""
+
+
+def archive_dir(conn) -> str:
+    """分区文件目录，默认与主库同级的 archive/"""
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    return os.path.join(os.path.dirname(_main_db_path(conn)) or ".", "archive")
+
+
+def partition_path(conn, month: str) -> str:
+    """月份 (YYYY_MM) 对应的分区文件路径"""
+    return os.path.join(archive_dir(conn), f"messages_{month}.db")
+
+
+def list_partitions(conn) -> List[Tuple[str, str]]:
+    """已有分区 [(YYYY_MM, path)]，按月份升序"""
+    partitions = []
+    for path in glob.glob(os.path.join(archive_dir(conn), "messages_*.db")):
+        match = _PARTITION_RE.match(os.path.basename(path))
+        if match:
+            partitions.append((match.group(1), path))
+    return sorted(partitions)
+
+
+def _columns(conn, schema: str, table: str) -> List[Tuple[str, str]]:
+    """表的 [(列名, 类型)]"""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _sync_partition_schema(conn, schema: str) -> None:
+    """按主库结构在分区中建表 / 补齐新增列"""
+    for table in ARCHIVED_TABLES:
+        existing = {name for name, _ in _columns(conn, schema, table)}
+        if not existing:
+            row = conn.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            conn.execute(row[0].replace(f"CREATE TABLE {table}", f"CREATE TABLE {schema}.{table}", 1))
+            continue
+        for name, col_type in _columns(conn, "main", table):
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {col_type}")
+    # 复制主库上 unified_messages 的索引（sqlite_master 中的 SQL 已去掉 IF NOT EXISTS）
+    for (sql,) in conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = 'unified_messages' AND sql IS NOT NULL"
+    ).fetchall():
+        conn.execute(_INDEX_RE.sub(rf"\1 IF NOT EXISTS {schema}.\2", sql, count=1))
+
+
+def _month_bounds(month: str) -> Tuple[str, str]:
+    start = datetime.strptime(month, "%Y_%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.strftime(_DATETIME_FORMAT), end.strftime(_DATETIME_FORMAT)
+
+
+def plan_archive(conn, now: Optional[datetime] = None) -> List[Dict]:
+    """待归档的 [{source, month, cutoff, rows}]"""
+    now = now or datetime.now()
+    plan = []
+    sources = [row[0] for row in conn.execute("SELECT DISTINCT source FROM unified_messages")]
+    for source in sources:
+        days = retention_days(source)
+        if days <= 0:
+            continue
+        cutoff = (now - timedelta(days=days)).strftime(_DATETIME_FORMAT)
+        rows = conn.execute(
+            "SELECT strftime('%Y_%m', created_at) AS month, COUNT(*) FROM unified_messages "
+            "WHERE source = ? AND created_at < ? GROUP BY month ORDER BY month",
+            (source, cutoff)
+        )
+        plan.extend({"source": source, "month": row[0], "cutoff": cutoff, "rows": row[1]} for row in rows)
+    return plan
+
+
+def _move_batch(conn, schema: str, source: str, start: str, end: str) -> int:
+    """把一批行搬到分区，返回搬运的行数"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM temp.archive_batch")
+        conn.execute(
+            "INSERT INTO temp.archive_batch SELECT id FROM main.unified_messages "
+            "WHERE source = ? AND created_at >= ? AND created_at < ? LIMIT ?",
+            (source, start, end, ARCHIVE_BATCH_SIZE)
+        )
+        moved = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+        if moved:
+            for table, key in (("unified_messages", "id"), ("message_payloads", "message_id")):
+                columns = ", ".join(name for name, _ in _columns(conn, "main", table))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {schema}.{table} ({columns}) SELECT {columns} FROM main.{table} "
+                    f"WHERE {key} IN (SELECT id FROM temp.archive_batch)"
+                )
+                conn.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT id FROM temp.archive_batch)")
+            # 全文索引只覆盖主库
+            conn.execute(f"DELETE FROM main.{search.FTS_TABLE} WHERE rowid IN (SELECT id FROM temp.archive_batch)")
+        conn.commit()
+        return moved
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _vacuum_partition(path: str) -> None:
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def archive_expired(conn, now: Optional[datetime] = None, vacuum: bool = True, dry_run: bool = False) -> Dict:
+    """
+    按保留策略归档过期消息
+
+    Args:
+        conn: 主库写连接（自动提交模式，归档期间独占）
+        now: 计算保留期的基准时间，默认当前时间
+        vacuum: 归档后对涉及的分区执行 VACUUM
+        dry_run: 只返回归档计划，不搬运数据
+
+    Returns:
+        {"plan": [...], "moved": 行数, "partitions": [涉及的分区路径]}
+    """
+    plan = plan_archive(conn, now)
+    report = {"plan": plan, "moved": 0, "partitions": []}
+    if dry_run or not plan:
+        return report
+
+    os.makedirs(archive_dir(conn), exist_ok=True)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+    touched = []
+    for item in plan:
+        path = partition_path(conn, item["month"])
+        schema = f"p_{item['month']}"
+        start, end = _month_bounds(item["month"])
+        end = min(end, item["cutoff"])
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        try:
+            _sync_partition_schema(conn, schema)
+            while True:
+                moved = _move_batch(conn, schema, item["source"], start, end)
+                report["moved"] += moved
+                if moved < ARCHIVE_BATCH_SIZE:
+                    break
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+        if path not in touched:
+            touched.append(path)
+        logger.info(f"[Archive] {item['source']} {item['month']}: {item['rows']} 行 -> {path}")
+
+    if vacuum:
+        for path in touched:
+            _vacuum_partition(path)
+    report["partitions"] = touched
+    return report
+
+
+@contextmanager
+def unified_view(conn, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[List[str]]:
+    """
+    在连接上 ATTACH 分区并创建临时视图 all_messages，退出时 DETACH
+
+    Args:
+        since / until: created_at 范围（'YYYY-MM-DD HH:MM:SS'），用于跳过无关分区
+
+    Yields:
+        视图包含的库名列表（'main' 及各分区别名）
+    """
+    partitions = list_partitions(conn)
+    if since:
+        partitions = [(m, p) for m, p in partitions if _month_bounds(m)[1] > since]
+    if until:
+        partitions = [(m, p) for m, p in partitions if _month_bounds(m)[0] <= until]
+
+    # SQLite 限制同一连接可 ATTACH 的库数量，超出时只保留最近的分区
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - (len(conn.execute("PRAGMA database_list").fetchall()) - 1)
+    if len(partitions) > limit:
+        logger.warning(f"[Archive] 分区数 {len(partitions)} 超过 ATTACH 上限 {limit}，仅包含最近的分区")
+        partitions = partitions[-limit:] if limit > 0 else []
+
+    attached = []
+    try:
+        for month, path in partitions:
+            schema = f"p_{month}"
+            conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+            attached.append(schema)
+
+        columns = [name for name, _ in _columns(conn, "main", "unified_messages") if name not in VIEW_EXCLUDED_COLUMNS]
+        selects = []
+        for schema in ["main"] + attached:
+            available = {name for name, _ in _columns(conn, schema, "unified_messages")}
+            cols = ", ".join(c if c in available else f"NULL AS {c}" for c in columns)
+            selects.append(f"SELECT {cols}, '{schema}' AS part FROM {schema}.unified_messages")
+
+        # 只读连接开启了 query_only，临时视图不写主库文件，创建时短暂放开
+        query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+        conn.execute("PRAGMA query_only = 0")
+        try:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW_NAME}")
+            conn.execute(f"CREATE TEMP VIEW {VIEW_NAME} AS " + " UNION ALL ".join(selects))
+        finally:
+            conn.execute(f"PRAGMA query_only = {query_only}")
+
+        yield ["main"] + attached
+    finally:
+        query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+        conn.execute("PRAGMA query_only = 0")
+        conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW_NAME}")
+        conn.execute(f"PRAGMA query_only = {query_only}")
+        for schema in attached:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+
+def partition_report(conn) -> List[Dict]:
+    """各分区的行数与文件大小"""
+    report = []
+    for month, path in list_partitions(conn):
+        part = sqlite3.connect(path)
+        try:
+            rows = part.execute("SELECT COUNT(*) FROM unified_messages").fetchone()[0]
+            sources = dict(part.execute("SELECT source, COUNT(*) FROM unified_messages GROUP BY source").fetchall())
+        finally:
+            part.close()
+        report.append({"month": month, "path": path, "rows": rows, "sources": sources,
+                       "file_bytes": os.path.getsize(path)})
+    return report
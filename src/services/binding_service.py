@@ -2,118 +2,249 @@
 用户绑定服务模块
 处理企微用户与Craft文档的映射关系
 """
+import asyncio
 import json
 import logging
-from typing import Optional, List
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Tuple
 from datetime import datetime
 
 import requests
 
 from src.models.binding import UserBinding, BindingCreate, BindingResponse
-from src.services.database import get_connection
+from src.services.database import get_pool, run_read, run_write
+from src.services.db_pool import connect
 
 logger = logging.getLogger(__name__)
 
 # Craft 配置
-API_BASE_URL = "https://connect.craft.do/links"
+API_BASE_URL = os.getenv("CRAFT_API_BASE_URL", "https://connect.craft.do/links")
+
+# 绑定缓存配置
+BINDING_CACHE_TTL = float(os.getenv("BINDING_CACHE_TTL", "300"))
+BINDING_CACHE_NEGATIVE_TTL = float(os.getenv("BINDING_CACHE_NEGATIVE_TTL", "60"))
+BINDING_CACHE_SIZE = int(os.getenv("BINDING_CACHE_SIZE", "10000"))
+# 跨进程一致性检查的最小间隔（秒）
+BINDING_CACHE_CHECK_INTERVAL = float(os.getenv("BINDING_CACHE_CHECK_INTERVAL", "1"))
+
+
+class BindingCache:
+    """
+    进程内绑定缓存（含“未绑定”的负缓存）
+
+    本进程内的创建 / 删除直接失效对应条目；其他进程（或直接改库）的变更通过
+    PRAGMA data_version 发现：该值只在其他连接提交后变化，变化时再读取由触发器
+    维护的 binding_version，版本号变了才清空缓存，消息写入不会误伤缓存。
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[Optional[UserBinding], float]]" = OrderedDict()
+        self._generation = 0
+        self._conn = None
+        self._conn_path = None
+        self._conn_lock = threading.Lock()
+        self._data_version = None
+        self._binding_version = None
+        self._next_check = 0.0
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "flushes": 0}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, openid: str) -> Tuple[bool, Optional[UserBinding]]:
+        """返回 (是否命中, 绑定)；命中且绑定为 None 表示确认未绑定"""
+        entry = self._entries.get(openid)
+        if entry is None or entry[1] < time.monotonic():
+            self.stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(openid)
+        self.stats["hits" if entry[0] else "negative_hits"] += 1
+        return True, entry[0]
+
+    def put(self, openid: str, binding: Optional[UserBinding], generation: int) -> None:
+        """写入查询结果；查询期间缓存被失效过（generation 变化）则丢弃"""
+        if generation != self._generation:
+            return
+        ttl = BINDING_CACHE_TTL if binding else BINDING_CACHE_NEGATIVE_TTL
+        self._entries[openid] = (binding, time.monotonic() + ttl)
+        self._entries.move_to_end(openid)
+        while len(self._entries) > BINDING_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, openid: Optional[str] = None) -> None:
+        """失效单个用户（openid 为空时清空全部）"""
+        self._generation += 1
+        if openid is None:
+            self._entries.clear()
+            self.stats["flushes"] += 1
+        else:
+            self._entries.pop(openid, None)
+
+    async def ensure_fresh(self) -> None:
+        """按间隔检查库中绑定是否被其他连接修改"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + BINDING_CACHE_CHECK_INTERVAL
+        try:
+            changed = await asyncio.to_thread(self._check_versions)
+        except Exception as e:
+            logger.warning(f"[Binding] 缓存一致性检查失败，清空缓存: {e}")
+            changed = True
+        if changed:
+            self.invalidate()
+
+    def _check_versions(self) -> bool:
+        with self._conn_lock:
+            db_path = get_pool().db_path
+            if self._conn is None or self._conn_path != db_path:
+                self.close()
+                self._conn = connect(db_path, readonly=True)
+                self._conn_path = db_path
+
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            self._data_version = data_version
+
+            row = self._conn.execute("SELECT version FROM binding_version WHERE id = 1").fetchone()
+            binding_version = row[0] if row else None
+            changed = self._binding_version is not None and binding_version != self._binding_version
+            self._binding_version = binding_version
+            return changed
+
+    def close(self) -> None:
+        """关闭用于版本检查的连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._data_version = None
+            self._binding_version = None
+
+
+binding_cache = BindingCache()
+
+
+def _upsert_binding(conn, create: BindingCreate) -> Optional[UserBinding]:
+    cursor = conn.cursor()
+
+    # 检查是否已存在
+    cursor.execute(
+        "SELECT id FROM user_mappings WHERE wecom_openid = ?",
+        (create.wecom_openid,)
+    )
+    existing = cursor.fetchone()
+
+    if existing:
+        # 更新；未显式设置的可选配置保留原值（如企微“绑定”命令只更新文档信息）
+        columns = ["craft_link_id", "craft_document_id", "craft_token", "display_name"]
+        columns += [c for c in ("image_max_dimension", "image_quality", "group_mode") if c in create.model_fields_set]
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        cursor.execute(
+            f"UPDATE user_mappings SET {assignments}, updated_at = ? WHERE wecom_openid = ?",
+            (
+                *(getattr(create, c) for c in columns),
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                create.wecom_openid
+            )
+        )
+    else:
+        # 插入
+        cursor.execute("""
+            INSERT INTO user_mappings (
+                wecom_openid, craft_link_id, craft_document_id, craft_token, display_name,
+                image_max_dimension, image_quality, group_mode
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            create.wecom_openid,
+            create.craft_link_id,
+            create.craft_document_id,
+            create.craft_token,
+            create.display_name,
+            create.image_max_dimension,
+            create.image_quality,
+            create.group_mode
+        ))
+
+    return _select_binding(conn, create.wecom_openid)
+
+
+def _select_binding(conn, openid: str) -> Optional[UserBinding]:
+    cursor = conn.execute(
+        "SELECT * FROM user_mappings WHERE wecom_openid = ? AND is_enabled = 1",
+        (openid,)
+    )
+    row = cursor.fetchone()
+    if row:
+        return BindingService._row_to_binding(row)
+    return None
+
+
+def _select_all_bindings(conn) -> List[UserBinding]:
+    rows = conn.execute("SELECT * FROM user_mappings ORDER BY created_at DESC").fetchall()
+    return [BindingService._row_to_binding(row) for row in rows]
+
+
+def _delete_binding(conn, openid: str) -> bool:
+    cursor = conn.execute("DELETE FROM user_mappings WHERE wecom_openid = ?", (openid,))
+    return cursor.rowcount > 0
 
 
 class BindingService:
-    """绑定服务类"""
+    """绑定服务类（协程接口，数据库操作在执行器线程中完成）"""
 
     @staticmethod
-    def create_binding(create: BindingCreate) -> Optional[UserBinding]:
+    async def create_binding(create: BindingCreate) -> Optional[UserBinding]:
         """创建或更新用户绑定"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-
-                # 检查是否已存在
-                cursor.execute(
-                    "SELECT id FROM user_mappings WHERE wecom_openid = ?",
-                    (create.wecom_openid,)
-                )
-                existing = cursor.fetchone()
-
-                if existing:
-                    # 更新
-                    cursor.execute("""
-                        UPDATE user_mappings
-                        SET craft_link_id = ?, craft_document_id = ?, craft_token = ?, display_name = ?, updated_at = ?
-                        WHERE wecom_openid = ?
-                    """, (
-                        create.craft_link_id,
-                        create.craft_document_id,
-                        create.craft_token,
-                        create.display_name,
-                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        create.wecom_openid
-                    ))
-                    binding_id = existing['id']
-                else:
-                    # 插入
-                    cursor.execute("""
-                        INSERT INTO user_mappings (wecom_openid, craft_link_id, craft_document_id, craft_token, display_name)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        create.wecom_openid,
-                        create.craft_link_id,
-                        create.craft_document_id,
-                        create.craft_token,
-                        create.display_name
-                    ))
-                    binding_id = cursor.lastrowid
-
-                conn.commit()
-                return BindingService.get_binding_by_openid(create.wecom_openid)
-
+            return await run_write(_upsert_binding, create)
         except Exception as e:
             logger.error(f"[Binding] 创建绑定失败: openid={create.wecom_openid}, error={e}")
             return None
+        finally:
+            binding_cache.invalidate(create.wecom_openid)
 
     @staticmethod
-    def get_binding_by_openid(openid: str) -> Optional[UserBinding]:
-        """根据企微OpenID获取绑定"""
+    async def get_binding_by_openid(openid: str) -> Optional[UserBinding]:
+        """根据企微OpenID获取绑定（优先读缓存，未绑定的结果同样缓存）"""
+        await binding_cache.ensure_fresh()
+        hit, binding = binding_cache.get(openid)
+        if hit:
+            return binding
+
+        generation = binding_cache.generation
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT * FROM user_mappings WHERE wecom_openid = ? AND is_enabled = 1",
-                    (openid,)
-                )
-                row = cursor.fetchone()
-                if row:
-                    return BindingService._row_to_binding(row)
-                return None
+            binding = await run_read(_select_binding, openid)
         except Exception as e:
             logger.error(f"[Binding] 查询绑定失败: openid={openid}, error={e}")
             return None
+        binding_cache.put(openid, binding, generation)
+        return binding
 
     @staticmethod
-    def get_all_bindings() -> List[UserBinding]:
+    async def get_all_bindings() -> List[UserBinding]:
         """获取所有绑定"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM user_mappings ORDER BY created_at DESC")
-                rows = cursor.fetchall()
-                return [BindingService._row_to_binding(row) for row in rows]
+            return await run_read(_select_all_bindings)
         except Exception as e:
             logger.error(f"[Binding] 获取所有绑定失败: error={e}")
             return []
 
     @staticmethod
-    def delete_binding(openid: str) -> bool:
+    async def delete_binding(openid: str) -> bool:
         """删除绑定"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM user_mappings WHERE wecom_openid = ?", (openid,))
-                conn.commit()
-                return cursor.rowcount > 0
+            return await run_write(_delete_binding, openid)
         except Exception as e:
             logger.error(f"[Binding] 删除绑定失败: openid={openid}, error={e}")
             return False
+        finally:
+            binding_cache.invalidate(openid)
 
     @staticmethod
     def _row_to_binding(row) -> UserBinding:
@@ -126,6 +257,9 @@ class BindingService:
             craft_token=row['craft_token'] if 'craft_token' in row.keys() else None,
             display_name=row['display_name'] if 'display_name' in row.keys() else None,
             is_enabled=bool(row['is_enabled']) if 'is_enabled' in row.keys() else True,
+            image_max_dimension=row['image_max_dimension'] if 'image_max_dimension' in row.keys() else None,
+            image_quality=row['image_quality'] if 'image_quality' in row.keys() else None,
+            group_mode=row['group_mode'] if 'group_mode' in row.keys() else "flat",
             created_at=datetime.fromisoformat(row['created_at']) if isinstance(row['created_at'], str) else row['created_at'],
             updated_at=datetime.fromisoformat(row['updated_at']) if isinstance(row['updated_at'], str) else row['updated_at']
         )
@@ -0,0 +1,118 @@
+"""
+合并转发 (chatrecord) 与图文混排 (mixed) 消息
+
+两种消息都由若干子项组成，子项的 content 是 JSON 字符串：
+- mixed.item[]:      {"type": "text" / "image" / ..., "content": "{...}"}
+- chatrecord.item[]: {"type": "ChatRecordText" / "ChatRecordImage" / ..., "msgtime": ..., "content": "{...}"}
+  嵌套的合并转发 / 图文混排子项内部同样带有 item 列表
+
+expand 把子项一次性展开为 UnifiedMessage：文本、链接直接可用；媒体子项的 content 为空，
+raw_data 中保留 sdkfileid，由格式化器并发拉取 / 上传后生成嵌套 blocks。
+"""
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+from src.models.chat_record import UnifiedMessage
+
+logger = logging.getLogger(__name__)
+
+COMPOSITE_TYPES = ("chatrecord", "mixed")
+
+# 摘要最大长度（写入 unified_messages.content，供搜索与列表展示）
+SUMMARY_MAX_CHARS = 2000
+
+
+def _item_type(raw_type: str) -> str:
+    """ChatRecordText -> text，ChatRecordChatRecord -> chatrecord，mixed 子项类型原样返回"""
+    item_type = (raw_type or "").lower()
+    if item_type.startswith("chatrecord") and item_type != "chatrecord":
+        item_type = item_type[len("chatrecord"):]
+    return item_type
+
+
+def _item_data(item: Dict[str, Any]) -> Dict[str, Any]:
+    content = item.get("content")
+    if isinstance(content, dict):
+        return content
+    try:
+        data = json.loads(content or "{}")
+    except (TypeError, ValueError):
+        return {"content": content}
+    return data if isinstance(data, dict) else {"content": content}
+
+
+def iter_items(data: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    """子项列表：(类型, 子项内容, 原始子项)"""
+    items = data.get("item") or []
+    return [(_item_type(item.get("type")), _item_data(item), item) for item in items if isinstance(item, dict)]
+
+
+def title_of(msg_type: str, data: Dict[str, Any]) -> str:
+    if msg_type == "chatrecord":
+        return data.get("title") or "聊天记录"
+    return data.get("title") or "图文消息"
+
+
+def summary(msg_type: str, data: Dict[str, Any]) -> str:
+    """标题 + 所有文本 / 链接标题（递归），用于存档与搜索"""
+    parts = [title_of(msg_type, data)] if msg_type == "chatrecord" else []
+    for item_type, item_data, _ in iter_items(data):
+        if item_type == "text":
+            parts.append(item_data.get("content", ""))
+        elif item_type == "link":
+            parts.append(item_data.get("title") or item_data.get("link_url", ""))
+        elif item_type in COMPOSITE_TYPES:
+            parts.append(summary(item_type, item_data))
+        elif item_type == "file":
+            parts.append(item_data.get("filename", ""))
+    return "\n".join(p for p in parts if p)[:SUMMARY_MAX_CHARS]
+
+
+def expand(msg: UnifiedMessage) -> Tuple[str, List[UnifiedMessage]]:
+    """
+    展开合并转发 / 图文混排消息
+
+    Returns:
+        (标题, 子消息列表)；子消息的 raw_data 为 {类型: 子项内容}，与顶层消息的结构一致
+    """
+    data = (msg.raw_data or {}).get(msg.msg_type) or {}
+    children = []
+    for index, (item_type, item_data, item) in enumerate(iter_items(data)):
+        if item_type == "text":
+            content = item_data.get("content", "")
+        elif item_type == "link":
+            content = item_data.get("link_url", "")
+        elif item_type in COMPOSITE_TYPES:
+            content = summary(item_type, item_data)
+        elif item_type == "location":
+            content = " ".join(filter(None, (item_data.get("title"), item_data.get("address"))))
+        elif item_data.get("sdkfileid"):
+            # 媒体：转发时拉取
+            content = ""
+        else:
+            content = item_data.get("content") or json.dumps(item_data, ensure_ascii=False)
+
+        msgtime = item.get("msgtime")
+        children.append(UnifiedMessage(
+            msg_id=f"{msg.msg_id}-{index}",
+            source=msg.source,
+            msg_type=item_type or "unknown",
+            content=content,
+            from_user=msg.from_user,
+            create_time=int(msgtime) if msgtime else msg.create_time,
+            raw_data={item_type: item_data},
+        ))
+    return title_of(msg.msg_type, data), children
+
+
+async def fetch_media(child: UnifiedMessage) -> str:
+    """拉取媒体子项，返回 URL / 本地路径，失败返回空字符串"""
+    from src.services.wecom import fetch_media as wecom_fetch_media
+
+    media_data = (child.raw_data or {}).get(child.msg_type) or {}
+    try:
+        return await wecom_fetch_media(child.msg_type, media_data, child.msg_id) or ""
+    except Exception as e:
+        logger.warning(f"[Composite] 子项媒体拉取失败: {child.msg_id}, {e}")
+        return ""
@@ -1,12 +1,13 @@
 """
 腾讯云 COS 服务模块
+
+qcloud_cos 在初始化客户端时才导入，未使用 COS 后端时无需安装。
 """
 import logging
 import os
-from typing import Optional
-
-from qcloud_cos import CosConfig
-from qcloud_cos import CosS3Client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +18,17 @@ COS_REGION = os.getenv("COS_REGION", "ap-shanghai")
 COS_BUCKET = os.getenv("COS_BUCKET", "")
 COS_BASE_URL = os.getenv("COS_BASE_URL", "")
 COS_ROOT_DIR = os.getenv("COS_ROOT_DIR", "")
+# 分块上传：超过 PartSize 的文件按块并发上传
+COS_UPLOAD_PART_SIZE_MB = int(os.getenv("COS_UPLOAD_PART_SIZE_MB", "8"))
+COS_UPLOAD_PART_THREADS = int(os.getenv("COS_UPLOAD_PART_THREADS", "4"))
+# 流式上传时内存中最多缓存的分块数
+MEDIA_PIPE_BUFFER_PARTS = int(os.getenv("MEDIA_PIPE_BUFFER_PARTS", "4"))
 
 _cos_client = None
 
 
-def init_cos() -> Optional[CosS3Client]:
-    """初始化 COS 客户端"""
+def init_cos():
+    """初始化 COS 客户端，失败返回 None"""
     global _cos_client
 
     if not all([COS_SECRET_ID, COS_SECRET_KEY, COS_REGION, COS_BUCKET]):
@@ -30,6 +36,8 @@ def init_cos() -> Optional[CosS3Client]:
         return None
 
     try:
+        from qcloud_cos import CosConfig, CosS3Client
+
         config = CosConfig(
             Region=COS_REGION,
             SecretId=COS_SECRET_ID,
@@ -43,6 +51,11 @@ def init_cos() -> Optional[CosS3Client]:
         return None
 
 
+def is_configured() -> bool:
+    """客户端可用（必要时初始化）"""
+    return _cos_client is not None or init_cos() is not None
+
+
 def get_cos_url(filename: str) -> str:
     """获取文件的 COS 访问 URL"""
     if COS_BASE_URL:
@@ -55,12 +68,40 @@ def get_cos_url(filename: str) -> str:
         return f"https://{COS_BUCKET}.cos.{COS_REGION}.myqcloud.com/{COS_ROOT_DIR}/{filename}"
 
 
-def upload_file(local_path: str) -> Optional[str]:
+def _cos_key(name: str) -> str:
+    return f"{COS_ROOT_DIR}/{name}" if COS_ROOT_DIR else name
+
+
+def object_exists(name: str) -> bool:
+    """HEAD 检查对象是否已存在（name 为相对 COS_ROOT_DIR 的对象名）"""
+    if not _cos_client:
+        if not init_cos():
+            return False
+    try:
+        return _cos_client.object_exists(Bucket=COS_BUCKET, Key=_cos_key(name))
+    except Exception as e:
+        logger.warning(f"[COS] HEAD 检查失败: {name}, {e}")
+        return False
+
+
+def upload_file(
+    local_path: str,
+    object_name: Optional[str] = None,
+    part_size_mb: int = COS_UPLOAD_PART_SIZE_MB,
+    max_thread: int = COS_UPLOAD_PART_THREADS,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    raise_on_error: bool = False,
+) -> Optional[str]:
     """
-    上传文件到 COS
+    上传文件到 COS（同步调用，大文件自动分块并发上传）
 
     Args:
         local_path: 本地文件路径
+        object_name: 对象名（相对 COS_ROOT_DIR），默认使用文件名
+        part_size_mb: 分块大小 (MB)，不超过该大小的文件直接 PUT
+        max_thread: 分块并发线程数
+        progress_callback: 进度回调 (已上传字节数, 总字节数)
+        raise_on_error: 上传异常时抛出而不是返回 None
 
     Returns:
         COS 访问 URL，失败返回 None
@@ -73,8 +114,8 @@ def upload_file(local_path: str) -> Optional[str]:
         logger.error(f"[COS] 文件不存在: {local_path}")
         return None
 
-    filename = os.path.basename(local_path)
-    cos_key = f"{COS_ROOT_DIR}/{filename}" if COS_ROOT_DIR else filename
+    filename = object_name or os.path.basename(local_path)
+    cos_key = _cos_key(filename)
 
     try:
         logger.info(f"[COS] 开始上传: {local_path} -> {cos_key}")
@@ -82,7 +123,10 @@ def upload_file(local_path: str) -> Optional[str]:
         _cos_client.upload_file(
             Bucket=COS_BUCKET,
             Key=cos_key,
-            LocalFilePath=local_path
+            LocalFilePath=local_path,
+            PartSize=part_size_mb,
+            MAXThread=max_thread,
+            progress_callback=progress_callback,
         )
 
         url = get_cos_url(filename)
@@ -91,9 +135,124 @@ def upload_file(local_path: str) -> Optional[str]:
 
     except Exception as e:
         logger.error(f"[COS] 上传失败: {e}")
+        if raise_on_error:
+            raise
         return None
 
 
+def upload_stream(
+    chunks: Iterable[bytes],
+    object_name: str,
+    part_size_mb: int = COS_UPLOAD_PART_SIZE_MB,
+    max_thread: int = COS_UPLOAD_PART_THREADS,
+    max_buffered_parts: int = MEDIA_PIPE_BUFFER_PARTS,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    should_commit: Optional[Callable[[], bool]] = None,
+) -> Optional[str]:
+    """
+    把数据流上传到 COS（同步调用），边读边按块并发分块上传，不落盘
+
+    内存中最多同时保留 max_buffered_parts 个分块，上游产出
+    速度超过上传速度时阻塞在读取上。不足一个分块的数据直接 PUT。
+
+    Args:
+        chunks: 数据分片迭代器
+        object_name: 对象名（相对 COS_ROOT_DIR）
+        part_size_mb: 分块大小 (MB)
+        max_thread: 分块并发线程数
+        max_buffered_parts: 内存中最多缓存的分块数
+        progress_callback: 进度回调 (已上传字节数, 总字节数)，流式上传时总字节数在结束前为 0
+        should_commit: 数据读完、提交前调用，返回 False 时放弃上传（用于内容去重）
+
+    Returns:
+        COS 访问 URL；失败或放弃时返回 None
+
+    Raises:
+        Exception: 读取或上传失败（已上传的分块会被清理）
+    """
+    if not _cos_client:
+        if not init_cos():
+            return None
+
+    cos_key = _cos_key(object_name)
+    part_size = part_size_mb * 1024 * 1024
+    iterator = iter(chunks)
+    buffer = bytearray()
+
+    def _fill() -> bool:
+        """读满一个分块，返回数据是否已读完"""
+        for chunk in iterator:
+            buffer.extend(chunk)
+            if len(buffer) >= part_size:
+                return False
+        return True
+
+    finished = _fill()
+    if finished:
+        # 小文件：直接 PUT
+        if should_commit and not should_commit():
+            return None
+        _cos_client.put_object(Bucket=COS_BUCKET, Key=cos_key, Body=bytes(buffer))
+        if progress_callback:
+            progress_callback(len(buffer), len(buffer))
+        logger.info(f"[COS] 流式上传成功: {cos_key} ({len(buffer)} bytes)")
+        return get_cos_url(object_name)
+
+    upload_id = _cos_client.create_multipart_upload(Bucket=COS_BUCKET, Key=cos_key)["UploadId"]
+    slots = threading.BoundedSemaphore(max(max_buffered_parts, 1))
+    lock = threading.Lock()
+    uploaded = [0]
+    errors = []
+
+    def _upload_part(number: int, data: bytes) -> dict:
+        try:
+            response = _cos_client.upload_part(
+                Bucket=COS_BUCKET, Key=cos_key, Body=data, PartNumber=number, UploadId=upload_id
+            )
+            with lock:
+                uploaded[0] += len(data)
+                if progress_callback:
+                    progress_callback(uploaded[0], 0)
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        except Exception as e:
+            errors.append(e)
+            raise
+        finally:
+            slots.release()
+
+    futures = []
+    total = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_thread, 1), thread_name_prefix="cos-part") as pool:
+            while buffer and not errors:
+                data = bytes(buffer[:part_size])
+                del buffer[:part_size]
+                total += len(data)
+                slots.acquire()
+                futures.append(pool.submit(_upload_part, len(futures) + 1, data))
+                if not finished and len(buffer) < part_size:
+                    finished = _fill()
+            parts = [f.result() for f in futures]
+
+        if should_commit and not should_commit():
+            _cos_client.abort_multipart_upload(Bucket=COS_BUCKET, Key=cos_key, UploadId=upload_id)
+            return None
+        _cos_client.complete_multipart_upload(
+            Bucket=COS_BUCKET, Key=cos_key, UploadId=upload_id, MultipartUpload={"Part": parts}
+        )
+    except BaseException:
+        try:
+            _cos_client.abort_multipart_upload(Bucket=COS_BUCKET, Key=cos_key, UploadId=upload_id)
+        except Exception as e:
+            logger.warning(f"[COS] 清理分块上传失败: {cos_key}, {e}")
+        raise
+
+    if progress_callback:
+        progress_callback(total, total)
+    logger.info(f"[COS] 流式分块上传成功: {cos_key} ({total} bytes, {len(parts)} parts)")
+    return get_cos_url(object_name)
+
+
 def upload_image(local_path: str) -> Optional[str]:
     """
     上传图片到 COS
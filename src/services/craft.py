@@ -1,16 +1,20 @@
 """
 Craft 集成服务模块
 """
+import asyncio
 import json
 import logging
+import os
 import time
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 import requests
 
 logger = logging.getLogger(__name__)
 
-API_BASE_URL = "https://connect.craft.do/links"
+API_BASE_URL = os.getenv("CRAFT_API_BASE_URL", "https://connect.craft.do/links")
+# 请求间隔（秒），避免限流；压测本地模拟服务时可设为 0
+CRAFT_REQUEST_INTERVAL = float(os.getenv("CRAFT_REQUEST_INTERVAL", "0.5"))
 
 
 async def save_blocks_to_craft(
@@ -28,20 +32,53 @@ async def save_blocks_to_craft(
         document_id: Craft 文档 ID（可选）
         document_token: Craft 文档 Token（必填）
     """
+    # append_blocks 是同步请求（含限流间隔），放到线程中执行，不阻塞事件循环
+    items, _ = await asyncio.to_thread(append_blocks, blocks, link_id, document_id, document_token)
+    return items is not None
+
+
+def create_page(title: str, link_id: str, document_id: str, document_token: str) -> Optional[str]:
+    """
+    在文档末尾创建子页面
+
+    Returns:
+        新页面的 block id，失败返回 None
+    """
+    items, _ = append_blocks([{"type": "page", "markdown": title}], link_id, document_id, document_token)
+    if items and isinstance(items[0], dict) and items[0].get("id"):
+        return items[0]["id"]
+    logger.error(f"[Craft] 创建页面失败: title={title}, doc={document_id}")
+    return None
+
+
+def append_blocks(
+    blocks: List[Dict],
+    link_id: str,
+    page_id: str = None,
+    document_token: str = None
+) -> Tuple[Optional[List[Dict]], int]:
+    """
+    追加 blocks 到指定 page（文档或子页面）末尾（同步）
+
+    Returns:
+        (items, status_code)：items 为创建的 blocks（响应无 JSON 时为空列表），失败为 None；
+        status_code 为 HTTP 状态码，未发出请求或请求异常为 0
+    """
     if not link_id:
         logger.error("[Craft] link_id 未提供")
-        return False
+        return None, 0
 
     if not document_token:
         logger.error("[Craft] document_token 未提供，无法访问 Craft 文档")
-        return False
+        return None, 0
 
-    logger.info(f"[Craft] 开始保存: {len(blocks)} blocks -> link={link_id}, doc={document_id}")
+    logger.info(f"[Craft] 开始保存: {len(blocks)} blocks -> link={link_id}, page={page_id}")
     for i, block in enumerate(blocks):
         logger.info(f"[Craft] Block[{i}]: {block}")
 
     # 添加请求间隔，避免限流
-    time.sleep(0.5)
+    if CRAFT_REQUEST_INTERVAL > 0:
+        time.sleep(CRAFT_REQUEST_INTERVAL)
 
     url = f"{API_BASE_URL}/{link_id}/api/v1/blocks"
     headers = {
@@ -52,7 +89,7 @@ async def save_blocks_to_craft(
         "blocks": blocks,
         "position": {
             "position": "end",
-            "pageId": document_id
+            "pageId": page_id
         }
     }
 
@@ -71,18 +108,18 @@ async def save_blocks_to_craft(
         # 检查是否是弃用警告
         if "deprecated" in response.text.lower() or "single document" in response.text.lower():
             logger.error(f"[Craft] 保存失败: API 已弃用，请创建新的 Multi Document API")
-            return False
+            return None, response.status_code
 
         # 尝试解析 JSON 响应
         try:
             response_json = response.json()
             if response.status_code in (200, 201) and "items" in response_json:
                 logger.info(f"[Craft] 保存成功: {len(blocks)} blocks")
-                return True
+                return response_json["items"], response.status_code
             elif response.status_code == 404:
                 logger.error(f"[Craft] 保存失败: 文档不存在，请检查 link_id 和 document_id 是否正确")
-                logger.error(f"[Craft] link_id={link_id}, document_id={document_id}")
-                return False
+                logger.error(f"[Craft] link_id={link_id}, page_id={page_id}")
+                return None, response.status_code
             elif response.status_code == 429:
                 # 请求频率限制，添加延迟后重试
                 logger.warning(f"[Craft] 请求频率限制，等待后重试...")
@@ -91,25 +128,28 @@ async def save_blocks_to_craft(
                 logger.info(f"[Craft] 重试 Status: {response.status_code}")
                 if response.status_code in (200, 201):
                     logger.info(f"[Craft] 重试成功: {len(blocks)} blocks")
-                    return True
+                    try:
+                        return response.json().get("items", []), response.status_code
+                    except (json.JSONDecodeError, AttributeError):
+                        return [], response.status_code
                 logger.error(f"[Craft] 重试失败: {response.text[:200]}")
-                return False
+                return None, response.status_code
             else:
                 logger.error(f"[Craft] 保存失败: 响应格式异常 {response_json}")
-                return False
+                return None, response.status_code
         except json.JSONDecodeError:
             if response.status_code == 200:
                 logger.info(f"[Craft] 保存成功（无 JSON 响应）: {len(blocks)} blocks")
-                return True
+                return [], response.status_code
             elif response.status_code in (502, 503, 504):
                 logger.error(f"[Craft] 保存失败: Craft 服务暂时不可用 (status={response.status_code})")
-                return False
+                return None, response.status_code
             logger.error(f"[Craft] 保存失败: 响应不是有效 JSON, status={response.status_code}")
-            return False
+            return None, response.status_code
 
     except Exception as e:
         logger.error(f"[Craft] 请求异常: {e}")
-        return False
+        return None, 0
 
 
 def fetch_todo_blocks(link_id: str, doc_id: str, token: str) -> List[Dict]:
@@ -0,0 +1,270 @@
+"""
+按天分组写入 Craft
+
+绑定的 group_mode 为 daily 时，消息不再逐条追加到文档末尾，而是：
+- 每天在文档末尾建一个以日期为标题的子页面，当天的消息写入该页面；
+  页面 id 缓存在进程内与 craft_day_pages 表中，每天只创建一次
+- 同一页面的消息先缓冲 CRAFT_BATCH_WINDOW 秒（或攒满 CRAFT_BATCH_MAX_BLOCKS 个 block），
+  再合并为一次 API 请求
+- 同一批中同一发送者在 CRAFT_MERGE_WINDOW 秒内的连续文本合并为一个 block
+
+转发时用 submit 缓冲后立即返回，不在批次窗口内占用分发 worker；返回的 future 交给分发器延迟确认，
+批次写入失败的消息由分发器写入 pending_messages 重放。
+
+已写入 Craft 的 block 不会再修改，合并只发生在同一批缓冲内。
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.models.binding import UserBinding
+from src.models.chat_record import UnifiedMessage
+from src.services import craft
+
+logger = logging.getLogger(__name__)
+
+CRAFT_BATCH_WINDOW = float(os.getenv("CRAFT_BATCH_WINDOW", "2"))
+CRAFT_BATCH_MAX_BLOCKS = int(os.getenv("CRAFT_BATCH_MAX_BLOCKS", "50"))
+CRAFT_MERGE_WINDOW = int(os.getenv("CRAFT_MERGE_WINDOW", "300"))
+CRAFT_DAY_TITLE_FORMAT = os.getenv("CRAFT_DAY_TITLE_FORMAT", "%Y-%m-%d")
+
+# (craft_link_id, craft_document_id, day)
+PageKey = Tuple[str, str, str]
+
+
+def _msg_ts(msg: UnifiedMessage) -> int:
+    """消息时间（Unix 秒，兼容毫秒），缺失时取当前时间"""
+    ts = msg.create_time or 0
+    if ts > 1e11:
+        ts //= 1000
+    return ts or int(datetime.now().timestamp())
+
+
+def _single_text(blocks: List[Dict]) -> Optional[str]:
+    """blocks 仅为一个文本 block 时返回其内容"""
+    if len(blocks) == 1 and blocks[0].get("type") == "text" and isinstance(blocks[0].get("markdown"), str):
+        return blocks[0]["markdown"]
+    return None
+
+
+class _Pending:
+    """缓冲中的一条消息"""
+
+    __slots__ = ("msg", "blocks", "token", "future")
+
+    def __init__(self, msg: UnifiedMessage, blocks: List[Dict], token: str, future: asyncio.Future):
+        self.msg = msg
+        self.blocks = blocks
+        self.token = token
+        self.future = future
+
+
+def merge_blocks(pending: List[_Pending], window: int = CRAFT_MERGE_WINDOW) -> Tuple[List[Dict], int]:
+    """
+    按消息时间排序并合并连续文本
+
+    Returns:
+        (合并后的 blocks, 被合并掉的消息数)
+    """
+    blocks: List[Dict] = []
+    merged = 0
+    # 上一个 block 可继续合并时为 (发送者, 时间)
+    last = None
+    for item in sorted(pending, key=lambda p: _msg_ts(p.msg)):
+        text = _single_text(item.blocks)
+        ts = _msg_ts(item.msg)
+        if text is not None and last and last[0] == item.msg.from_user and ts - last[1] <= window:
+            blocks[-1] = {"type": "text", "markdown": f"{blocks[-1]['markdown']}\n{text}"}
+            merged += 1
+        else:
+            blocks.extend(item.blocks)
+        last = (item.msg.from_user, ts) if text is not None else None
+    return blocks, merged
+
+
+def _lookup_page(conn, key: PageKey) -> Optional[str]:
+    row = conn.execute(
+        "SELECT page_id FROM craft_day_pages WHERE craft_link_id = ? AND craft_document_id = ? AND day = ?", key
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _save_page(conn, key: PageKey, page_id: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO craft_day_pages (craft_link_id, craft_document_id, day, page_id) VALUES (?, ?, ?, ?)",
+        (*key, page_id)
+    )
+
+
+def _delete_page(conn, key: PageKey) -> None:
+    conn.execute(
+        "DELETE FROM craft_day_pages WHERE craft_link_id = ? AND craft_document_id = ? AND day = ?", key
+    )
+
+
+class DailyWriter:
+    """按天分组 + 批量写入"""
+
+    def __init__(
+        self,
+        batch_window: float = CRAFT_BATCH_WINDOW,
+        max_blocks: int = CRAFT_BATCH_MAX_BLOCKS,
+        merge_window: int = CRAFT_MERGE_WINDOW,
+    ):
+        self.batch_window = batch_window
+        self.max_blocks = max(max_blocks, 1)
+        self.merge_window = merge_window
+        self._buffers: Dict[PageKey, List[_Pending]] = {}
+        self._timers: Dict[PageKey, asyncio.Task] = {}
+        self._tasks: set = set()
+        # 同一页面的创建与写入串行执行，保证页面只建一次、批次按顺序写入
+        self._locks: Dict[PageKey, asyncio.Lock] = {}
+        self._page_ids: Dict[PageKey, str] = {}
+        self.stats = {"messages": 0, "merged": 0, "requests": 0, "pages_created": 0, "failed": 0}
+
+    def submit(self, binding: UserBinding, msg: UnifiedMessage, blocks: List[Dict]) -> asyncio.Future:
+        """
+        缓冲一条消息的 blocks，立即返回
+
+        Returns:
+            所在批次写入完成后得到结果（是否写入成功）的 Future
+        """
+        day = datetime.fromtimestamp(_msg_ts(msg)).strftime("%Y-%m-%d")
+        key = (binding.craft_link_id, binding.craft_document_id, day)
+        future = asyncio.get_running_loop().create_future()
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(_Pending(msg, blocks, binding.craft_token, future))
+        self.stats["messages"] += 1
+
+        if sum(len(item.blocks) for item in buffer) >= self.max_blocks:
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            self._spawn(self._flush(key))
+        elif key not in self._timers:
+            self._timers[key] = self._spawn(self._flush_later(key))
+        return future
+
+    async def write(self, binding: UserBinding, msg: UnifiedMessage, blocks: List[Dict]) -> bool:
+        """缓冲一条消息的 blocks，等待所在批次写入完成，返回是否写入成功"""
+        return await self.submit(binding, msg, blocks)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, key: PageKey) -> None:
+        await asyncio.sleep(self.batch_window)
+        self._timers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: PageKey) -> None:
+        pending = self._buffers.pop(key, None)
+        if not pending:
+            return
+        blocks, merged = merge_blocks(pending, self.merge_window)
+        self.stats["merged"] += merged
+        try:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                ok = await self._append(key, pending[-1].token, blocks)
+        except Exception as e:
+            logger.error(f"[CraftWriter] 写入异常: doc={key[1]}, day={key[2]}, error={e}")
+            ok = False
+        if not ok:
+            self.stats["failed"] += len(pending)
+            logger.error(f"[CraftWriter] 转发失败: msgids={[item.msg.msg_id for item in pending]}")
+        logger.info(
+            f"[CraftWriter] {'写入成功' if ok else '写入失败'}: doc={key[1]}, day={key[2]}, "
+            f"messages={len(pending)}, blocks={len(blocks)}"
+        )
+        for item in pending:
+            if not item.future.done():
+                item.future.set_result(ok)
+
+    async def _append(self, key: PageKey, token: str, blocks: List[Dict]) -> bool:
+        page_id = await self._page_id(key, token)
+        if not page_id:
+            return False
+        self.stats["requests"] += 1
+        items, status = await asyncio.to_thread(craft.append_blocks, blocks, key[0], page_id, token)
+        if items is None and status == 404:
+            # 当天的页面已被删除：重建后重试一次
+            logger.warning(f"[CraftWriter] 日页面不存在，重新创建: doc={key[1]}, day={key[2]}")
+            await self._forget_page(key)
+            page_id = await self._page_id(key, token)
+            if not page_id:
+                return False
+            self.stats["requests"] += 1
+            items, _ = await asyncio.to_thread(craft.append_blocks, blocks, key[0], page_id, token)
+        return items is not None
+
+    async def _page_id(self, key: PageKey, token: str) -> Optional[str]:
+        """当天页面 id：进程内缓存 -> craft_day_pages -> 新建"""
+        from src.services import database
+
+        page_id = self._page_ids.get(key)
+        if page_id:
+            return page_id
+        try:
+            page_id = await database.run_read(_lookup_page, key)
+        except Exception as e:
+            logger.warning(f"[CraftWriter] 日页面查询失败: {key}, {e}")
+        if not page_id:
+            title = datetime.strptime(key[2], "%Y-%m-%d").strftime(CRAFT_DAY_TITLE_FORMAT)
+            self.stats["requests"] += 1
+            page_id = await asyncio.to_thread(craft.create_page, title, key[0], key[1], token)
+            if not page_id:
+                return None
+            self.stats["pages_created"] += 1
+            logger.info(f"[CraftWriter] 创建日页面: doc={key[1]}, day={key[2]}, page={page_id}")
+            try:
+                await database.run_write(_save_page, key, page_id)
+            except Exception as e:
+                logger.warning(f"[CraftWriter] 日页面保存失败: {key}, {e}")
+        self._page_ids[key] = page_id
+        return page_id
+
+    async def _forget_page(self, key: PageKey) -> None:
+        from src.services import database
+
+        self._page_ids.pop(key, None)
+        try:
+            await database.run_write(_delete_page, key)
+        except Exception as e:
+            logger.warning(f"[CraftWriter] 日页面删除失败: {key}, {e}")
+
+    def report(self) -> Dict:
+        return {**self.stats, "buffered": sum(len(b) for b in self._buffers.values())}
+
+    async def close(self) -> None:
+        """立即写入所有缓冲中的消息（关闭时调用）"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(*(self._flush(key) for key in list(self._buffers)))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# 全局写入器实例
+_writer = None
+
+
+def get_daily_writer() -> DailyWriter:
+    """获取按天分组写入器实例"""
+    global _writer
+    if _writer is None:
+        _writer = DailyWriter()
+    return _writer
+
+
+async def close_daily_writer() -> None:
+    """写入缓冲中的消息"""
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+        _writer = None
@@ -2,25 +2,45 @@
 数据库服务模块 (SQLite 版)
 仅保留统一消息存储功能
 """
-import json
 import logging
-import sqlite3
 import os
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from src.models.chat_record import UnifiedMessage
+from src.models.message import MessageItem, MessagePage
+from src.services.db_executor import DatabaseExecutor
+from src.services.db_pool import ConnectionPool, connect
+from src.services import archive, payload_store, search, stats
+from src.services.dedup import recent_messages
+from src.utils.cursor import decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
 # 数据库文件路径
 _db_path = "data/craftsaver.db"
+# 长连接池
+_pool: Optional[ConnectionPool] = None
+
+# 建表脚本目录
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql")
+SQL_FILES = [
+    "create_unified_messages.sql",
+    "create_message_payloads.sql",
+    "create_messages_fts.sql",
+    "create_message_stats.sql",
+    "create_media_objects.sql",
+    "create_craft_day_pages.sql",
+    "create_link_previews.sql",
+    "create_pending_messages.sql",
+    "create_user_mappings.sql",
+]
 
 
 def init_db(db_path: str = None, **kwargs) -> None:
     """初始化数据库配置"""
-    global _db_path
+    global _db_path, _pool
     if db_path:
         _db_path = db_path
 
@@ -29,111 +49,519 @@ def init_db(db_path: str = None, **kwargs) -> None:
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
 
+    if _pool is not None:
+        _pool.close()
+    _pool = ConnectionPool(_db_path)
+
     logger.info(f"[DB] SQLite 数据库路径: {_db_path}")
 
 
+def close_db() -> None:
+    """停止数据库执行器并关闭连接池"""
+    global _pool
+    if _executor.running:
+        _executor.stop()
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_pool() -> ConnectionPool:
+    """获取连接池，未初始化时按默认路径创建"""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(_db_path)
+    return _pool
+
+
+def init_schema() -> None:
+    """执行建表脚本，初始化数据库表"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for name in SQL_FILES:
+            sql_file = os.path.join(SQL_DIR, name)
+            if os.path.exists(sql_file):
+                with open(sql_file, "r") as f:
+                    cursor.executescript(f.read())
+                logger.info(f"[DB] Executed SQL: {sql_file}")
+        conn.commit()
+        cursor.close()
+        _apply_migrations(conn)
+
+
+def seed_dedup_filter() -> int:
+    """用最新的消息预热去重过滤器"""
+    with get_connection(readonly=True) as conn:
+        return recent_messages.seed(conn)
+
+
+def _migrate_unique_source_msg_id(conn) -> None:
+    """(source, msg_id) 唯一索引：先清理历史重复行，再替换旧的单列索引"""
+    conn.execute("""
+        DELETE FROM unified_messages
+        WHERE id NOT IN (SELECT MIN(id) FROM unified_messages GROUP BY source, msg_id)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unified_source_msg_id ON unified_messages(source, msg_id)")
+    conn.execute("DROP INDEX IF EXISTS idx_unified_msg_id")
+    conn.execute("DROP INDEX IF EXISTS idx_unified_source")
+
+
+def _migrate_build_fts(conn) -> None:
+    """为已有消息建立全文索引"""
+    indexed = search.rebuild_index(conn)
+    logger.info(f"[DB] 全文索引已建立: {indexed} 条")
+
+
+def _migrate_epoch_seq_columns(conn) -> None:
+    """新增整数时间戳 created_ts 与企微 seq 列并回填，建立按用户 / 类型的时间索引"""
+    conn.execute("ALTER TABLE unified_messages ADD COLUMN created_ts INTEGER")
+    conn.execute("ALTER TABLE unified_messages ADD COLUMN seq INTEGER")
+    # created_at 是本地时间字符串
+    conn.execute("""
+        UPDATE unified_messages SET created_ts = CAST(strftime('%s', created_at, 'utc') AS INTEGER)
+        WHERE created_at IS NOT NULL
+    """)
+
+    last_id = 0
+    while True:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM unified_messages WHERE source = 'wecom' AND id > ? ORDER BY id LIMIT 1000",
+            (last_id,)
+        )]
+        if not ids:
+            break
+        raw = payload_store.load_raw_data(conn, ids)
+        conn.executemany(
+            "UPDATE unified_messages SET seq = ? WHERE id = ?",
+            [(data.get("seq"), mid) for mid, data in raw.items() if isinstance(data, dict) and data.get("seq")]
+        )
+        last_id = ids[-1]
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unified_user_ts ON unified_messages(from_user, created_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unified_type_ts ON unified_messages(msg_type, created_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unified_source_seq ON unified_messages(source, seq)")
+
+
+def _migrate_message_stats(conn) -> None:
+    """按已有消息生成统计汇总（归档分区由 manage.py rebuild-stats 补充）"""
+    stats.rebuild_main(conn)
+
+
+def _migrate_binding_image_settings(conn) -> None:
+    """绑定级图片预处理设置（为空使用全局 IMAGE_MAX_DIMENSION / IMAGE_QUALITY）"""
+    conn.execute("ALTER TABLE user_mappings ADD COLUMN image_max_dimension INTEGER")
+    conn.execute("ALTER TABLE user_mappings ADD COLUMN image_quality INTEGER")
+
+
+def _migrate_media_objects_backend(conn) -> None:
+    """媒体清单记录对象所在的存储后端（已有记录都来自 COS）"""
+    conn.execute("ALTER TABLE media_objects ADD COLUMN backend TEXT NOT NULL DEFAULT 'cos'")
+
+
+def _migrate_binding_group_mode(conn) -> None:
+    """绑定级写入方式（flat / daily）"""
+    conn.execute("ALTER TABLE user_mappings ADD COLUMN group_mode TEXT NOT NULL DEFAULT 'flat'")
+
+
+def _migrate_message_ts_indexes(conn) -> None:
+    """按时间浏览 / 导出（不按发送者、类型过滤时）的 (created_ts, id) 与 (source, created_ts, id) 索引"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unified_ts ON unified_messages(created_ts, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unified_source_ts ON unified_messages(source, created_ts, id)")
+
+
+# 结构迁移（按顺序执行，已执行的记录在 schema_migrations 中）
+MIGRATIONS = [
+    ("0001_unique_source_msg_id", _migrate_unique_source_msg_id),
+    ("0002_messages_fts", _migrate_build_fts),
+    ("0003_epoch_seq_columns", _migrate_epoch_seq_columns),
+    ("0004_message_stats_daily", _migrate_message_stats),
+    ("0005_binding_image_settings", _migrate_binding_image_settings),
+    ("0006_media_objects_backend", _migrate_media_objects_backend),
+    ("0007_binding_group_mode", _migrate_binding_group_mode),
+    ("0008_message_ts_indexes", _migrate_message_ts_indexes),
+]
+
+
+def _apply_migrations(conn) -> None:
+    """执行尚未应用的结构迁移，每个迁移一个事务"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    applied = {row[0] for row in conn.execute("SELECT name FROM schema_migrations")}
+    for name, migrate in MIGRATIONS:
+        if name in applied:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute("INSERT INTO schema_migrations (name) VALUES (?)", (name,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"[DB] Applied migration: {name}")
+
+
 @contextmanager
-def get_connection():
-    """获取数据库连接 (Context Manager)"""
-    conn = sqlite3.connect(_db_path)
-    conn.row_factory = sqlite3.Row
-    try:
+def get_connection(readonly: bool = False):
+    """
+    获取数据库连接 (Context Manager)
+
+    Args:
+        readonly: True 时从只读连接池借出，否则使用共享写连接
+    """
+    pool = get_pool()
+    with (pool.reader() if readonly else pool.writer()) as conn:
         yield conn
-    finally:
-        conn.close()
 
 
-def _parse_msg_time(ts) -> Optional[str]:
-    """解析消息时间戳为 DATETIME 格式字符串"""
+def transaction():
+    """在写连接上开启一个事务 (Context Manager)，退出时提交，异常时回滚"""
+    return get_pool().transaction()
+
+
+# 单写线程 + 读线程池，供协程调用
+_executor = DatabaseExecutor(get_pool)
+
+
+async def run_write(fn, *args):
+    """在写线程中执行 fn(conn, *args)，与同时排队的写操作合并为一个事务"""
+    return await _executor.write(fn, *args)
+
+
+async def run_read(fn, *args):
+    """在读线程池中执行 fn(conn, *args)"""
+    return await _executor.read(fn, *args)
+
+
+def _parse_msg_ts(ts) -> Optional[int]:
+    """解析消息时间戳为 Unix 秒（兼容毫秒）"""
     if not ts:
         return None
     try:
         ts = int(ts)
         if ts > 1e11:
             ts = ts // 1000
+        return ts
+    except (ValueError, TypeError) as e:
+        logger.warning(f"[DB] 时间戳解析失败: {ts}, error={e}")
+        return None
+
+
+def _parse_msg_time(ts) -> Optional[str]:
+    """解析消息时间戳为 DATETIME 格式字符串"""
+    ts = _parse_msg_ts(ts)
+    if ts is None:
+        return None
+    try:
         dt = datetime.fromtimestamp(ts)
         return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except (ValueError, TypeError, OSError) as e:
+    except (ValueError, OverflowError, OSError) as e:
         logger.warning(f"[DB] 时间戳解析失败: {ts}, error={e}")
         return None
 
 
+_INSERT_MESSAGE_SQL = """
+INSERT OR IGNORE INTO unified_messages
+(msg_id, source, msg_type, from_user, content, raw_data, created_at, created_ts, seq)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 单条 IN 查询的参数上限
+_IN_CHUNK_SIZE = 500
+
+
+def _message_row(msg: UnifiedMessage) -> tuple:
+    """UnifiedMessage -> unified_messages 插入参数（raw_data 写入旁路表，此处留空）"""
+    return (
+        msg.msg_id,
+        msg.source,
+        msg.msg_type,
+        msg.from_user,
+        msg.content,
+        None,
+        _parse_msg_time(msg.create_time),
+        _parse_msg_ts(msg.create_time),
+        msg.raw_data.get("seq") if msg.raw_data else None,
+    )
+
+
+def _stats_key(row: tuple) -> tuple:
+    """插入参数 -> stats.record 所需的 (created_at, source, from_user, msg_type)"""
+    return row[6], row[1], row[3], row[2]
+
+
+def _row_ids(conn, msgs: List[UnifiedMessage]) -> dict:
+    """查询一批消息的 (source, msg_id) -> unified_messages.id"""
+    by_source = {}
+    for msg in msgs:
+        by_source.setdefault(msg.source, []).append(msg.msg_id)
+
+    ids = {}
+    for source, msg_ids in by_source.items():
+        for i in range(0, len(msg_ids), _IN_CHUNK_SIZE):
+            chunk = msg_ids[i:i + _IN_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id, msg_id FROM unified_messages WHERE source = ? AND msg_id IN ({placeholders})",
+                (source, *chunk)
+            )
+            ids.update(((source, row[1]), row[0]) for row in rows)
+    return ids
+
+
+def _existing_keys(conn, msgs: List[UnifiedMessage]) -> set:
+    """查询一批消息中已存在的 (source, msg_id)"""
+    return set(_row_ids(conn, msgs))
+
+
+def _message_exists(conn, msg: UnifiedMessage) -> bool:
+    cursor = conn.execute(
+        "SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
+        (msg.source, msg.msg_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def _insert_message(conn, msg: UnifiedMessage) -> bool:
+    row = _message_row(msg)
+    cursor = conn.execute(_INSERT_MESSAGE_SQL, row)
+    if cursor.rowcount == 0:
+        return False
+    payload_store.save_payloads(conn, [(cursor.lastrowid, msg.raw_data)])
+    search.index_rows(conn, [(cursor.lastrowid, msg.msg_type, msg.content, msg.raw_data)])
+    stats.record(conn, [_stats_key(row)])
+    return True
+
+
+def _insert_many(conn, msgs: List[UnifiedMessage]) -> List[UnifiedMessage]:
+    """
+    批量插入（msgs 已按 (source, msg_id) 去重），返回新写入的消息
+
+    AUTOINCREMENT 保证新行的 id 大于插入前的最大 id，据此区分新行与被忽略的已有行，
+    无需插入前再查一次。
+    """
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM unified_messages").fetchone()[0]
+    rows = [_message_row(m) for m in msgs]
+    conn.executemany(_INSERT_MESSAGE_SQL, rows)
+    ids = _row_ids(conn, msgs)
+    new = [(msg, row) for msg, row in zip(msgs, rows) if ids.get((msg.source, msg.msg_id), 0) > max_id]
+    if new:
+        payload_store.save_payloads(conn, [(ids[(m.source, m.msg_id)], m.raw_data) for m, _ in new])
+        search.index_rows(conn, [(ids[(m.source, m.msg_id)], m.msg_type, m.content, m.raw_data) for m, _ in new])
+        stats.record(conn, [_stats_key(row) for _, row in new])
+    return [msg for msg, _ in new]
+
+
+def _get_raw_data(conn, source: str, msg_id: str) -> Optional[dict]:
+    row = conn.execute(
+        "SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
+        (source, msg_id)
+    ).fetchone()
+    if row:
+        return payload_store.load_raw_data(conn, [row[0]]).get(row[0])
+
+    # 主库没有时到归档分区中查找
+    with archive.unified_view(conn):
+        row = conn.execute(
+            f"SELECT id, part FROM {archive.VIEW_NAME} WHERE source = ? AND msg_id = ?",
+            (source, msg_id)
+        ).fetchone()
+        if not row:
+            return None
+        return payload_store.load_raw_data(conn, [row[0]], schema=row[1]).get(row[0])
+
+
+_MESSAGE_COLUMNS = "id, msg_id, source, msg_type, from_user, content, created_at, created_ts, seq"
+
+
+def _list_messages(conn, filters: dict, limit: int, after: Optional[list], include_archive: bool) -> MessagePage:
+    """
+    按 (created_ts, id) 倒序的 keyset 分页
+
+    按发送者 / 类型过滤时走 (from_user, created_ts) / (msg_type, created_ts) 索引，
+    按来源或只按时间时走 (source, created_ts, id) / (created_ts, id) 索引，每页是一次索引范围扫描。
+    同时按多个列过滤时 SQLite 只选其中一个索引，其余条件逐行过滤，页的代价取决于匹配的稀疏程度。
+    """
+    where = ["created_ts IS NOT NULL"]
+    params = []
+    for column in ("from_user", "msg_type", "source"):
+        if filters.get(column):
+            where.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters.get("since") is not None:
+        where.append("created_ts >= ?")
+        params.append(filters["since"])
+    if filters.get("until") is not None:
+        where.append("created_ts < ?")
+        params.append(filters["until"])
+    if after:
+        where.append("(created_ts, id) < (?, ?)")
+        params.extend(after)
+    params.append(limit + 1)
+
+    def _query(table: str):
+        return conn.execute(
+            f"SELECT {_MESSAGE_COLUMNS} FROM {table} WHERE {' AND '.join(where)} "
+            f"ORDER BY created_ts DESC, id DESC LIMIT ?",
+            params
+        ).fetchall()
+
+    if include_archive:
+        since = filters.get("since")
+        until = filters.get("until")
+        with archive.unified_view(
+            conn,
+            since=_parse_msg_time(since) if since is not None else None,
+            until=_parse_msg_time(until) if until is not None else None,
+        ):
+            rows = _query(archive.VIEW_NAME)
+    else:
+        rows = _query("unified_messages")
+
+    items = [MessageItem(**dict(row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([items[-1].created_ts, items[-1].id])
+    return MessagePage(items=items, next_cursor=next_cursor)
+
+
+def _get_last_seq(conn) -> int:
+    """
+    企微消息的最大 seq
+
+    归档按时间搬走较早的消息，主库有企微消息时其最大 seq 即为全局最大；
+    主库中已全部归档时到分区中查找，避免从头重新拉取全部历史。
+    """
+    result = conn.execute("SELECT MAX(seq) FROM unified_messages WHERE source = 'wecom'").fetchone()
+    if result and result[0]:
+        return result[0]
+    with archive.unified_view(conn):
+        result = conn.execute(f"SELECT MAX(seq) FROM {archive.VIEW_NAME} WHERE source = 'wecom'").fetchone()
+    return result[0] if result and result[0] else 0
+
+
 class DatabaseService:
-    """数据库服务类"""
+    """
+    数据库服务类
+
+    所有方法均为协程：写操作交给单写线程合并提交，读操作在读线程池执行，
+    不阻塞事件循环。
+    """
 
     @staticmethod
     def get_connection():
-        """获取原始数据库连接对象"""
-        conn = sqlite3.connect(_db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取独立的原始数据库连接对象（调用方负责关闭）"""
+        return connect(_db_path)
 
     @staticmethod
-    def message_exists(msg: UnifiedMessage) -> bool:
-        """检查统一消息是否已存在"""
+    async def message_exists(msg: UnifiedMessage) -> bool:
+        """检查统一消息是否已存在（去重过滤器未命中时不查库）"""
+        if not recent_messages.might_contain(msg.source, msg.msg_id):
+            return False
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
-                    (msg.source, msg.msg_id)
-                )
-                return cursor.fetchone() is not None
+            return await run_read(_message_exists, msg)
         except Exception as e:
             logger.error(f"[DB] 检查统一消息是否存在失败: msgid={msg.msg_id}, error={e}")
             return False
 
     @staticmethod
-    def save_unified_message(msg: UnifiedMessage) -> bool:
-        """保存统一消息"""
+    async def save_unified_message(msg: UnifiedMessage) -> bool:
+        """保存统一消息，已存在时返回 False"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-
-                # 检查是否已存在
-                cursor.execute(
-                    "SELECT id FROM unified_messages WHERE source = ? AND msg_id = ?",
-                    (msg.source, msg.msg_id)
-                )
-                if cursor.fetchone():
-                    logger.info(f"[DB] 统一消息已存在，跳过: source={msg.source}, msgid={msg.msg_id}")
-                    return False
-
-                # 插入新消息
-                sql = """
-                INSERT INTO unified_messages
-                (msg_id, source, msg_type, from_user, content, raw_data, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """
-
-                created_at = _parse_msg_time(msg.create_time)
-
-                cursor.execute(sql, (
-                    msg.msg_id,
-                    msg.source,
-                    msg.msg_type,
-                    msg.from_user,
-                    msg.content,
-                    json.dumps(msg.raw_data, ensure_ascii=False),
-                    created_at
-                ))
-                conn.commit()
-                logger.info(f"[DB] 统一消息保存成功: source={msg.source}, msgid={msg.msg_id}")
-                return True
-
+            # 可能重复时先在读连接上确认，避免占用写线程
+            if recent_messages.might_contain(msg.source, msg.msg_id) and await run_read(_message_exists, msg):
+                inserted = False
+            else:
+                inserted = await run_write(_insert_message, msg)
         except Exception as e:
             logger.error(f"[DB] 保存统一消息失败: msgid={msg.msg_id}, error={e}")
             return False
 
+        recent_messages.add(msg.source, msg.msg_id)
+        if not inserted:
+            logger.info(f"[DB] 统一消息已存在，跳过: source={msg.source}, msgid={msg.msg_id}")
+            return False
+        logger.info(f"[DB] 统一消息保存成功: source={msg.source}, msgid={msg.msg_id}")
+        return True
+
+    @staticmethod
+    async def save_many(msgs: List[UnifiedMessage]) -> Optional[List[UnifiedMessage]]:
+        """
+        批量保存统一消息（整页一个事务）
+
+        依赖 (source, msg_id) 唯一索引做 INSERT OR IGNORE，去重与落库只需一次往返；
+        去重过滤器判定可能重复的消息先在读连接上确认，整页都是重复时不占用写线程。
+
+        Returns:
+            新写入的消息列表（保持输入顺序，页内重复只保留第一条）；失败返回 None
+        """
+        if not msgs:
+            return []
+
+        unique = {}
+        for msg in msgs:
+            unique.setdefault((msg.source, msg.msg_id), msg)
+
+        try:
+            maybe = [m for m in unique.values() if recent_messages.might_contain(m.source, m.msg_id)]
+            if maybe:
+                for key in await run_read(_existing_keys, maybe):
+                    unique.pop(key)
+            new_msgs = await run_write(_insert_many, list(unique.values())) if unique else []
+        except Exception as e:
+            logger.error(f"[DB] 批量保存统一消息失败: count={len(msgs)}, error={e}")
+            return None
+
+        recent_messages.add_many((m.source, m.msg_id) for m in new_msgs)
+        logger.info(f"[DB] 批量保存统一消息: total={len(msgs)}, new={len(new_msgs)}, "
+                    f"skipped={len(msgs) - len(new_msgs)}")
+        return new_msgs
+
+    @staticmethod
+    async def get_raw_data(source: str, msg_id: str) -> Optional[dict]:
+        """按需加载并解压单条消息的原始数据"""
+        try:
+            return await run_read(_get_raw_data, source, msg_id)
+        except Exception as e:
+            logger.error(f"[DB] 读取原始数据失败: msgid={msg_id}, error={e}")
+            return None
+
+    @staticmethod
+    async def list_messages(
+        from_user: Optional[str] = None,
+        msg_type: Optional[str] = None,
+        source: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_archive: bool = False,
+    ) -> MessagePage:
+        """
+        按时间倒序浏览消息，游标分页（不使用 OFFSET，每页开销与翻到第几页无关）
+
+        Raises:
+            ValueError: 游标无效
+        """
+        after = decode_cursor(cursor, 2) if cursor else None
+        filters = {
+            "from_user": from_user,
+            "msg_type": msg_type,
+            "source": source,
+            "since": int(since.timestamp()) if since else None,
+            "until": int(until.timestamp()) if until else None,
+        }
+        return await run_read(_list_messages, filters, limit, after, include_archive)
+
     @staticmethod
-    def get_last_seq() -> int:
+    async def get_last_seq() -> int:
         """获取最后处理的序号"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT MAX(seq) FROM wecom_messages")
-                result = cursor.fetchone()
-                return result[0] if result and result[0] else 0
+            return await run_read(_get_last_seq)
         except Exception as e:
             logger.warning(f"[DB] 获取最后序号失败: {e}")
             return 0
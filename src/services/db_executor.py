@@ -0,0 +1,147 @@
+"""
+数据库执行器模块
+
+将 SQLite 调用移出事件循环：
+- 写：专用写线程独占写连接，消费写操作队列，把同一时刻排队的写操作合并进
+  一个事务（每个操作包在 SAVEPOINT 中，单个失败不影响同批其他操作）
+- 读：小型线程池，每个线程从只读连接池借出连接执行查询
+
+写 / 读操作都是形如 fn(conn, *args) 的同步函数，自身不做 commit，
+由执行器负责事务边界；协程侧通过 await write(...) / await read(...) 获取结果。
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.services.db_pool import ConnectionPool, SQLITE_READ_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 单个事务最多合并的写操作数
+DB_WRITE_BATCH_SIZE = 256
+
+_STOP = object()
+
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    """在事件循环线程中设置 Future 结果"""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class DatabaseExecutor:
+    """单写线程 + 读线程池"""
+
+    def __init__(
+        self,
+        pool_getter: Callable[[], ConnectionPool],
+        read_workers: int = SQLITE_READ_POOL_SIZE,
+        batch_size: int = DB_WRITE_BATCH_SIZE,
+    ):
+        self._pool_getter = pool_getter
+        self._read_workers = max(read_workers, 1)
+        self._batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "transactions": 0, "reads": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and self._writer.is_alive()
+
+    def start(self) -> None:
+        """启动写线程与读线程池（重复调用无副作用）"""
+        with self._lock:
+            if self.running:
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+            self._writer.start()
+            self._readers = ThreadPoolExecutor(max_workers=self._read_workers, thread_name_prefix="db-reader")
+            logger.info(f"[DB] 数据库执行器已启动: readers={self._read_workers}")
+
+    def stop(self, timeout: float = 10) -> None:
+        """处理完已排队的写操作后停止"""
+        with self._lock:
+            if self._writer is not None:
+                self._queue.put(_STOP)
+                self._writer.join(timeout=timeout)
+                self._writer = None
+            if self._readers is not None:
+                self._readers.shutdown(wait=True)
+                self._readers = None
+        logger.info(f"[DB] 数据库执行器已停止: {self.stats}")
+
+    async def write(self, fn: Callable, *args) -> Any:
+        """提交写操作 fn(conn, *args)，等待其所在事务提交后返回结果"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((fn, args, future, loop))
+        return await future
+
+    async def read(self, fn: Callable, *args) -> Any:
+        """在读线程池中执行 fn(conn, *args)"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+
+    def _run_read(self, fn: Callable, args: tuple) -> Any:
+        self.stats["reads"] += 1
+        with self._pool_getter().reader() as conn:
+            return fn(conn, *args)
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list) -> None:
+        results = []
+        try:
+            with self._pool_getter().writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, args, future, loop in batch:
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        result = fn(conn, *args)
+                        conn.execute("RELEASE op")
+                        results.append((future, loop, result, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO op")
+                        conn.execute("RELEASE op")
+                        results.append((future, loop, None, e))
+                conn.commit()
+            self.stats["writes"] += len(batch)
+            self.stats["transactions"] += 1
+        except Exception as e:
+            logger.error(f"[DB] 写事务失败: ops={len(batch)}, error={e}")
+            results = [(future, loop, None, e) for _, _, future, loop in batch]
+
+        for future, loop, result, error in results:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
@@ -0,0 +1,129 @@
+"""
+SQLite 连接管理模块
+
+复用长连接，避免每次查询都重新 sqlite3.connect：
+- 单个写连接，由锁串行化（SQLite 同一时刻只允许一个写事务）
+- 只读连接池，WAL 模式下读不阻塞写
+- 统一设置 WAL / synchronous=NORMAL / mmap_size / cache_size / busy_timeout
+
+连接均以 isolation_level=None（自动提交）打开，需要多语句事务时使用
+ConnectionPool.transaction()，由其显式 BEGIN IMMEDIATE / COMMIT。
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# 连接参数
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+
+
+def connect(db_path: str, readonly: bool = False) -> sqlite3.Connection:
+    """创建一个已设置好 PRAGMA 的连接"""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    if not readonly:
+        # journal_mode 是持久化设置，由写连接负责切换
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+class ConnectionPool:
+    """单写连接 + 只读连接池"""
+
+    def __init__(self, db_path: str, read_pool_size: int = SQLITE_READ_POOL_SIZE):
+        self.db_path = db_path
+        self.read_pool_size = max(read_pool_size, 1)
+        self._write_conn = None
+        self._write_lock = threading.RLock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._write_conn is None:
+            self._write_conn = connect(self.db_path)
+            logger.info(f"[DB] 写连接已建立: {self.db_path}")
+        return self._write_conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """独占写连接；异常时回滚未提交的事务"""
+        with self._write_lock:
+            conn = self._get_writer()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """在写连接上执行一个 BEGIN IMMEDIATE 事务"""
+        with self.writer() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """从只读池中借出一个连接，用完归还"""
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                if self._reader_count < self.read_pool_size:
+                    self._reader_count += 1
+                    conn = connect(self.db_path, readonly=True)
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        """关闭所有连接（写连接关闭前做一次 checkpoint）"""
+        with self._write_lock:
+            if self._write_conn is not None:
+                try:
+                    self._write_conn.execute("PRAGMA optimize")
+                    self._write_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    logger.warning(f"[DB] 关闭前 checkpoint 失败: {e}")
+                self._write_conn.close()
+                self._write_conn = None
+        with self._reader_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._reader_count = 0
@@ -0,0 +1,100 @@
+"""
+消息去重过滤器
+
+重复消息只会出现在重启后的重叠拉取窗口或回调竞争中，没必要每条都查库。
+这里用两代轮换的布隆过滤器记录最近 DEDUP_RECENT_SIZE 个 (source, msg_id)：
+- 未命中：该消息不在最近窗口内，直接视为新消息，不访问数据库
+- 命中：可能重复（含少量误判），再交给数据库确认
+
+启动时用主库中最新的消息预热；未预热前所有查询都视为“可能命中”，行为与
+无过滤器时一致。最终的唯一性仍由 (source, msg_id) 唯一索引保证。
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+from typing import Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEDUP_RECENT_SIZE = int(os.getenv("DEDUP_RECENT_SIZE", "200000"))
+DEDUP_FALSE_POSITIVE_RATE = float(os.getenv("DEDUP_FALSE_POSITIVE_RATE", "0.001"))
+
+
+class BloomFilter:
+    """定长布隆过滤器（双重哈希）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RecentMessageFilter:
+    """最近消息的去重过滤器（两代布隆过滤器轮换，窗口约为 capacity 条）"""
+
+    def __init__(self, capacity: int = DEDUP_RECENT_SIZE, error_rate: float = DEDUP_FALSE_POSITIVE_RATE):
+        self._generation_size = max(capacity // 2, 1)
+        self._error_rate = error_rate
+        self._current = BloomFilter(self._generation_size, error_rate)
+        self._previous = None
+        self._lock = threading.Lock()
+        self.ready = False
+        self.stats = {"misses": 0, "maybe_hits": 0}
+
+    @staticmethod
+    def _key(source: str, msg_id: str) -> str:
+        return f"{source}\x1f{msg_id}"
+
+    def add(self, source: str, msg_id: str) -> None:
+        key = self._key(source, msg_id)
+        with self._lock:
+            if self._current.count >= self._generation_size:
+                self._previous = self._current
+                self._current = BloomFilter(self._generation_size, self._error_rate)
+            self._current.add(key)
+
+    def add_many(self, keys: Iterable[Tuple[str, str]]) -> None:
+        for source, msg_id in keys:
+            self.add(source, msg_id)
+
+    def might_contain(self, source: str, msg_id: str) -> bool:
+        """False 表示确定不在最近窗口内；True 表示可能重复，需要查库确认"""
+        if not self.ready:
+            return True
+        key = self._key(source, msg_id)
+        found = key in self._current or (self._previous is not None and key in self._previous)
+        self.stats["maybe_hits" if found else "misses"] += 1
+        return found
+
+    def seed(self, conn) -> int:
+        """用主库中最新的消息预热，返回加载的条数"""
+        rows = conn.execute(
+            "SELECT source, msg_id FROM unified_messages ORDER BY id DESC LIMIT ?",
+            (self._generation_size * 2,)
+        ).fetchall()
+        # 按从旧到新的顺序写入，让最新的消息落在当前代
+        self.add_many((row[0], row[1]) for row in reversed(rows))
+        self.ready = True
+        logger.info(f"[Dedup] 去重过滤器已预热: {len(rows)} 条")
+        return len(rows)
+
+
+recent_messages = RecentMessageFilter()
@@ -0,0 +1,307 @@
+"""
+有界消息分发
+
+轮询拉取的消息落库去重后放入有界队列（DISPATCH_QUEUE_SIZE 条），由 DISPATCH_WORKERS 个 worker 逐条分发：
+- 队列满时 submit 阻塞，轮询随之暂停，追赶大量历史消息时在途任务数不会无限增长
+- 关闭时先停止拉取（等待当前这次拉取结束），再在 DISPATCH_DRAIN_TIMEOUT 秒内处理完队列；
+  超时仍未完成的消息（队列中的与正在处理的）写入 pending_messages 表，下次启动时重新分发
+- Handler 的结果在返回后才确定时（如按天批量写入），用 defer_ack 登记 future：worker 立即处理下一条，
+  消息在 future 成功后才确认（删除待重放记录），失败或关闭时仍未完成则写入 pending_messages
+
+被中断的消息会从头重新分发，Handler 可能已完成部分工作（至少一次语义）。
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.models.chat_record import UnifiedMessage
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", "200"))
+DISPATCH_DRAIN_TIMEOUT = float(os.getenv("DISPATCH_DRAIN_TIMEOUT", "30"))
+
+# (消息, 是否来自 pending_messages)
+_Item = Tuple[UnifiedMessage, bool]
+
+# 当前分发中的消息登记的延迟确认 future（由 worker 设置）
+_deferred: contextvars.ContextVar[Optional[List[asyncio.Future]]] = contextvars.ContextVar(
+    "dispatch_deferred", default=None
+)
+
+
+def defer_ack(future: asyncio.Future) -> None:
+    """
+    登记当前消息的延迟确认：future 结果为 True 时消息才算处理完成
+
+    不经分发器处理（没有 worker 上下文）时忽略。
+    """
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.append(future)
+
+
+def _load_pending(conn) -> List[UnifiedMessage]:
+    rows = conn.execute("SELECT payload FROM pending_messages ORDER BY rowid").fetchall()
+    return [UnifiedMessage.model_validate_json(row[0]) for row in rows]
+
+
+def _save_pending(conn, msgs: List[UnifiedMessage]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO pending_messages (source, msg_id, payload) VALUES (?, ?, ?)",
+        [(msg.source, msg.msg_id, msg.model_dump_json()) for msg in msgs]
+    )
+
+
+def _delete_pending(conn, source: str, msg_id: str) -> None:
+    conn.execute("DELETE FROM pending_messages WHERE source = ? AND msg_id = ?", (source, msg_id))
+
+
+def count_pending(conn) -> int:
+    """待重放的消息条数"""
+    return conn.execute("SELECT COUNT(*) FROM pending_messages").fetchone()[0]
+
+
+class MessageDispatcher:
+    """有界队列 + 固定数量 worker"""
+
+    def __init__(
+        self,
+        workers: int = DISPATCH_WORKERS,
+        queue_size: int = DISPATCH_QUEUE_SIZE,
+        drain_timeout: float = DISPATCH_DRAIN_TIMEOUT,
+    ):
+        self.worker_count = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._producers: Set[asyncio.Task] = set()
+        self._replay: Optional[asyncio.Task] = None
+        # worker 正在处理的消息
+        self._inflight: Dict[asyncio.Task, _Item] = {}
+        # 等待延迟确认的消息
+        self._settling: Dict[asyncio.Task, UnifiedMessage] = {}
+        self._stopping = asyncio.Event()
+        self.stats = {"submitted": 0, "dispatched": 0, "replayed": 0, "persisted": 0, "paused": 0, "deferred": 0}
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    async def start(self) -> None:
+        """启动 worker，并重放上次关闭时未处理完的消息"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._replay = asyncio.create_task(self._replay_pending())
+        logger.info(f"[Dispatcher] 启动: workers={self.worker_count}, queue_size={self.queue_size}")
+
+    def add_producer(self, task: asyncio.Task) -> None:
+        """登记消息生产者（轮询任务），关闭时等待其结束当前拉取"""
+        self._producers.add(task)
+        task.add_done_callback(self._producers.discard)
+
+    async def submit(self, msgs: List[UnifiedMessage]) -> int:
+        """
+        落库去重后把新消息放入队列，队列满时等待（轮询因此暂停）
+
+        Returns:
+            入队的新消息条数
+        """
+        from src.services.database import DatabaseService
+
+        new_msgs = await DatabaseService.save_many(msgs)
+        if new_msgs is None:
+            logger.error(f"[Dispatcher] 批量落库失败，直接分发 {len(msgs)} 条消息")
+            new_msgs = msgs
+        if not new_msgs:
+            return 0
+
+        if self.stopping or self._queue is None:
+            # 关闭过程中拉到的消息不再入队，直接留待下次启动
+            await self._persist(new_msgs)
+            return len(new_msgs)
+
+        self.stats["submitted"] += len(new_msgs)
+        for index, msg in enumerate(new_msgs):
+            if not await self._put((msg, False)):
+                await self._persist(new_msgs[index:])
+                break
+        return len(new_msgs)
+
+    async def _put(self, item: _Item) -> bool:
+        """放入队列；队列满时等待空位，等待期间开始关闭则放弃并返回 False"""
+        if not self._queue.full():
+            self._queue.put_nowait(item)
+            return True
+        self.stats["paused"] += 1
+        logger.info(f"[Dispatcher] 队列已满 ({self.queue_size})，暂停拉取")
+        put = asyncio.ensure_future(self._queue.put(item))
+        stop = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({put, stop}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+            if not put.done():
+                put.cancel()
+        return put.done() and not put.cancelled()
+
+    async def _replay_pending(self) -> None:
+        from src.services import database
+
+        try:
+            msgs = await database.run_read(_load_pending)
+        except Exception as e:
+            logger.error(f"[Dispatcher] 读取待重放消息失败: {e}")
+            return
+        if not msgs:
+            return
+        logger.info(f"[Dispatcher] 重放上次未处理完的消息: {len(msgs)} 条")
+        for msg in msgs:
+            # 关闭时尚未入队的消息仍留在表中
+            if not await self._put((msg, True)):
+                break
+            self.stats["replayed"] += 1
+
+    async def _worker(self) -> None:
+        from src.services import database
+        from src.services.message_processor import dispatch_message
+
+        task = asyncio.current_task()
+        while True:
+            msg, replayed = item = await self._queue.get()
+            self._inflight[task] = item
+            deferred = []
+            token = _deferred.set(deferred)
+            try:
+                await dispatch_message(msg)
+                self.stats["dispatched"] += 1
+                if deferred:
+                    self._settle_later(msg, deferred)
+                elif replayed:
+                    await database.run_write(_delete_pending, msg.source, msg.msg_id)
+            except Exception as e:
+                logger.error(f"[Dispatcher] 分发异常: msgid={msg.msg_id}, error={e}", exc_info=True)
+            finally:
+                _deferred.reset(token)
+            # 被取消时消息留在 _inflight 中，由 close 保存
+            self._inflight.pop(task, None)
+            self._queue.task_done()
+
+    def _settle_later(self, msg: UnifiedMessage, futures: List[asyncio.Future]) -> None:
+        """不占用 worker 等待延迟确认"""
+        self.stats["deferred"] += 1
+        task = asyncio.ensure_future(self._settle(msg, futures))
+        self._settling[task] = msg
+        task.add_done_callback(lambda t: self._settling.pop(t, None))
+
+    async def _settle(self, msg: UnifiedMessage, futures: List[asyncio.Future]) -> None:
+        from src.services import database
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        if all(result is True for result in results):
+            # 来自 pending_messages 的消息此时才删除；新消息本就没有记录，删除为空操作
+            try:
+                await database.run_write(_delete_pending, msg.source, msg.msg_id)
+            except Exception as e:
+                logger.warning(f"[Dispatcher] 删除待重放记录失败: msgid={msg.msg_id}, {e}")
+        else:
+            logger.warning(f"[Dispatcher] 延迟确认失败，保存待重放: msgid={msg.msg_id}")
+            await self._persist([msg])
+
+    async def _persist(self, msgs: List[UnifiedMessage]) -> None:
+        from src.services import database
+
+        if not msgs:
+            return
+        try:
+            await database.run_write(_save_pending, msgs)
+            self.stats["persisted"] += len(msgs)
+            logger.warning(f"[Dispatcher] 未处理完的消息已保存，下次启动时重放: {len(msgs)} 条")
+        except Exception as e:
+            logger.error(f"[Dispatcher] 保存未处理消息失败，丢失 {len(msgs)} 条: {e}")
+
+    def report(self) -> Dict:
+        return {
+            **self.stats,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "inflight": len(self._inflight),
+            "settling": len(self._settling),
+        }
+
+    async def close(self) -> None:
+        """停止拉取，在期限内处理完队列，剩余消息写入 pending_messages"""
+        self._stopping.set()
+        deadline = time.monotonic() + self.drain_timeout
+
+        # 1. 等待生产者结束当前这次拉取（其间拉到的消息直接保存）
+        if self._producers:
+            _, pending = await asyncio.wait(list(self._producers), timeout=self.drain_timeout)
+            for task in pending:
+                logger.warning("[Dispatcher] 轮询未在期限内结束，强制取消")
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if self._queue is None:
+            return
+
+        # 2. 处理完队列中的消息
+        remaining = deadline - time.monotonic()
+        if self._queue.qsize() or self._inflight:
+            logger.info(f"[Dispatcher] 等待队列处理完成: queued={self._queue.qsize()}, "
+                        f"inflight={len(self._inflight)}, timeout={max(remaining, 0):.1f}s")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            pass
+
+        # 3. 超时：停止 worker 与重放，保存未完成的消息
+        tasks = [*self._workers, *([self._replay] if self._replay else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        leftover = [msg for msg, _ in self._inflight.values()]
+
+        # 4. 在剩余期限内等待延迟确认（如按天写入的批次窗口），仍未完成的一并保存
+        if self._settling:
+            _, unsettled = await asyncio.wait(
+                list(self._settling), timeout=max(deadline - time.monotonic(), 0)
+            )
+            leftover.extend(self._settling[task] for task in unsettled)
+            for task in unsettled:
+                task.cancel()
+            await asyncio.gather(*unsettled, return_exceptions=True)
+
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait()[0])
+        self._inflight.clear()
+        await self._persist(leftover)
+        self._queue = None
+        logger.info(f"[Dispatcher] 已关闭: {self.report()}")
+
+
+# 全局分发器实例
+_dispatcher = None
+
+
+def get_dispatcher() -> MessageDispatcher:
+    """获取消息分发器实例"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = MessageDispatcher()
+    return _dispatcher
+
+
+async def close_dispatcher() -> None:
+    """停止拉取并处理 / 保存剩余消息"""
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.close()
+        _dispatcher = None
@@ -0,0 +1,198 @@
+"""
+消息导出模块
+
+按过滤条件流式导出 unified_messages 为 NDJSON 或 CSV（可选 gzip）：
+- 使用独立的只读连接 + fetchmany 分批读取，内存占用与导出规模无关
+- 主库与各归档分区分别按 (created_ts, id) 索引顺序读取，再归并为全局有序的流，不做整表排序；
+  连接的临时存储改为文件（分区缺少索引时的排序不占用内存）
+- WAL 模式下读事务只持有快照，不会阻塞写入
+- 生成器逐块产出 bytes，供 StreamingResponse / 命令行直接写出
+"""
+import csv
+import heapq
+import io
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.services import archive, payload_store
+from src.services.database import get_pool
+from src.services.db_pool import connect
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_COLUMNS = ["id", "msg_id", "source", "msg_type", "from_user", "content", "created_at", "created_ts", "seq"]
+
+
+def _build_query(table: str, part: str, filters: Dict[str, Any]) -> tuple:
+    where = []
+    params = []
+    for column in ("source", "from_user", "msg_type"):
+        if filters.get(column):
+            where.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters.get("since"):
+        where.append("created_ts >= ?")
+        params.append(int(filters["since"].timestamp()))
+    if filters.get("until"):
+        where.append("created_ts < ?")
+        params.append(int(filters["until"].timestamp()))
+
+    columns = ", ".join(EXPORT_COLUMNS)
+    sql = f"SELECT {columns}, '{part}' AS part FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_ts, id"
+    return sql, params
+
+
+def _attach_raw_data(conn, batch: List[Dict[str, Any]]) -> None:
+    by_part: Dict[str, List[int]] = {}
+    for row in batch:
+        by_part.setdefault(row["part"], []).append(row["id"])
+    raw = {}
+    for part, ids in by_part.items():
+        for message_id, data in payload_store.load_raw_data(conn, ids, schema=part).items():
+            raw[(part, message_id)] = data
+    for row in batch:
+        row["raw_data"] = raw.get((row["part"], row["id"]))
+
+
+def iter_rows(
+    filters: Dict[str, Any],
+    include_archive: bool = False,
+    include_raw: bool = False,
+    fetch_size: int = EXPORT_FETCH_SIZE,
+) -> Iterator[List[Dict[str, Any]]]:
+    """按批产出消息行（dict 列表），使用独立只读连接"""
+    conn = connect(get_pool().db_path, readonly=True)
+    conn.execute("PRAGMA temp_store = FILE")
+    try:
+        if include_archive:
+            since = filters.get("since")
+            until = filters.get("until")
+            with archive.unified_view(
+                conn,
+                since=since.strftime("%Y-%m-%d %H:%M:%S") if since else None,
+                until=until.strftime("%Y-%m-%d %H:%M:%S") if until else None,
+            ) as schemas:
+                # 各库分别有序读取后归并（与 SQLite 一致，created_ts 为 NULL 的排在最前）
+                streams = [
+                    _iter_table(conn, f"{schema}.unified_messages", schema, filters, fetch_size) for schema in schemas
+                ]
+                rows = heapq.merge(*streams, key=lambda r: (r["created_ts"] is not None, r["created_ts"] or 0, r["id"]))
+                yield from _batches(conn, rows, include_raw, fetch_size)
+        else:
+            rows = _iter_table(conn, "unified_messages", "main", filters, fetch_size)
+            yield from _batches(conn, rows, include_raw, fetch_size)
+    finally:
+        conn.close()
+
+
+def _iter_table(conn, table: str, part: str, filters: Dict[str, Any], fetch_size: int) -> Iterator[Dict[str, Any]]:
+    """按 (created_ts, id) 顺序逐行读取一个库中的消息"""
+    sql, params = _build_query(table, part, filters)
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        cursor.close()
+
+
+def _batches(conn, rows: Iterator[Dict[str, Any]], include_raw: bool, fetch_size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= fetch_size:
+            yield _finish_batch(conn, batch, include_raw)
+            batch = []
+    if batch:
+        yield _finish_batch(conn, batch, include_raw)
+
+
+def _finish_batch(conn, batch: List[Dict[str, Any]], include_raw: bool) -> List[Dict[str, Any]]:
+    if include_raw:
+        _attach_raw_data(conn, batch)
+    for row in batch:
+        row.pop("part", None)
+    return batch
+
+
+def _encode_ndjson(batch: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in batch).encode("utf-8")
+
+
+def _encode_csv(batch: List[Dict[str, Any]], columns: List[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in batch:
+        writer.writerow([
+            json.dumps(row[c], ensure_ascii=False) if isinstance(row.get(c), (dict, list)) else row.get(c)
+            for c in columns
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+
+def export_stream(
+    fmt: str = "ndjson",
+    gzip: bool = False,
+    source: Optional[str] = None,
+    from_user: Optional[str] = None,
+    msg_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_archive: bool = False,
+    include_raw: bool = False,
+) -> Iterator[bytes]:
+    """
+    生成导出内容（bytes 块）
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unsupported format: {fmt}")
+
+    filters = {"source": source, "from_user": from_user, "msg_type": msg_type, "since": since, "until": until}
+    columns = EXPORT_COLUMNS + (["raw_data"] if include_raw else [])
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+
+    def _generate():
+        exported = 0
+        header = True
+        for batch in iter_rows(filters, include_archive=include_archive, include_raw=include_raw):
+            if fmt == "ndjson":
+                chunk = _encode_ndjson(batch)
+            else:
+                chunk = _encode_csv(batch, columns, header)
+                header = False
+            exported += len(batch)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if fmt == "csv" and header:
+            # 没有数据时也输出表头
+            chunk = _encode_csv([], columns, True)
+            yield compressor.compress(chunk) if compressor else chunk
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"[Export] 导出完成: format={fmt}, gzip={gzip}, rows={exported}")
+
+    return _generate()
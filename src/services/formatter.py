@@ -1,22 +1,44 @@
 """
 消息格式化服务模块
 
-将企微消息格式化为 Craft blocks
+将企微消息格式化为 Craft blocks，分两步：
+1. resolve（异步）：把媒体消息的 content（URL / 本地路径）解析为可访问的 URL，
+   本地文件在此预处理并上传；链接消息补充预览信息；合并转发 / 图文混排展开子项，
+   子项媒体并发拉取与上传。一批消息并发解析
+2. build_blocks（纯函数）：按消息类型查表生成 blocks，不做任何 I/O
 """
+import asyncio
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
+from pydantic import BaseModel
+
+from src.models.binding import UserBinding
 from src.models.chat_record import UnifiedMessage
+from src.services import composite
+from src.services.link_preview import LinkPreview, get_link_preview_service
 
 logger = logging.getLogger(__name__)
 
+# 需要解析媒体引用的消息类型
+MEDIA_TYPES = ("image", "file", "video")
+# 合并转发 / 图文混排中同时拉取的媒体数
+COMPOSITE_MEDIA_CONCURRENCY = int(os.getenv("COMPOSITE_MEDIA_CONCURRENCY", "4"))
+
+
+class ResolvedMedia(BaseModel):
+    """媒体引用解析结果"""
+    status: str = "ok"                 # ok / failed（上传失败）/ invalid（路径无效）/ empty（无内容）
+    url: Optional[str] = None
+    filename: Optional[str] = None
+
 
-def upload_to_cos(local_path: str) -> Optional[str]:
-    """上传文件到 COS，返回公开访问 URL"""
+async def upload_to_cos(local_path: str) -> Optional[str]:
+    """上传文件到存储后端（线程池中执行，不阻塞事件循环），返回公开访问 URL"""
     try:
-        from src.services.cos import upload_image
-        url = upload_image(local_path)
+        from src.services.upload_service import get_upload_service
+        url = await get_upload_service().upload(local_path)
         if url:
             return url
         logger.error(f"[Formatter] COS 上传失败: {local_path}")
@@ -26,163 +48,216 @@ def upload_to_cos(local_path: str) -> Optional[str]:
         return None
 
 
+def _is_url(content: str) -> bool:
+    return content.startswith("http://") or content.startswith("https://")
+
+
+async def resolve_media(msg: UnifiedMessage, binding: Optional[UserBinding] = None) -> Optional[ResolvedMedia]:
+    """
+    解析媒体消息的引用：URL 直接使用，本地文件预处理后上传
+
+    Returns:
+        非媒体消息返回 None
+    """
+    if msg.msg_type not in MEDIA_TYPES:
+        return None
+    if not msg.content:
+        return ResolvedMedia(status="empty")
+
+    # 文件消息优先使用原始数据中的真实文件名
+    display_name = None
+    if msg.msg_type == "file":
+        display_name = (msg.raw_data.get("file", {}) if msg.raw_data else {}).get("filename")
+
+    if _is_url(msg.content):
+        return ResolvedMedia(url=msg.content, filename=display_name or msg.content.split("/")[-1])
+
+    if not os.path.exists(msg.content):
+        return ResolvedMedia(status="invalid")
+
+    filename = display_name or os.path.basename(msg.content)
+    if msg.msg_type == "image":
+        # 按绑定设置缩小 / 重新压缩
+        from src.services.media_transform import media_transform
+        await media_transform.transform(msg.content, binding)
+
+    url = await upload_to_cos(msg.content)
+    if not url:
+        logger.warning(f"[Formatter] 媒体上传失败: type={msg.msg_type}, file={filename}")
+        return ResolvedMedia(status="failed", filename=filename)
+    return ResolvedMedia(url=url, filename=filename)
+
+
+async def resolve_link(msg: UnifiedMessage) -> Optional[LinkPreview]:
+    """链接预览：优先使用消息自带的标题 / 描述，否则查缓存或抓取页面"""
+    url = (msg.content or "").strip()
+    if not url.startswith("http"):
+        return None
+    payload = msg.raw_data.get("link") if msg.raw_data else None
+    try:
+        return await get_link_preview_service().preview(url, payload if isinstance(payload, dict) else None)
+    except Exception as e:
+        logger.warning(f"[Formatter] 链接预览失败: {url}, {e}")
+        return None
+
+
+class ResolvedComposite(BaseModel):
+    """合并转发 / 图文混排的解析结果：展开的子消息及其各自的解析结果"""
+    title: str
+    children: List[UnifiedMessage]
+    resolved: List[Any]
+
+
+async def resolve_composite(
+    msg: UnifiedMessage,
+    binding: Optional[UserBinding] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> ResolvedComposite:
+    """展开子项（含嵌套），所有子项的媒体拉取与上传并发进行"""
+    semaphore = semaphore or asyncio.Semaphore(max(COMPOSITE_MEDIA_CONCURRENCY, 1))
+    title, children = composite.expand(msg)
+
+    async def _resolve_child(child: UnifiedMessage):
+        if child.msg_type in composite.COMPOSITE_TYPES:
+            return await resolve_composite(child, binding, semaphore)
+        if child.msg_type in MEDIA_TYPES and not child.content:
+            async with semaphore:
+                child.content = await composite.fetch_media(child)
+        return await resolve(child, binding)
+
+    resolved = await asyncio.gather(*(_resolve_child(child) for child in children))
+    return ResolvedComposite(title=title, children=children, resolved=list(resolved))
+
+
+Resolved = Union[ResolvedMedia, LinkPreview, ResolvedComposite, None]
+
+
+async def resolve(msg: UnifiedMessage, binding: Optional[UserBinding] = None) -> Resolved:
+    """异步解析阶段：媒体上传 / 链接预览 / 展开合并消息，其他类型返回 None"""
+    if msg.msg_type == "link":
+        return await resolve_link(msg)
+    if msg.msg_type in composite.COMPOSITE_TYPES:
+        return await resolve_composite(msg, binding)
+    return await resolve_media(msg, binding)
+
+
+# ---- 纯 block 构建：每种消息类型一个函数 (msg, resolved) -> blocks ----
+
+def _text_block(markdown: str) -> Dict[str, Any]:
+    return {"type": "text", "markdown": markdown}
+
+
+def _file_block(url: str, filename: str) -> Dict[str, Any]:
+    return {"type": "file", "url": url, "fileName": filename, "markdown": f"[{filename}]({url})"}
+
+
+def _build_text(msg: UnifiedMessage, media: Optional[ResolvedMedia]) -> List[Dict[str, Any]]:
+    return [_text_block(msg.content)]
+
+
+def _build_image(msg: UnifiedMessage, media: ResolvedMedia) -> List[Dict[str, Any]]:
+    if media.status == "ok":
+        return [{"type": "image", "url": media.url}]
+    if media.status == "failed":
+        # 上传失败，使用文件名作为描述
+        return [_text_block(f"🖼 **{media.filename}**")]
+    if media.status == "invalid":
+        return [_text_block(f"🖼 **收到图片** (路径无效): `{msg.content}`")]
+    return [_text_block("🖼 **收到图片** (无内容)")]
+
+
+def _build_file(msg: UnifiedMessage, media: ResolvedMedia) -> List[Dict[str, Any]]:
+    if media.status == "ok":
+        return [_file_block(media.url, media.filename)]
+    if media.status == "failed":
+        return [_text_block(f"📁 **{media.filename}** (上传失败)")]
+    if media.status == "invalid":
+        return [_text_block(f"📁 **收到文件** (路径无效): `{msg.content}`")]
+    return [_text_block("📁 **收到文件** (无内容)")]
+
+
+def _build_video(msg: UnifiedMessage, media: ResolvedMedia) -> List[Dict[str, Any]]:
+    if media.status == "ok":
+        return [_file_block(media.url, media.filename)]
+    if media.status == "failed":
+        return [_text_block(f"🎥 **{media.filename}** (上传失败)")]
+    if media.status == "invalid":
+        return [_text_block(f"🎥 **收到视频** (路径无效): `{msg.content}`")]
+    return [_text_block("🎥 **收到视频** (无内容)")]
+
+
+def _build_link(msg: UnifiedMessage, preview: Optional[LinkPreview]) -> List[Dict[str, Any]]:
+    final_url = msg.content.strip()
+    if final_url and final_url.startswith("http"):
+        block = {"type": "richUrl", "url": final_url}
+        if preview and preview.title:
+            block["title"] = preview.title
+            if preview.description:
+                block["description"] = preview.description
+        return [block]
+    return [_text_block(f"🔗 **无效链接**: {final_url}")]
+
+
+def _build_composite(msg: UnifiedMessage, resolved: Optional[ResolvedComposite]) -> List[Dict[str, Any]]:
+    if resolved is None:
+        # 未解析：展开子项，媒体按“无内容”处理
+        title, children = composite.expand(msg)
+        resolved = ResolvedComposite(title=title, children=children, resolved=[None] * len(children))
+    blocks = []
+    for child, item in zip(resolved.children, resolved.resolved):
+        blocks.extend(build_blocks(child, item))
+    if msg.msg_type == "mixed":
+        # 图文混排按原顺序平铺
+        return blocks
+    # 合并转发写成一个子页面，随消息一次请求写入
+    return [{"type": "page", "markdown": f"💬 {resolved.title}", "content": blocks}]
+
+
+def _build_fallback(msg: UnifiedMessage, media: Optional[ResolvedMedia]) -> List[Dict[str, Any]]:
+    return [_text_block(f"[{msg.msg_type}] {msg.content}")]
+
+
+BlockBuilder = Callable[[UnifiedMessage, Resolved], List[Dict[str, Any]]]
+
+BLOCK_BUILDERS: Dict[str, BlockBuilder] = {
+    "text": _build_text,
+    "image": _build_image,
+    "file": _build_file,
+    "video": _build_video,
+    "link": _build_link,
+    "chatrecord": _build_composite,
+    "mixed": _build_composite,
+}
+
+
+def build_blocks(msg: UnifiedMessage, resolved: Resolved = None) -> List[Dict[str, Any]]:
+    """
+    由消息与解析结果生成 Craft blocks（纯函数，无 I/O）
+
+    媒体消息未提供解析结果时按“无内容”处理，链接消息未提供预览时只输出 URL。
+    """
+    if msg.msg_type in MEDIA_TYPES and resolved is None:
+        resolved = ResolvedMedia(status="empty")
+    return BLOCK_BUILDERS.get(msg.msg_type, _build_fallback)(msg, resolved)
+
+
 class MessageFormatter:
     """消息格式化服务"""
 
-    def __init__(self):
-        pass
-
-    def format_unified(self, msg: UnifiedMessage) -> List[Dict[str, Any]]:
+    async def format_unified(self, msg: UnifiedMessage, binding: Optional[UserBinding] = None) -> List[Dict[str, Any]]:
         """
         格式化 UnifiedMessage 为 Craft blocks
+
+        binding 用于读取绑定级的图片预处理设置
         """
-        blocks = []
-
-        # 内容处理
-        if msg.msg_type == "text":
-            blocks.append({
-                "type": "text",
-                "markdown": msg.content
-            })
-        elif msg.msg_type == "image":
-            # 图片处理
-            if msg.content:
-                # 检查是否是有效的 URL（以 http:// 或 https:// 开头）
-                if msg.content.startswith("http://") or msg.content.startswith("https://"):
-                    blocks.append({
-                        "type": "image",
-                        "url": msg.content
-                    })
-                # 检查本地文件是否存在
-                elif os.path.exists(msg.content):
-                    # 上传到 COS 获取公开 URL
-                    cos_url = upload_to_cos(msg.content)
-                    if cos_url:
-                        blocks.append({
-                            "type": "image",
-                            "url": cos_url
-                        })
-                    else:
-                        filename = os.path.basename(msg.content)
-                        logger.warning(f"[Formatter] 图片上传失败，使用文件名作为描述: {filename}")
-                        blocks.append({
-                            "type": "text",
-                            "markdown": f"🖼 **{filename}**"
-                        })
-                else:
-                    blocks.append({
-                        "type": "text",
-                        "markdown": f"🖼 **收到图片** (路径无效): `{msg.content}`"
-                    })
-            else:
-                blocks.append({
-                    "type": "text",
-                    "markdown": "🖼 **收到图片** (无内容)"
-                })
-        elif msg.msg_type == "file":
-            # 文件处理
-            if msg.content:
-                # 优先从原始数据中获取真实文件名
-                raw_file_data = msg.raw_data.get("file", {}) if msg.raw_data else {}
-                display_name = raw_file_data.get("filename")
-
-                # 检查是否是有效的 URL
-                if msg.content.startswith("http://") or msg.content.startswith("https://"):
-                    if not display_name:
-                        display_name = msg.content.split("/")[-1]
-                    blocks.append({
-                        "type": "file",
-                        "url": msg.content,
-                        "fileName": display_name,
-                        "markdown": f"[{display_name}]({msg.content})"
-                    })
-                # 检查本地文件是否存在
-                elif os.path.exists(msg.content):
-                    if not display_name:
-                        display_name = os.path.basename(msg.content)
-
-                    # 上传到 COS
-                    cos_url = upload_to_cos(msg.content)
-                    if cos_url:
-                        blocks.append({
-                            "type": "file",
-                            "url": cos_url,
-                            "fileName": display_name,
-                            "markdown": f"[{display_name}]({cos_url})"
-                        })
-                    else:
-                        logger.warning(f"[Formatter] 文件上传失败: {display_name}")
-                        blocks.append({
-                            "type": "text",
-                            "markdown": f"📁 **{display_name}** (上传失败)"
-                        })
-                else:
-                    blocks.append({
-                        "type": "text",
-                        "markdown": f"📁 **收到文件** (路径无效): `{msg.content}`"
-                    })
-            else:
-                blocks.append({
-                    "type": "text",
-                    "markdown": "📁 **收到文件** (无内容)"
-                })
-        elif msg.msg_type == "video":
-            # 视频处理
-            if msg.content:
-                if msg.content.startswith("http://") or msg.content.startswith("https://"):
-                    filename = msg.content.split("/")[-1]
-                    blocks.append({
-                        "type": "file",
-                        "url": msg.content,
-                        "fileName": filename,
-                        "markdown": f"[{filename}]({msg.content})"
-                    })
-                elif os.path.exists(msg.content):
-                    filename = os.path.basename(msg.content)
-                    cos_url = upload_to_cos(msg.content)
-                    if cos_url:
-                        blocks.append({
-                            "type": "file",
-                            "url": cos_url,
-                            "fileName": filename,
-                            "markdown": f"[{filename}]({cos_url})"
-                        })
-                    else:
-                        logger.warning(f"[Formatter] 视频上传失败: {filename}")
-                        blocks.append({
-                            "type": "text",
-                            "markdown": f"🎥 **{filename}** (上传失败)"
-                        })
-                else:
-                    blocks.append({
-                        "type": "text",
-                        "markdown": f"🎥 **收到视频** (路径无效): `{msg.content}`"
-                    })
-            else:
-                blocks.append({
-                    "type": "text",
-                    "markdown": "🎥 **收到视频** (无内容)"
-                })
-        elif msg.msg_type == "link":
-            final_url = msg.content.strip()
-
-            if final_url and final_url.startswith("http"):
-                blocks.append({
-                    "type": "richUrl",
-                    "url": final_url
-                })
-            else:
-                blocks.append({
-                    "type": "text",
-                    "markdown": f"🔗 **无效链接**: {final_url}"
-                })
-        else:
-            blocks.append({
-                "type": "text",
-                "markdown": f"[{msg.msg_type}] {msg.content}"
-            })
+        return build_blocks(msg, await resolve(msg, binding))
 
-        return blocks
+    async def format_batch(
+        self, msgs: List[UnifiedMessage], binding: Optional[UserBinding] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """批量格式化：先并发解析所有消息，再逐条构建 blocks"""
+        resolved = await asyncio.gather(*(resolve(msg, binding) for msg in msgs))
+        return [build_blocks(msg, item) for msg, item in zip(msgs, resolved)]
 
 
 # 全局格式化器实例
@@ -197,6 +272,8 @@ def get_formatter() -> MessageFormatter:
     return _formatter
 
 
-def format_unified_message_as_craft_blocks(msg: UnifiedMessage) -> List[Dict[str, Any]]:
+async def format_unified_message_as_craft_blocks(
+    msg: UnifiedMessage, binding: Optional[UserBinding] = None
+) -> List[Dict[str, Any]]:
     """将 UnifiedMessage 格式化为 Craft blocks"""
-    return get_formatter().format_unified(msg)
+    return await get_formatter().format_unified(msg, binding)
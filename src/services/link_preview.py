@@ -0,0 +1,349 @@
+"""
+链接预览
+
+为链接消息补充标题、描述与封面图：
+1. 优先使用企微 link 消息自带的 title / description / image_url
+2. 否则抓取页面（httpx，最多 LINK_PREVIEW_CONCURRENCY 个并发，只读取前 LINK_PREVIEW_MAX_BYTES 字节），
+   解析 og:* / twitter:* 元数据与 <title>
+
+链接由聊天参与者发送，抓取前只允许 http(s)，并解析主机名拒绝内网 / 回环 / 链路本地等非公网地址；
+请求直接连接检查过的 IP（Host 头与 TLS SNI / 证书校验仍使用原主机名），避免检查后 DNS 被改指向内网；
+重定向逐跳手动跟随（最多 LINK_PREVIEW_MAX_REDIRECTS 次），每一跳重新检查。
+
+结果按规范化 URL 缓存在 link_previews 表中（LINK_PREVIEW_TTL 秒，抓取失败缓存 LINK_PREVIEW_NEGATIVE_TTL 秒），
+同一链接在有效期内不会重复抓取，同时进行中的请求共享一次抓取。
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+from html.parser import HTMLParser
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import httpx
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+LINK_PREVIEW_FETCH = os.getenv("LINK_PREVIEW_FETCH", "true").lower() == "true"
+LINK_PREVIEW_CONCURRENCY = int(os.getenv("LINK_PREVIEW_CONCURRENCY", "8"))
+LINK_PREVIEW_TIMEOUT = float(os.getenv("LINK_PREVIEW_TIMEOUT", "5"))
+LINK_PREVIEW_MAX_BYTES = int(os.getenv("LINK_PREVIEW_MAX_BYTES", str(512 * 1024)))
+LINK_PREVIEW_TTL = int(os.getenv("LINK_PREVIEW_TTL", str(7 * 86400)))
+LINK_PREVIEW_NEGATIVE_TTL = int(os.getenv("LINK_PREVIEW_NEGATIVE_TTL", "3600"))
+LINK_PREVIEW_MAX_REDIRECTS = int(os.getenv("LINK_PREVIEW_MAX_REDIRECTS", "3"))
+# 允许抓取内网地址（仅用于本地模拟服务测试）
+LINK_PREVIEW_ALLOW_PRIVATE = os.getenv("LINK_PREVIEW_ALLOW_PRIVATE", "false").lower() == "true"
+LINK_PREVIEW_USER_AGENT = os.getenv("LINK_PREVIEW_USER_AGENT", "Mozilla/5.0 (compatible; CraftSaver/1.0)")
+
+# 规范化时去掉的跟踪参数
+_TRACKING_PARAMS = {"spm", "isappinstalled", "scene", "clicktime", "enterid", "share_token"}
+
+
+class LinkPreview(BaseModel):
+    """链接预览"""
+    url: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    origin: str = "none"               # payload / fetch / none
+
+
+def canonical_url(url: str) -> str:
+    """
+    规范化 URL 作为缓存键：scheme / host 小写，去掉默认端口、片段与跟踪参数，查询参数排序
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme == "http" and parts.port == 80 or scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+class _MetaParser(HTMLParser):
+    """提取 <head> 中的 meta 与 title"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = (attrs.get("property") or attrs.get("name") or "").lower()
+            if key and attrs.get("content") and key not in self.meta:
+                self.meta[key] = attrs["content"].strip()
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_metadata(html: str, base_url: str) -> Dict[str, Optional[str]]:
+    """从 HTML 中解析 title / description / image_url"""
+    parser = _MetaParser()
+    try:
+        parser.feed(html)
+    except Exception as e:
+        logger.debug(f"[LinkPreview] HTML 解析中断: {base_url}, {e}")
+    meta = parser.meta
+    title = meta.get("og:title") or meta.get("twitter:title") or parser.title.strip() or None
+    description = meta.get("og:description") or meta.get("twitter:description") or meta.get("description")
+    image = meta.get("og:image") or meta.get("twitter:image")
+    return {
+        "title": " ".join(title.split()) if title else None,
+        "description": description or None,
+        "image_url": urljoin(base_url, image) if image else None,
+    }
+
+
+async def check_public_url(url: str) -> str:
+    """
+    只允许解析到公网地址的 http(s) 链接
+
+    Returns:
+        检查过的地址（后续请求应直接连接该地址）
+
+    Raises:
+        ValueError: 协议不支持、主机无法解析或解析到非公网地址
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"unsupported url: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+    except OSError as e:
+        raise ValueError(f"unresolvable host: {parts.hostname}, {e}")
+    addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    for address in addresses:
+        if not address.is_global:
+            raise ValueError(f"non-public address: {parts.hostname} -> {address}")
+    if not addresses:
+        raise ValueError(f"unresolvable host: {parts.hostname}")
+    return str(addresses[0])
+
+
+def pin_request(url: str, address: str) -> tuple:
+    """
+    把 URL 的主机替换为已检查的地址，返回 (url, headers, extensions)；
+    Host 头与 TLS SNI 使用原主机名，证书仍按原主机名校验
+    """
+    parts = urlsplit(url)
+    host = f"[{address}]" if ":" in address else address
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    netloc = parts.netloc.rsplit("@", 1)[-1]
+    pinned = urlunsplit((parts.scheme, host, parts.path, parts.query, ""))
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return pinned, {"Host": netloc}, extensions
+
+
+def _lookup(conn, url: str, now: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT url, title, description, image_url, origin FROM link_previews WHERE url = ? AND expires_at > ?",
+        (url, now)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def _store(conn, preview: LinkPreview, now: int, ttl: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO link_previews (url, title, description, image_url, origin, fetched_at, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (preview.url, preview.title, preview.description, preview.image_url, preview.origin, now, now + ttl)
+    )
+
+
+def purge_expired(conn, now: Optional[int] = None) -> int:
+    """删除过期的缓存，返回删除条数"""
+    cursor = conn.execute("DELETE FROM link_previews WHERE expires_at <= ?", (now or int(time.time()),))
+    return cursor.rowcount
+
+
+def cache_report(conn, now: Optional[int] = None) -> Dict[str, Any]:
+    """缓存条目数（按来源）与已过期条数"""
+    now = now or int(time.time())
+    by_origin = {row[0]: row[1] for row in conn.execute("SELECT origin, COUNT(*) FROM link_previews GROUP BY origin")}
+    expired = conn.execute("SELECT COUNT(*) FROM link_previews WHERE expires_at <= ?", (now,)).fetchone()[0]
+    return {"entries": sum(by_origin.values()), "by_origin": by_origin, "expired": expired}
+
+
+class LinkPreviewService:
+    """链接预览（消息自带信息 -> 持久化缓存 -> 有界并发抓取）"""
+
+    def __init__(
+        self,
+        concurrency: int = LINK_PREVIEW_CONCURRENCY,
+        fetch: bool = LINK_PREVIEW_FETCH,
+        allow_private: bool = LINK_PREVIEW_ALLOW_PRIVATE,
+    ):
+        self.fetch_enabled = fetch
+        self.allow_private = allow_private
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"payload": 0, "cache_hits": 0, "fetched": 0, "failed": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # 按 IP 连接时不复用连接：同一 IP 上的其他主机名需要各自完成 TLS 校验
+            limits = httpx.Limits() if self.allow_private else httpx.Limits(max_keepalive_connections=0)
+            self._client = httpx.AsyncClient(
+                timeout=LINK_PREVIEW_TIMEOUT,
+                follow_redirects=False,
+                limits=limits,
+                headers={"User-Agent": LINK_PREVIEW_USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+            )
+        return self._client
+
+    async def preview(self, url: str, payload: Optional[Dict[str, Any]] = None) -> LinkPreview:
+        """
+        获取链接预览，失败时返回只有 URL 的预览
+
+        Args:
+            url: 链接地址
+            payload: 企微 link 消息体（含 title / description / image_url）
+        """
+        key = canonical_url(url)
+        now = int(time.time())
+
+        if payload and payload.get("title"):
+            self.stats["payload"] += 1
+            preview = LinkPreview(
+                url=key,
+                title=payload.get("title"),
+                description=payload.get("description") or None,
+                image_url=payload.get("image_url") or None,
+                origin="payload",
+            )
+            # 只在缓存缺失或内容变化时写入，同一链接反复出现时不产生写入
+            if await self._lookup(key, now) != preview.model_dump():
+                await self._save(preview, now, LINK_PREVIEW_TTL)
+            return preview
+
+        cached = await self._lookup(key, now)
+        if cached:
+            self.stats["cache_hits"] += 1
+            return LinkPreview(**cached)
+
+        if not self.fetch_enabled:
+            return LinkPreview(url=key)
+
+        # 同一链接同时只抓取一次
+        future = self._inflight.get(key)
+        if future is not None:
+            return await future
+        future = asyncio.ensure_future(self._fetch(key, url))
+        self._inflight[key] = future
+        try:
+            return await future
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, key: str, url: str) -> LinkPreview:
+        now = int(time.time())
+        try:
+            async with self._semaphore:
+                html = await self._get_html(url)
+            meta = parse_metadata(html, url) if html else {}
+        except Exception as e:
+            logger.info(f"[LinkPreview] 抓取失败: {url}, {e}")
+            meta = {}
+
+        if meta.get("title"):
+            self.stats["fetched"] += 1
+            preview = LinkPreview(url=key, origin="fetch", **meta)
+            await self._save(preview, now, LINK_PREVIEW_TTL)
+        else:
+            self.stats["failed"] += 1
+            preview = LinkPreview(url=key)
+            await self._save(preview, now, LINK_PREVIEW_NEGATIVE_TTL)
+        return preview
+
+    async def _get_html(self, url: str) -> Optional[str]:
+        """读取页面开头部分（元数据在 <head> 中），非 HTML 返回 None；重定向逐跳检查目标地址"""
+        for _ in range(LINK_PREVIEW_MAX_REDIRECTS + 1):
+            target, headers, extensions = url, None, None
+            if not self.allow_private:
+                target, headers, extensions = pin_request(url, await check_public_url(url))
+            request = self._get_client().build_request("GET", target, headers=headers, extensions=extensions)
+            response = await self._get_client().send(request, stream=True)
+            try:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                if response.status_code >= 400:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                content_type = response.headers.get("content-type", "")
+                if "html" not in content_type:
+                    return None
+                data = b""
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) >= LINK_PREVIEW_MAX_BYTES or b"</head>" in data[-len(chunk) - 7:]:
+                        break
+                return data[:LINK_PREVIEW_MAX_BYTES].decode(response.encoding or "utf-8", errors="replace")
+            finally:
+                await response.aclose()
+        raise RuntimeError(f"too many redirects: {url}")
+
+    async def _lookup(self, key: str, now: int) -> Optional[Dict[str, Any]]:
+        from src.services import database
+
+        try:
+            return await database.run_read(_lookup, key, now)
+        except Exception as e:
+            logger.warning(f"[LinkPreview] 缓存查询失败: {key}, {e}")
+            return None
+
+    async def _save(self, preview: LinkPreview, now: int, ttl: int) -> None:
+        from src.services import database
+
+        try:
+            await database.run_write(_store, preview, now, ttl)
+        except Exception as e:
+            logger.warning(f"[LinkPreview] 缓存写入失败: {preview.url}, {e}")
+
+    def report(self) -> Dict[str, Any]:
+        return {**self.stats, "fetch_enabled": self.fetch_enabled}
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 全局链接预览服务实例
+_service = None
+
+
+def get_link_preview_service() -> LinkPreviewService:
+    """获取链接预览服务实例"""
+    global _service
+    if _service is None:
+        _service = LinkPreviewService()
+    return _service
+
+
+async def close_link_preview_service() -> None:
+    """关闭 HTTP 客户端"""
+    global _service
+    if _service is not None:
+        await _service.close()
+        _service = None
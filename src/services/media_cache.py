@@ -0,0 +1,168 @@
+"""
+本地媒体缓存
+
+下载的媒体文件按文件名哈希分片存放在 IMAGE_SAVE_DIR/<xx>/ 下（256 个子目录），
+避免单个目录无限膨胀。缓存总大小受 MEDIA_CACHE_MAX_BYTES 限制，超出时按最近
+使用时间 (LRU) 淘汰：
+- 刚下载、尚未上传的文件处于“待上传”状态，不会被淘汰；上传结束后解除，
+  超过 MEDIA_CACHE_PIN_TTL 仍未上传（如用户未绑定）的也会解除
+- MEDIA_CACHE_DELETE_AFTER_UPLOAD=true 时上传成功立即删除本地文件
+
+索引在进程内维护，首次使用时扫描目录建立（包括旧版平铺在根目录下的文件）。
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SAVE_DIR = os.getenv("IMAGE_SAVE_DIR", "./images")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+MEDIA_CACHE_PIN_TTL = int(os.getenv("MEDIA_CACHE_PIN_TTL", "3600"))
+MEDIA_CACHE_DELETE_AFTER_UPLOAD = os.getenv("MEDIA_CACHE_DELETE_AFTER_UPLOAD", "false").lower() == "true"
+
+
+class MediaCache:
+    """分片 + 容量上限 + LRU 淘汰的本地媒体缓存"""
+
+    def __init__(self, root: str = IMAGE_SAVE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES, pin_ttl: int = MEDIA_CACHE_PIN_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.pin_ttl = pin_ttl
+        # 路径 -> 大小，按最近使用排序（末尾最新）
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        # 待上传的路径 -> 登记时间
+        self._pinned: Dict[str, float] = {}
+        self._bytes = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self.stats = {"evicted_files": 0, "evicted_bytes": 0, "deleted_after_upload": 0}
+
+    def path_for(self, filename: str) -> str:
+        """文件名 -> 分片路径（自动创建分片目录）"""
+        shard = hashlib.md5(filename.encode("utf-8")).hexdigest()[:2]
+        directory = os.path.join(self.root, shard)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def load(self) -> int:
+        """扫描目录建立索引（按访问时间排序），返回文件数"""
+        with self._lock:
+            if self._loaded:
+                return len(self._entries)
+            found = []
+            for directory in [self.root] + self._shard_dirs():
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            if entry.is_file() and not entry.name.endswith(".tmp"):
+                                stat = entry.stat()
+                                found.append((max(stat.st_atime, stat.st_mtime), entry.path, stat.st_size))
+                except FileNotFoundError:
+                    continue
+            found.sort()
+            for _, path, size in found:
+                if path not in self._entries:
+                    self._entries[path] = size
+                    self._bytes += size
+            self._loaded = True
+            logger.info(f"[MediaCache] 索引已建立: {len(self._entries)} 个文件, {self._bytes} bytes")
+            self._evict()
+            return len(self._entries)
+
+    def _shard_dirs(self):
+        try:
+            with os.scandir(self.root) as it:
+                return [entry.path for entry in it if entry.is_dir() and len(entry.name) == 2]
+        except FileNotFoundError:
+            return []
+
+    def add(self, path: str, pinned: bool = True) -> None:
+        """登记新写入（或被修改）的文件，pinned 表示尚未上传"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self.load()
+            self._bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            if pinned:
+                self._pinned[path] = time.time()
+            self._evict()
+
+    def release(self, path: str, uploaded: bool = True) -> None:
+        """上传结束：解除待上传状态，按配置删除已上传的文件"""
+        with self._lock:
+            self._pinned.pop(path, None)
+            if path not in self._entries:
+                return
+            if uploaded and MEDIA_CACHE_DELETE_AFTER_UPLOAD:
+                self._remove(path)
+                self.stats["deleted_after_upload"] += 1
+            else:
+                # 上传前可能被预处理改写过，重新取大小
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self._bytes -= self._entries.pop(path)
+                    return
+                self._bytes += size - self._entries.pop(path)
+                self._entries[path] = size
+                self._evict()
+
+    def _remove(self, path: str) -> None:
+        self._bytes -= self._entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"[MediaCache] 删除失败: {path}, {e}")
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        now = time.time()
+        for path, pinned_at in list(self._pinned.items()):
+            if now - pinned_at > self.pin_ttl:
+                del self._pinned[path]
+        evicted = 0
+        for path in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if path in self._pinned:
+                continue
+            size = self._entries[path]
+            self._remove(path)
+            evicted += 1
+            self.stats["evicted_files"] += 1
+            self.stats["evicted_bytes"] += size
+        if evicted:
+            logger.info(f"[MediaCache] 淘汰 {evicted} 个文件，当前 {self._bytes} / {self.max_bytes} bytes")
+
+    def evict(self) -> None:
+        """立即按容量上限淘汰（启动或运维命令调用）"""
+        with self._lock:
+            self.load()
+            self._evict()
+
+    def report(self) -> Dict[str, Any]:
+        """缓存占用报告"""
+        with self._lock:
+            self.load()
+            return {
+                "root": self.root,
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned),
+                **self.stats,
+            }
+
+
+media_cache = MediaCache()
@@ -0,0 +1,78 @@
+"""
+媒体对象清单
+
+存储对象名由文件内容的 sha256 决定（<COS_ROOT_DIR>/media/<sha256><ext>），
+相同内容只上传一次。media_objects 表记录已上传的对象：
+- 命中清单：直接返回已有 URL，累计 hits
+- 未命中：可选先 HEAD 一次 COS（清单丢失或多实例共用存储桶时避免重传），再上传
+
+直传（流式）上传在开始时还不知道内容哈希，对象名改用随机 id
+（<COS_ROOT_DIR>/media/stream/<id><ext>），上传结束后同样按 sha256 登记到清单。
+"""
+import hashlib
+import os
+import uuid
+from typing import Any, Dict, Optional
+
+MEDIA_HASH_CHUNK_SIZE = 1024 * 1024
+MEDIA_KEY_PREFIX = "media"
+
+
+def file_sha256(path: str) -> str:
+    """分块计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MEDIA_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_name(sha256: str, local_path: str) -> str:
+    """内容寻址的对象名（相对 COS_ROOT_DIR），保留扩展名以便浏览器识别类型"""
+    ext = os.path.splitext(local_path)[1].lower()
+    return f"{MEDIA_KEY_PREFIX}/{sha256}{ext}"
+
+
+def stream_object_name(ext: str) -> str:
+    """流式上传的对象名（内容哈希在上传结束后才知道）"""
+    return f"{MEDIA_KEY_PREFIX}/stream/{uuid.uuid4().hex}{ext.lower()}"
+
+
+def lookup(conn, sha256: str, backend: str) -> Optional[Dict[str, Any]]:
+    """查询当前存储后端上的对象（切换后端后旧记录视为未命中）"""
+    row = conn.execute(
+        "SELECT sha256, cos_key, url, size, hits FROM media_objects WHERE sha256 = ? AND backend = ?",
+        (sha256, backend)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def record_upload(conn, backend: str, sha256: str, cos_key: str, url: str, size: int) -> None:
+    conn.execute(
+        "INSERT INTO media_objects (sha256, backend, cos_key, url, size) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(sha256) DO UPDATE SET backend = excluded.backend, cos_key = excluded.cos_key, "
+        "url = excluded.url, size = excluded.size, hits = 0, created_at = CURRENT_TIMESTAMP "
+        "WHERE media_objects.backend != excluded.backend",
+        (sha256, backend, cos_key, url, size)
+    )
+
+
+def record_hit(conn, sha256: str) -> None:
+    conn.execute(
+        "UPDATE media_objects SET hits = hits + 1, last_hit_at = CURRENT_TIMESTAMP WHERE sha256 = ?",
+        (sha256,)
+    )
+
+
+def storage_report(conn) -> Dict[str, Any]:
+    """统计媒体去重效果"""
+    row = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0), COALESCE(SUM(size * hits), 0) "
+        "FROM media_objects"
+    ).fetchone()
+    return {
+        "objects": row[0],
+        "uploaded_bytes": row[1],
+        "dedup_hits": row[2],
+        "bytes_saved": row[3],
+    }
@@ -0,0 +1,180 @@
+"""
+媒体预处理模块
+
+手机原图分辨率很高，直接上传既慢又占存储，Craft 渲染也慢。上传前可选地：
+- 按最长边 IMAGE_MAX_DIMENSION 等比缩小
+- JPEG / WebP 按 IMAGE_QUALITY 重新压缩，PNG 无损优化
+- 去掉 EXIF 等元数据（先按 EXIF 方向旋正）
+
+图像处理是 CPU 密集操作，放在进程池中执行，不占用事件循环与 GIL。
+缩小了尺寸或原图带有元数据时总是替换原文件（保证不外传 EXIF / GPS），否则仅在变小时替换。每个绑定可单独设置最长边与质量
+（user_mappings.image_max_dimension / image_quality，最长边为 0 表示不处理）。
+
+需要安装 Pillow；未安装时跳过预处理。
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 可选依赖
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TRANSFORM = os.getenv("IMAGE_TRANSFORM", "false").lower() == "true"
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+IMAGE_TRANSFORM_WORKERS = int(os.getenv("IMAGE_TRANSFORM_WORKERS", "2"))
+
+# 支持重新编码的格式
+_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+# 重新编码时会去掉的元数据（img.info 中的键；ICC 等色彩信息不算）
+_METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+
+def _has_metadata(img) -> bool:
+    """图片是否带有 EXIF / XMP / 注释 / PNG 文本块"""
+    return (
+        any(key in img.info for key in _METADATA_KEYS)
+        or bool(img.getexif())
+        or bool(getattr(img, "text", None))
+    )
+
+
+def transform_file(path: str, max_dimension: int, quality: int) -> Dict[str, Any]:
+    """
+    缩小并重新压缩图片（在子进程中执行）
+
+    缩小了尺寸或原图带有元数据时总是原地替换，否则仅在结果更小时替换；
+    width / height 为处理后实际保存的文件尺寸。
+
+    Returns:
+        {"original_bytes", "bytes", "width", "height", "replaced", "skipped"}
+    """
+    original_bytes = os.path.getsize(path)
+    result = {"original_bytes": original_bytes, "bytes": original_bytes, "replaced": False, "skipped": None}
+
+    with Image.open(path) as img:
+        fmt = img.format
+        if fmt not in _FORMATS:
+            result["skipped"] = f"format {fmt}"
+            return result
+        if getattr(img, "is_animated", False):
+            result["skipped"] = "animated"
+            return result
+
+        result["width"], result["height"] = img.size
+        has_metadata = _has_metadata(img)
+
+        # 先按 EXIF 方向旋正，保存时不带 EXIF
+        out = ImageOps.exif_transpose(img)
+        resized = bool(max_dimension and max(out.size) > max_dimension)
+        if resized:
+            out.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        save_args: Dict[str, Any] = {"optimize": True}
+        if fmt == "JPEG":
+            if out.mode not in ("RGB", "L"):
+                out = out.convert("RGB")
+            save_args.update(quality=quality, progressive=True)
+        elif fmt == "WEBP":
+            save_args = {"quality": quality, "method": 4}
+
+        tmp_path = f"{path}.tmp"
+        out.save(tmp_path, format=fmt, **save_args)
+
+    new_bytes = os.path.getsize(tmp_path)
+    if resized or has_metadata or new_bytes < original_bytes:
+        os.replace(tmp_path, path)
+        result.update(bytes=new_bytes, replaced=True, width=out.size[0], height=out.size[1])
+    else:
+        os.remove(tmp_path)
+    return result
+
+
+class MediaTransformService:
+    """图片预处理服务（进程池）"""
+
+    def __init__(self, workers: int = IMAGE_TRANSFORM_WORKERS):
+        self._workers = max(workers, 1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"images": 0, "replaced": 0, "failed": 0, "original_bytes": 0, "bytes": 0}
+        if IMAGE_TRANSFORM and Image is None:
+            logger.warning("[Transform] 未安装 Pillow，IMAGE_TRANSFORM=true 不生效")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._workers)
+            return self._pool
+
+    @staticmethod
+    def settings_for(binding=None) -> Optional[tuple]:
+        """(最长边, 质量)，None 表示不处理"""
+        if not IMAGE_TRANSFORM or Image is None:
+            return None
+        max_dimension = IMAGE_MAX_DIMENSION
+        quality = IMAGE_QUALITY
+        if binding is not None:
+            if binding.image_max_dimension is not None:
+                max_dimension = binding.image_max_dimension
+            if binding.image_quality is not None:
+                quality = binding.image_quality
+        if max_dimension <= 0:
+            return None
+        return max_dimension, quality
+
+    async def transform(self, path: str, binding=None) -> str:
+        """
+        按绑定设置预处理图片，失败时保持原文件
+
+        Returns:
+            处理后的文件路径（原地替换，与输入相同）
+        """
+        settings = self.settings_for(binding)
+        if not settings:
+            return path
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._get_pool(), transform_file, path, *settings)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"[Transform] 图片预处理失败，使用原图: {path}, {e}")
+            return path
+
+        self.stats["images"] += 1
+        self.stats["original_bytes"] += result["original_bytes"]
+        self.stats["bytes"] += result["bytes"]
+        if result["replaced"]:
+            self.stats["replaced"] += 1
+            logger.info(
+                f"[Transform] {os.path.basename(path)}: {result['original_bytes']} -> {result['bytes']} bytes "
+                f"({result['width']}x{result['height']})"
+            )
+        elif result["skipped"]:
+            logger.debug(f"[Transform] 跳过 {path}: {result['skipped']}")
+        return path
+
+    def report(self) -> Dict[str, Any]:
+        """本进程启动以来的预处理统计"""
+        stats = dict(self.stats)
+        stats["enabled"] = IMAGE_TRANSFORM and Image is not None
+        stats["bytes_saved"] = stats["original_bytes"] - stats["bytes"]
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+media_transform = MediaTransformService()
@@ -1,7 +1,11 @@
+import asyncio
 import logging
+from typing import List
+
 from src.models.chat_record import UnifiedMessage
 from src.services.database import DatabaseService
-from src.handlers import get_handlers
+from src.handlers import get_handler_index
+from src.handlers.base import BaseHandler
 
 logger = logging.getLogger(__name__)
 
@@ -27,21 +31,68 @@ async def process_message(msg: UnifiedMessage):
     """
     # 1. 全局落库 (Audit Log)
     try:
-        DatabaseService.save_unified_message(msg)
+        await DatabaseService.save_unified_message(msg)
     except Exception as e:
         logger.error(f"[Dispatcher] DB Save failed: {e}")
 
     # 2. 查找并执行 Handler
-    handled = False
-    for handler in get_handlers():
-        try:
-            if await handler.check(msg):
-                await handler.handle(msg)
-                handled = True
-                break
-        except Exception as e:
-            logger.error(f"[Dispatcher] Error in {handler.__class__.__name__}: {e}", exc_info=True)
-            break
-
-    if not handled:
+    await dispatch_message(msg)
+
+
+async def process_messages(msgs: List[UnifiedMessage]) -> List[UnifiedMessage]:
+    """
+    批量处理一页消息
+
+    整页一次事务落库，仅对新消息分发 Handler（重复消息在落库时即被过滤）。
+    落库失败时退化为全部分发，与单条处理的行为保持一致。
+
+    Returns:
+        实际分发的消息列表
+    """
+    new_msgs = await DatabaseService.save_many(msgs)
+    if new_msgs is None:
+        logger.error(f"[Dispatcher] 批量落库失败，直接分发 {len(msgs)} 条消息")
+        new_msgs = msgs
+
+    await asyncio.gather(*(dispatch_message(msg) for msg in new_msgs))
+    return new_msgs
+
+
+async def dispatch_message(msg: UnifiedMessage):
+    """
+    按 (来源, 类型) 索引查找 Handler 并执行
+
+    独占 Handler 按优先级依次 check，第一个通过的执行后停止；非独占 Handler 与之并发执行。
+    每个 Handler 的异常单独记录，不影响其他 Handler。
+    """
+    exclusive, concurrent = get_handler_index().lookup(msg.source, msg.msg_type)
+    results = await asyncio.gather(
+        _run_exclusive(exclusive, msg),
+        *(_run_handler(handler, msg) for handler in concurrent),
+    )
+
+    if not any(results):
         logger.warning(f"[Dispatcher] 消息未匹配处理器: msgid={msg.msg_id}, from_user={msg.from_user}")
+
+
+async def _run_exclusive(handlers: List[BaseHandler], msg: UnifiedMessage) -> bool:
+    """依次尝试独占 Handler，返回是否有 Handler 处理了该消息"""
+    for handler in handlers:
+        if await _run_handler(handler, msg):
+            return True
+    return False
+
+
+async def _run_handler(handler: BaseHandler, msg: UnifiedMessage) -> bool:
+    """check 通过则执行 handle，返回是否匹配（handle 出错也算已匹配）"""
+    try:
+        if not await handler.check(msg):
+            return False
+    except Exception as e:
+        logger.error(f"[Dispatcher] Error in {handler.__class__.__name__}.check: {e}", exc_info=True)
+        return False
+    try:
+        await handler.handle(msg)
+    except Exception as e:
+        logger.error(f"[Dispatcher] Error in {handler.__class__.__name__}: {e}", exc_info=True)
+    return True
@@ -0,0 +1,230 @@
+"""
+消息原始数据存储模块
+
+unified_messages.raw_data 不再内联保存 JSON 文本，而是压缩后写入旁路表
+message_payloads（按 unified_messages.id 关联），热表只保留检索需要的列；
+只有显式请求原始数据时才解压。
+
+支持的编码 (RAW_DATA_CODEC):
+- zlib：默认，标准库实现
+- zstd：需要安装 zstandard，可选使用共享字典（RAW_DATA_ZSTD_DICT=true，
+  字典由 `python manage.py migrate-raw-data --train-dict` 训练并存入 payload_dicts）
+- none：不压缩，仅拆表
+"""
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+RAW_DATA_CODEC = os.getenv("RAW_DATA_CODEC", "zlib").lower()
+RAW_DATA_ZLIB_LEVEL = int(os.getenv("RAW_DATA_ZLIB_LEVEL", "6"))
+RAW_DATA_ZSTD_LEVEL = int(os.getenv("RAW_DATA_ZSTD_LEVEL", "3"))
+RAW_DATA_ZSTD_DICT = os.getenv("RAW_DATA_ZSTD_DICT", "false").lower() == "true"
+
+_IN_CHUNK_SIZE = 500
+
+_local = threading.local()
+_dict_cache: Dict[int, Any] = {}
+_dict_lock = threading.Lock()
+
+
+def _effective_codec() -> str:
+    if RAW_DATA_CODEC == "zstd" and zstandard is None:
+        logger.warning("[Payload] 未安装 zstandard，RAW_DATA_CODEC=zstd 回退为 zlib")
+        return "zlib"
+    if RAW_DATA_CODEC not in ("zlib", "zstd", "none"):
+        logger.warning(f"[Payload] 未知编码 {RAW_DATA_CODEC}，使用 zlib")
+        return "zlib"
+    return RAW_DATA_CODEC
+
+
+CODEC = _effective_codec()
+
+
+def _load_dict(conn, dict_id: int):
+    """按 id 加载 zstd 字典（进程内缓存）"""
+    with _dict_lock:
+        cached = _dict_cache.get(dict_id)
+    if cached is not None:
+        return cached
+    row = conn.execute("SELECT data FROM payload_dicts WHERE id = ?", (dict_id,)).fetchone()
+    if not row:
+        raise ValueError(f"payload dict {dict_id} not found")
+    compression_dict = zstandard.ZstdCompressionDict(bytes(row[0]))
+    with _dict_lock:
+        _dict_cache[dict_id] = compression_dict
+    return compression_dict
+
+
+def active_dict_id(conn) -> Optional[int]:
+    """当前用于压缩的字典 id（未启用字典时为 None）"""
+    if CODEC != "zstd" or not RAW_DATA_ZSTD_DICT:
+        return None
+    row = conn.execute("SELECT MAX(id) FROM payload_dicts WHERE codec = 'zstd'").fetchone()
+    return row[0] if row and row[0] else None
+
+
+def _zstd_compressor(conn, dict_id: Optional[int]):
+    cache = getattr(_local, "compressors", None)
+    if cache is None:
+        cache = _local.compressors = {}
+    compressor = cache.get(dict_id)
+    if compressor is None:
+        kwargs = {"level": RAW_DATA_ZSTD_LEVEL}
+        if dict_id is not None:
+            kwargs["dict_data"] = _load_dict(conn, dict_id)
+        compressor = cache[dict_id] = zstandard.ZstdCompressor(**kwargs)
+    return compressor
+
+
+def _zstd_decompressor(conn, dict_id: Optional[int]):
+    if zstandard is None:
+        raise RuntimeError("zstandard 未安装，无法解码 zstd 压缩的原始数据")
+    cache = getattr(_local, "decompressors", None)
+    if cache is None:
+        cache = _local.decompressors = {}
+    decompressor = cache.get(dict_id)
+    if decompressor is None:
+        kwargs = {}
+        if dict_id is not None:
+            kwargs["dict_data"] = _load_dict(conn, dict_id)
+        decompressor = cache[dict_id] = zstandard.ZstdDecompressor(**kwargs)
+    return decompressor
+
+
+def encode(conn, raw_data: Any, dict_id: Optional[int] = None) -> Tuple[str, Optional[int], int, bytes]:
+    """
+    编码原始数据
+
+    Returns:
+        (codec, dict_id, 原始字节数, 编码后数据)
+    """
+    raw = json.dumps(raw_data, ensure_ascii=False).encode("utf-8")
+    if CODEC == "zstd":
+        return "zstd", dict_id, len(raw), _zstd_compressor(conn, dict_id).compress(raw)
+    if CODEC == "zlib":
+        return "zlib", None, len(raw), zlib.compress(raw, RAW_DATA_ZLIB_LEVEL)
+    return "none", None, len(raw), raw
+
+
+def decode(conn, codec: str, dict_id: Optional[int], data: bytes) -> Any:
+    """解码原始数据"""
+    data = bytes(data)
+    if codec == "zstd":
+        raw = _zstd_decompressor(conn, dict_id).decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return json.loads(raw.decode("utf-8"))
+
+
+def save_payloads(conn, items: Iterable[Tuple[int, Any]]) -> None:
+    """写入 (message_id, raw_data) 列表"""
+    dict_id = active_dict_id(conn)
+    rows = []
+    for message_id, raw_data in items:
+        codec, used_dict, raw_size, data = encode(conn, raw_data, dict_id)
+        rows.append((message_id, codec, used_dict, raw_size, data))
+    conn.executemany(
+        "INSERT OR REPLACE INTO message_payloads (message_id, codec, dict_id, raw_size, data) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def load_raw_data(conn, message_ids: List[int], schema: str = "main") -> Dict[int, Any]:
+    """
+    按需加载并解码原始数据
+
+    优先读取 message_payloads，未迁移的历史行回退到 unified_messages.raw_data。
+    schema 为 ATTACH 的归档分区别名时从该分区读取。
+    """
+    result: Dict[int, Any] = {}
+    for i in range(0, len(message_ids), _IN_CHUNK_SIZE):
+        chunk = message_ids[i:i + _IN_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT message_id, codec, dict_id, data FROM {schema}.message_payloads WHERE message_id IN ({placeholders})",
+            chunk
+        )
+        for row in rows:
+            result[row[0]] = decode(conn, row[1], row[2], row[3])
+
+        missing = [mid for mid in chunk if mid not in result]
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            rows = conn.execute(
+                f"SELECT id, raw_data FROM {schema}.unified_messages WHERE id IN ({placeholders}) AND raw_data IS NOT NULL",
+                missing
+            )
+            for row in rows:
+                result[row[0]] = json.loads(row[1])
+    return result
+
+
+def train_dict(conn, samples: int = 2000, dict_size: int = 64 * 1024) -> Optional[int]:
+    """用最近的原始数据训练 zstd 共享字典，返回新字典 id"""
+    if zstandard is None:
+        raise RuntimeError("zstandard 未安装，无法训练字典")
+
+    rows = conn.execute(
+        "SELECT id, raw_data FROM unified_messages WHERE raw_data IS NOT NULL ORDER BY id DESC LIMIT ?",
+        (samples,)
+    ).fetchall()
+    sample_bytes = [row[1].encode("utf-8") for row in rows]
+    if len(sample_bytes) < samples:
+        # 已迁移的数据从旁路表补充样本
+        ids = [row[0] for row in conn.execute(
+            "SELECT message_id FROM message_payloads ORDER BY message_id DESC LIMIT ?",
+            (samples - len(sample_bytes),)
+        )]
+        for raw_data in load_raw_data(conn, ids).values():
+            sample_bytes.append(json.dumps(raw_data, ensure_ascii=False).encode("utf-8"))
+
+    if len(sample_bytes) < 10:
+        logger.warning(f"[Payload] 样本不足 ({len(sample_bytes)})，跳过字典训练")
+        return None
+
+    trained = zstandard.train_dictionary(dict_size, sample_bytes)
+    cursor = conn.execute(
+        "INSERT INTO payload_dicts (codec, data) VALUES ('zstd', ?)",
+        (trained.as_bytes(),)
+    )
+    logger.info(f"[Payload] 训练 zstd 字典完成: id={cursor.lastrowid}, samples={len(sample_bytes)}, "
+                f"size={len(trained.as_bytes())}")
+    return cursor.lastrowid
+
+
+def storage_report(conn) -> Dict[str, Any]:
+    """统计原始数据的存储占用"""
+    inline = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(raw_data AS BLOB))), 0) "
+        "FROM unified_messages WHERE raw_data IS NOT NULL"
+    ).fetchone()
+    codecs = [
+        {"codec": row[0], "rows": row[1], "raw_bytes": row[2], "stored_bytes": row[3]}
+        for row in conn.execute(
+            "SELECT codec, COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(data)), 0) "
+            "FROM message_payloads GROUP BY codec"
+        )
+    ]
+    raw_bytes = sum(c["raw_bytes"] for c in codecs)
+    stored_bytes = sum(c["stored_bytes"] for c in codecs)
+    return {
+        "inline_rows": inline[0],
+        "inline_bytes": inline[1],
+        "payload_codecs": codecs,
+        "payload_raw_bytes": raw_bytes,
+        "payload_stored_bytes": stored_bytes,
+        "bytes_saved": raw_bytes - stored_bytes,
+        "ratio": round(stored_bytes / raw_bytes, 3) if raw_bytes else None,
+    }
@@ -0,0 +1,172 @@
+"""
+消息全文检索模块
+
+基于 SQLite FTS5 的 messages_fts 表（rowid = unified_messages.id），索引三列：
+- content：文本 / 链接消息的内容
+- title：链接标题与描述（取自 raw_data.link）
+- filename：文件名（取自 raw_data.file）
+
+FTS5 自带的 unicode61 分词不切分中日韩文字，这里在 Python 侧预处理：
+连续的 CJK 字符切成重叠的二元组（末字额外作为单字词），查询时多字词按二元组
+短语匹配，单字词按前缀匹配。索引在写入路径中与消息同事务维护；
+归档到分区的消息会从索引中移除，检索只覆盖主库。
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.models.message import MessageItem, MessagePage
+from src.services import database, payload_store
+from src.utils.cursor import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "messages_fts"
+
+# content / title / filename 的 bm25 权重
+BM25_WEIGHTS = (1.0, 2.0, 2.0)
+
+# 只有这些类型的 content 是可检索的文本（媒体消息的 content 是本地路径或 URL）
+TEXT_TYPES = ("text", "markdown", "link")
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _bigrams(run: str) -> List[str]:
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def segment(text: Optional[str]) -> str:
+    """索引侧分词：CJK 连续字符 -> 二元组 + 末字"""
+    if not text:
+        return ""
+    return _CJK_RE.sub(lambda m: " " + " ".join(_bigrams(m.group()) + [m.group()[-1]]) + " ", text)
+
+
+def build_match_query(query: str) -> str:
+    """
+    用户输入 -> FTS5 MATCH 表达式
+
+    空白分隔的各个词之间为 AND；CJK 多字词按二元组短语匹配，单字按前缀匹配，
+    其他词按 unicode61 分词后精确匹配。所有词都加引号，不会触发 FTS5 语法错误。
+    """
+    terms = []
+    for word in query.split():
+        pos = 0
+        for match in _CJK_RE.finditer(word):
+            terms.extend(f'"{w}"' for w in _WORD_RE.findall(word[pos:match.start()]))
+            run = match.group()
+            terms.append(f'"{run}"*' if len(run) == 1 else '"' + " ".join(_bigrams(run)) + '"')
+            pos = match.end()
+        terms.extend(f'"{w}"' for w in _WORD_RE.findall(word[pos:]))
+    return " ".join(terms)
+
+
+def extract_fields(msg_type: Optional[str], content: Optional[str], raw_data: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+    """从消息中取出 (content, title, filename)"""
+    raw_data = raw_data or {}
+    text = content if msg_type in TEXT_TYPES else ""
+    link = raw_data.get("link") or {}
+    title = " ".join(filter(None, (link.get("title"), link.get("description"))))
+    filename = (raw_data.get("file") or {}).get("filename") or ""
+    return text or "", title, filename
+
+
+def index_rows(conn, rows: Iterable[Tuple[int, Optional[str], Optional[str], Optional[Dict[str, Any]]]]) -> int:
+    """写入 / 更新索引，rows 为 (id, msg_type, content, raw_data)"""
+    params = []
+    for message_id, msg_type, content, raw_data in rows:
+        fields = extract_fields(msg_type, content, raw_data)
+        if any(fields):
+            params.append((message_id, *(segment(f) for f in fields)))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, content, title, filename) VALUES (?, ?, ?, ?)",
+        params
+    )
+    return len(params)
+
+
+def rebuild_index(conn, batch_size: int = 1000) -> int:
+    """按主库现有消息重建索引，返回索引的行数"""
+    conn.execute(f"DELETE FROM {FTS_TABLE}")
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, msg_type, content FROM unified_messages WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        raw = payload_store.load_raw_data(conn, [row[0] for row in rows])
+        indexed += index_rows(conn, ((row[0], row[1], row[2], raw.get(row[0])) for row in rows))
+        last_id = rows[-1][0]
+    return indexed
+
+
+def _search(conn, match: str, filters: Dict[str, Any], limit: int, after: Optional[list]) -> MessagePage:
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = [
+        f"SELECT m.id, m.msg_id, m.source, m.msg_type, m.from_user, m.content, m.created_at, m.created_ts, m.seq, "
+        f"bm25({FTS_TABLE}, {weights}) AS score "
+        f"FROM {FTS_TABLE} JOIN unified_messages AS m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH ?"
+    ]
+    params: List[Any] = [match]
+    for column in ("source", "from_user", "msg_type"):
+        if filters.get(column):
+            sql.append(f"AND m.{column} = ?")
+            params.append(filters[column])
+    if filters.get("since"):
+        sql.append("AND m.created_ts >= ?")
+        params.append(int(filters["since"].timestamp()))
+    if filters.get("until"):
+        sql.append("AND m.created_ts < ?")
+        params.append(int(filters["until"].timestamp()))
+    if after:
+        sql.append("AND (score, m.id) > (?, ?)")
+        params.extend(after)
+    sql.append("ORDER BY score, m.id LIMIT ?")
+    params.append(limit + 1)
+
+    rows = conn.execute(" ".join(sql), params).fetchall()
+    items = [MessageItem(**dict(row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([items[-1].score, items[-1].id])
+    return MessagePage(items=items, next_cursor=next_cursor)
+
+
+class SearchService:
+    """消息检索服务"""
+
+    @staticmethod
+    async def search(
+        query: str,
+        source: Optional[str] = None,
+        from_user: Optional[str] = None,
+        msg_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> MessagePage:
+        """
+        全文检索，按相关度排序，游标分页
+
+        游标是上一页末行的 (bm25 分数, id)。分数依赖全库词频统计，新消息写入或归档后会变化，
+        因此游标只在索引未变化时有效：期间索引有变化时，继续翻页可能漏掉或重复部分结果，
+        需要完整结果时应从第一页重新检索。
+
+        Raises:
+            ValueError: 查询为空或游标无效
+        """
+        match = build_match_query(query)
+        if not match:
+            raise ValueError("empty query")
+        after = decode_cursor(cursor, 2) if cursor else None
+
+        filters = {"source": source, "from_user": from_user, "msg_type": msg_type, "since": since, "until": until}
+        return await database.run_read(_search, match, filters, limit, after)
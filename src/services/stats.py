@@ -0,0 +1,138 @@
+"""
+消息统计模块
+
+message_stats_daily 按 (天, 来源, 发送者, 类型) 汇总消息数，插入消息时在同一事务中
+增量 upsert，看板查询只扫描汇总桶，与消息总量无关。归档到分区不影响统计；
+历史数据回填后可用 `python manage.py rebuild-stats` 重建。
+"""
+import logging
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.models.message import StatsBucket, StatsResponse
+from src.services import archive, database
+
+logger = logging.getLogger(__name__)
+
+STATS_TABLE = "message_stats_daily"
+STATS_DIMENSIONS = ("day", "source", "from_user", "msg_type")
+
+_UPSERT_SQL = f"""
+INSERT INTO {STATS_TABLE} (day, source, from_user, msg_type, count) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (day, source, from_user, msg_type) DO UPDATE SET count = count + excluded.count
+"""
+
+_AGGREGATE_SQL = """
+SELECT substr(created_at, 1, 10) AS day, COALESCE(source, '') AS source,
+       COALESCE(from_user, '') AS from_user, COALESCE(msg_type, '') AS msg_type, COUNT(*) AS count
+FROM {schema}.unified_messages
+WHERE created_at IS NOT NULL
+GROUP BY 1, 2, 3, 4
+"""
+
+
+def record(conn, rows: Iterable[Tuple[Optional[str], str, str, str]]) -> None:
+    """累加新写入消息的计数，rows 为 (created_at, source, from_user, msg_type)"""
+    counts = Counter(
+        (created_at[:10], source or "", from_user or "", msg_type or "")
+        for created_at, source, from_user, msg_type in rows
+        if created_at
+    )
+    if counts:
+        conn.executemany(_UPSERT_SQL, [(*key, count) for key, count in counts.items()])
+
+
+def rebuild_main(conn) -> None:
+    """按主库数据重建汇总（调用方负责事务）"""
+    conn.execute(f"DELETE FROM {STATS_TABLE}")
+    conn.execute(f"INSERT INTO {STATS_TABLE} (day, source, from_user, msg_type, count) "
+                 + _AGGREGATE_SQL.format(schema="main"))
+
+
+def rebuild(conn) -> int:
+    """
+    按主库与全部归档分区重建汇总，返回汇总桶数
+
+    先逐个 ATTACH 分区聚合到临时表，最后在一个事务中替换，重建期间看板读到的始终是完整数据。
+    conn 须为自动提交模式的写连接。
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.stats_rebuild")
+    conn.execute(f"CREATE TEMP TABLE stats_rebuild AS SELECT * FROM main.{STATS_TABLE} WHERE 0")
+    conn.execute("INSERT INTO temp.stats_rebuild " + _AGGREGATE_SQL.format(schema="main"))
+    partitions = archive.list_partitions(conn)
+    for month, path in partitions:
+        schema = f"p_{month}"
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        try:
+            conn.execute("INSERT INTO temp.stats_rebuild " + _AGGREGATE_SQL.format(schema=schema))
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DELETE FROM main.{STATS_TABLE}")
+        conn.execute(
+            f"INSERT INTO main.{STATS_TABLE} (day, source, from_user, msg_type, count) "
+            f"SELECT day, source, from_user, msg_type, SUM(count) FROM temp.stats_rebuild GROUP BY 1, 2, 3, 4"
+        )
+        buckets = conn.execute(f"SELECT COUNT(*) FROM main.{STATS_TABLE}").fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.stats_rebuild")
+    logger.info(f"[Stats] 统计汇总已重建: {buckets} 个桶, 分区 {len(partitions)} 个")
+    return buckets
+
+
+def _query(conn, group_by: List[str], filters: Dict[str, Any]) -> StatsResponse:
+    where = []
+    params: List[Any] = []
+    for column in ("source", "from_user", "msg_type"):
+        if filters.get(column):
+            where.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters.get("since"):
+        where.append("day >= ?")
+        params.append(filters["since"].isoformat())
+    if filters.get("until"):
+        where.append("day < ?")
+        params.append(filters["until"].isoformat())
+
+    columns = ", ".join(group_by + ["SUM(count) AS count"])
+    sql = f"SELECT {columns} FROM {STATS_TABLE}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if group_by:
+        sql += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+
+    buckets = [StatsBucket(**dict(row)) for row in conn.execute(sql, params) if row["count"]]
+    return StatsResponse(group_by=group_by, total=sum(b.count for b in buckets), buckets=buckets)
+
+
+class StatsService:
+    """消息统计服务"""
+
+    @staticmethod
+    async def query(
+        group_by: List[str],
+        source: Optional[str] = None,
+        from_user: Optional[str] = None,
+        msg_type: Optional[str] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> StatsResponse:
+        """
+        按维度汇总消息数
+
+        Raises:
+            ValueError: 不支持的分组维度
+        """
+        invalid = [d for d in group_by if d not in STATS_DIMENSIONS]
+        if invalid:
+            raise ValueError(f"unsupported group_by: {', '.join(invalid)}")
+        group_by = list(dict.fromkeys(group_by))
+        filters = {"source": source, "from_user": from_user, "msg_type": msg_type, "since": since, "until": until}
+        return await database.run_read(_query, group_by, filters)
@@ -0,0 +1,210 @@
+"""
+对象存储后端
+
+上传服务只依赖 StorageBackend 接口，由 STORAGE_BACKEND 选择实现：
+- cos：腾讯云 COS（默认），SDK 在首次使用时才导入
+- local：本地目录 STORAGE_LOCAL_DIR，由 FastAPI 挂载在 STORAGE_LOCAL_MOUNT 下提供访问，
+  用于私有化部署以及离线测试 / 压测媒体链路
+
+对象名 (name) 是相对存储根的路径，如 media/<sha256>.jpg。
+底层操作是同步的，异步接口 put / exists 在调用方给定的线程池中执行。
+"""
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cos").lower()
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "data/storage")
+STORAGE_LOCAL_MOUNT = os.getenv("STORAGE_LOCAL_MOUNT", "/storage")
+STORAGE_LOCAL_BASE_URL = os.getenv("STORAGE_LOCAL_BASE_URL", "")
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class StorageBackend(ABC):
+    """对象存储后端接口"""
+
+    name = ""
+
+    @abstractmethod
+    def url(self, name: str) -> str:
+        """对象的公开访问 URL"""
+
+    @abstractmethod
+    def put_file(self, local_path: str, name: str, progress_callback: Optional[ProgressCallback] = None) -> str:
+        """
+        上传本地文件（同步），返回访问 URL
+
+        Raises:
+            Exception: 上传失败
+        """
+
+    @abstractmethod
+    def object_exists(self, name: str) -> bool:
+        """对象是否已存在（同步）"""
+
+    @abstractmethod
+    def put_stream(
+        self,
+        chunks: Iterable[bytes],
+        name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        should_commit: Optional[Callable[[], bool]] = None,
+    ) -> Optional[str]:
+        """
+        上传数据流（同步）；should_commit 在数据读完、提交前调用，返回 False 时放弃
+
+        Returns:
+            访问 URL，放弃时返回 None
+
+        Raises:
+            Exception: 上传失败
+        """
+
+    def init(self) -> bool:
+        """启动时初始化，返回是否可用"""
+        return True
+
+    async def put(
+        self,
+        local_path: str,
+        name: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        executor: Optional[Executor] = None,
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.put_file, local_path, name, progress_callback)
+
+    async def exists(self, name: str, executor: Optional[Executor] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.object_exists, name)
+
+
+class CosStorageBackend(StorageBackend):
+    """腾讯云 COS"""
+
+    name = "cos"
+
+    def init(self) -> bool:
+        from src.services.cos import init_cos
+        return init_cos() is not None
+
+    def url(self, name: str) -> str:
+        from src.services.cos import get_cos_url
+        return get_cos_url(name)
+
+    def put_file(self, local_path: str, name: str, progress_callback: Optional[ProgressCallback] = None) -> str:
+        from src.services.cos import upload_file
+        url = upload_file(local_path, name, progress_callback=progress_callback, raise_on_error=True)
+        if not url:
+            raise RuntimeError("COS 未配置或文件不存在")
+        return url
+
+    def object_exists(self, name: str) -> bool:
+        from src.services.cos import object_exists
+        return object_exists(name)
+
+    def put_stream(self, chunks, name, progress_callback=None, should_commit=None) -> Optional[str]:
+        from src.services import cos
+        if not cos.is_configured():
+            raise RuntimeError("COS 未配置")
+        return cos.upload_stream(chunks, name, progress_callback=progress_callback, should_commit=should_commit)
+
+
+class LocalStorageBackend(StorageBackend):
+    """本地目录（通过 FastAPI 静态路由访问）"""
+
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_DIR, base_url: str = STORAGE_LOCAL_BASE_URL):
+        self.root = root
+        if not base_url:
+            base_url = f"http://localhost:{os.getenv('APP_PORT', '8002')}{STORAGE_LOCAL_MOUNT}"
+        self.base_url = base_url.rstrip("/")
+
+    def init(self) -> bool:
+        os.makedirs(self.root, exist_ok=True)
+        logger.info(f"[Storage] 本地存储: {os.path.abspath(self.root)} -> {self.base_url}")
+        return True
+
+    def _path(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"invalid object name: {name}")
+        return path
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def put_file(self, local_path: str, name: str, progress_callback: Optional[ProgressCallback] = None) -> str:
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            # 同一文件系统上直接硬链接，否则复制
+            os.link(local_path, tmp)
+        except OSError:
+            shutil.copyfile(local_path, tmp)
+        os.replace(tmp, target)
+        if progress_callback:
+            size = os.path.getsize(target)
+            progress_callback(size, size)
+        return self.url(name)
+
+    def object_exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def put_stream(self, chunks, name, progress_callback=None, should_commit=None) -> Optional[str]:
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+        written = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+                    if progress_callback:
+                        progress_callback(written, 0)
+            if should_commit and not should_commit():
+                os.remove(tmp)
+                return None
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return self.url(name)
+
+
+_BACKENDS = {
+    "cos": CosStorageBackend,
+    "local": LocalStorageBackend,
+}
+
+# 全局存储后端实例
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """按 STORAGE_BACKEND 获取存储后端"""
+    global _storage
+    if _storage is None:
+        backend = _BACKENDS.get(STORAGE_BACKEND)
+        if backend is None:
+            logger.warning(f"[Storage] 未知存储后端 {STORAGE_BACKEND}，使用 cos")
+            backend = CosStorageBackend
+        _storage = backend()
+    return _storage
+
+
+def init_storage() -> bool:
+    """初始化存储后端（启动时调用）"""
+    return get_storage().init()
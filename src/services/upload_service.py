@@ -0,0 +1,305 @@
+"""
+异步上传服务
+
+存储后端（COS / 本地目录，见 storage.py）的上传是同步阻塞调用，这里放到有界线程池中执行：
+- 事件循环只等待 Future，多条媒体消息可以并行上传
+- COS 大文件由 SDK 按 COS_UPLOAD_PART_SIZE_MB 分块、COS_UPLOAD_PART_THREADS 并发上传
+- 每个上传任务记录进度与错误，最近 UPLOAD_STATUS_HISTORY 条可通过 /uploads 查询
+- COS_DEDUP 开启时按内容 sha256 寻址，清单 (media_objects) 命中则跳过上传
+- upload_stream 把数据流（企微媒体分片）直接分块上传，不经过本地文件
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from src.models.upload import UploadStatus
+from src.services import media_store
+from src.services.media_cache import media_cache
+from src.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+COS_UPLOAD_WORKERS = int(os.getenv("COS_UPLOAD_WORKERS", "4"))
+UPLOAD_STATUS_HISTORY = int(os.getenv("UPLOAD_STATUS_HISTORY", "200"))
+COS_DEDUP = os.getenv("COS_DEDUP", "true").lower() == "true"
+# 清单未命中时先 HEAD 一次 COS，对象已存在则不再上传
+COS_DEDUP_HEAD_CHECK = os.getenv("COS_DEDUP_HEAD_CHECK", "false").lower() == "true"
+
+
+class UploadService:
+    """异步上传服务（有界线程池 + 上传状态登记）"""
+
+    def __init__(self, workers: int = COS_UPLOAD_WORKERS, history: int = UPLOAD_STATUS_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="storage-upload")
+        self._history = max(history, 1)
+        self._statuses: "OrderedDict[str, UploadStatus]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在上传的内容 (sha256 -> Future)，同一批里的重复媒体等待同一次上传
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _register(self, local_path: str) -> UploadStatus:
+        status = UploadStatus(id=uuid.uuid4().hex[:12], local_path=local_path)
+        try:
+            status.size = os.path.getsize(local_path)
+        except OSError:
+            pass
+        with self._lock:
+            self._statuses[status.id] = status
+            while len(self._statuses) > self._history:
+                self._statuses.popitem(last=False)
+        return status
+
+    async def _run(self, status: UploadStatus) -> Optional[str]:
+        """上传到存储后端（阻塞操作在线程池中执行），更新状态"""
+        storage = get_storage()
+
+        def _progress(consumed: int, total: int):
+            status.uploaded = consumed
+            if total:
+                status.size = total
+
+        name = (
+            media_store.object_name(status.sha256, status.local_path) if status.sha256
+            else os.path.basename(status.local_path)
+        )
+        status.state = "uploading"
+        try:
+            if status.sha256 and COS_DEDUP_HEAD_CHECK and await storage.exists(name, self._executor):
+                url = storage.url(name)
+                status.deduplicated = True
+            else:
+                url = await storage.put(status.local_path, name, _progress, self._executor)
+        except Exception as e:
+            url = None
+            status.error = str(e)
+        if url:
+            status.state = "done"
+            status.url = url
+            status.uploaded = status.size
+        else:
+            status.state = "failed"
+        status.finished_at = datetime.now()
+        return url
+
+    async def _lookup(self, status: UploadStatus) -> Optional[str]:
+        """计算内容哈希并查询清单，命中返回已有 URL"""
+        from src.services import database
+
+        loop = asyncio.get_running_loop()
+        try:
+            status.sha256 = await loop.run_in_executor(self._executor, media_store.file_sha256, status.local_path)
+            cached = await database.run_read(media_store.lookup, status.sha256, get_storage().name)
+        except Exception as e:
+            logger.warning(f"[Upload] 媒体清单查询失败，直接上传: {status.local_path}, {e}")
+            return None
+        if not cached:
+            return None
+        await self._mark_hit(status, cached["url"])
+        return status.url
+
+    async def _mark_hit(self, status: UploadStatus, url: str) -> None:
+        from src.services import database
+
+        status.state = "done"
+        status.url = url
+        status.uploaded = status.size
+        status.deduplicated = True
+        status.finished_at = datetime.now()
+        try:
+            await database.run_write(media_store.record_hit, status.sha256)
+        except Exception as e:
+            logger.warning(f"[Upload] 更新媒体清单失败: {status.sha256}, {e}")
+
+    async def _record(self, status: UploadStatus, name: Optional[str] = None) -> None:
+        from src.services import database
+
+        name = name or media_store.object_name(status.sha256, status.local_path)
+        try:
+            await database.run_write(
+                media_store.record_upload, get_storage().name, status.sha256, name, status.url, status.size
+            )
+        except Exception as e:
+            logger.warning(f"[Upload] 写入媒体清单失败: {status.sha256}, {e}")
+
+    async def upload(self, local_path: str) -> Optional[str]:
+        """
+        上传本地文件，不阻塞事件循环；结束后交还媒体缓存（解除待上传状态）
+
+        Returns:
+            公开访问 URL，失败返回 None
+        """
+        url = None
+        try:
+            url = await self._upload(local_path)
+            return url
+        finally:
+            media_cache.release(local_path, uploaded=url is not None)
+
+    async def _upload(self, local_path: str) -> Optional[str]:
+        status = self._register(local_path)
+        if COS_DEDUP:
+            url = await self._lookup(status)
+            if not url and status.sha256 in self._inflight:
+                url = await self._inflight[status.sha256]
+                if url:
+                    await self._mark_hit(status, url)
+            if url:
+                logger.info(f"[Upload] 命中媒体清单，跳过上传: id={status.id}, sha256={status.sha256}, size={status.size}")
+                return url
+
+        future = asyncio.ensure_future(self._run(status))
+        if status.sha256:
+            self._inflight[status.sha256] = future
+        try:
+            url = await future
+        finally:
+            if status.sha256:
+                self._inflight.pop(status.sha256, None)
+        if url:
+            if status.sha256:
+                await self._record(status)
+            logger.info(f"[Upload] 上传完成: id={status.id}, size={status.size}, deduplicated={status.deduplicated}, url={url}")
+        else:
+            logger.error(f"[Upload] 上传失败: id={status.id}, path={local_path}, error={status.error}")
+        return url
+
+    async def upload_stream(
+        self,
+        chunks: Iterable[bytes],
+        ext: str,
+        label: str,
+        local_copy: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        流式上传，数据边产出边分块上传；拉取分片与上传都在线程池中执行，不阻塞事件循环
+
+        Args:
+            chunks: 数据分片迭代器（同步，在线程池中消费）
+            ext: 对象扩展名（含点）
+            label: 状态记录中显示的来源
+            local_copy: 同时写入的本地副本路径（可选）
+
+        Returns:
+            公开访问 URL，失败返回 None
+        """
+        from src.services import database
+
+        loop = asyncio.get_running_loop()
+        storage = get_storage()
+        status = self._register(label)
+        status.size = 0
+        digest = hashlib.sha256()
+        cached = {}
+
+        def _tee():
+            f = open(local_copy, "wb") if local_copy else None
+            try:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    status.size += len(chunk)
+                    if f:
+                        f.write(chunk)
+                    yield chunk
+            finally:
+                if f:
+                    f.close()
+
+        def _progress(consumed: int, total: int):
+            status.uploaded = consumed
+
+        def _should_commit() -> bool:
+            # 数据已读完（线程池中）：内容已在清单中则放弃本次上传，清单查询交回事件循环的读连接
+            status.sha256 = digest.hexdigest()
+            if COS_DEDUP:
+                lookup = database.run_read(media_store.lookup, status.sha256, storage.name)
+                try:
+                    existing = asyncio.run_coroutine_threadsafe(lookup, loop).result()
+                except Exception as e:
+                    logger.warning(f"[Upload] 媒体清单查询失败，直接上传: {status.sha256}, {e}")
+                    existing = None
+                if existing:
+                    cached["url"] = existing["url"]
+                    return False
+            return True
+
+        name = media_store.stream_object_name(ext)
+        status.state = "uploading"
+        try:
+            url = await loop.run_in_executor(
+                self._executor, storage.put_stream, _tee(), name, _progress, _should_commit
+            )
+        except Exception as e:
+            url = None
+            status.error = str(e)
+
+        if cached:
+            await self._mark_hit(status, cached["url"])
+            url = status.url
+        elif url:
+            status.state = "done"
+            status.url = url
+            status.uploaded = status.size
+            status.finished_at = datetime.now()
+            await self._record(status, name)
+        else:
+            status.state = "failed"
+            status.finished_at = datetime.now()
+
+        if url:
+            logger.info(f"[Upload] 直传完成: id={status.id}, size={status.size}, deduplicated={status.deduplicated}, url={url}")
+        else:
+            logger.error(f"[Upload] 直传失败: id={status.id}, source={label}, error={status.error}")
+        return url
+
+    def get_status(self, upload_id: str) -> Optional[UploadStatus]:
+        with self._lock:
+            return self._statuses.get(upload_id)
+
+    def list_statuses(self, state: Optional[str] = None) -> List[UploadStatus]:
+        """最近的上传任务（新的在前）"""
+        with self._lock:
+            statuses = list(reversed(self._statuses.values()))
+        if state:
+            statuses = [s for s in statuses if s.state == state]
+        return statuses
+
+    @staticmethod
+    async def report() -> dict:
+        """媒体报告：去重（对象数、命中次数、节省的字节数）、图片预处理与本地缓存占用"""
+        from src.services import database
+        from src.services.media_transform import media_transform
+        report = await database.run_read(media_store.storage_report)
+        report["image_transform"] = media_transform.report()
+        report["media_cache"] = await asyncio.to_thread(media_cache.report)
+        return report
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池（默认等待进行中的上传完成）"""
+        self._executor.shutdown(wait=wait)
+
+
+# 全局上传服务实例
+_upload_service = None
+
+
+def get_upload_service() -> UploadService:
+    """获取上传服务实例"""
+    global _upload_service
+    if _upload_service is None:
+        _upload_service = UploadService()
+    return _upload_service
+
+
+def close_upload_service() -> None:
+    """关闭上传服务（等待进行中的上传完成）"""
+    global _upload_service
+    if _upload_service is not None:
+        _upload_service.shutdown()
+        _upload_service = None
@@ -3,6 +3,7 @@
 
 集成官方 SDK 拉取消息存档
 """
+import asyncio
 import base64
 import ctypes
 import json
@@ -10,14 +11,18 @@ import logging
 import os
 import time
 import urllib.request
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+
+from src.services.media_cache import media_cache
 
 logger = logging.getLogger(__name__)
 # 独立的轮询日志器，与 wecom 主日志隔离
 logger_polling = logging.getLogger(f"{__name__}.polling")
 
-# 图片保存目录
-IMAGE_SAVE_DIR = os.getenv("IMAGE_SAVE_DIR", "./images")
+# 直传 COS 的媒体类型（逗号分隔，如 video,file），为空则全部先落盘再上传
+MEDIA_PIPE_TYPES = {t.strip() for t in os.getenv("MEDIA_PIPE_TYPES", "").split(",") if t.strip()}
+# 直传时是否同时保留本地副本
+MEDIA_PIPE_KEEP_LOCAL = os.getenv("MEDIA_PIPE_KEEP_LOCAL", "false").lower() == "true"
 
 
 # SDK 结构体定义
@@ -46,7 +51,7 @@ _sdk_lib = None
 _sdk_instance = None
 _access_token = ""
 _access_token_expires_at = 0
-WECOM_SEQ_FILE = "/app/data/.wecom_seq"
+WECOM_SEQ_FILE = os.getenv("WECOM_SEQ_FILE", "/app/data/.wecom_seq")
 WECOM_OFFSET_MAX = int(os.getenv("WECOM_OFFSET_MAX") or "0")
 
 def get_last_seq_from_file() -> int:
@@ -104,6 +109,10 @@ def init_wecom(corp_id: str, chat_secret: str, private_key_path: str = "private_
     # 加载 SDK
     _sdk_lib = _load_sdk_lib()
 
+    # 模拟器在未提供私钥时会自行生成密钥对
+    if not _private_key and getattr(_sdk_lib, "private_key_pem", None):
+        _private_key = _sdk_lib.private_key_pem
+
 
 def _load_sdk_lib():
     """加载 SDK 库并定义函数签名"""
@@ -112,7 +121,13 @@ def _load_sdk_lib():
         logger.warning("[WeCom] SDK loading explicitly disabled by WECOM_DISABLE_SDK.")
         return None
 
-    # 2. 根据平台选择 SDK
+    # 2. 离线模拟模式：使用 Python 实现的模拟 SDK
+    if os.getenv("WECOM_SDK_SIMULATOR", "").lower() == "true":
+        from src.sim.wecom_sdk import SimulatedFinanceSdk
+        logger.warning("[WeCom] 使用模拟 SDK (WECOM_SDK_SIMULATOR=true)")
+        return SimulatedFinanceSdk.from_env(_private_key)
+
+    # 3. 根据平台选择 SDK
     import platform
     system = platform.system()
     machine = platform.machine()
@@ -275,7 +290,7 @@ class WeComService:
     @staticmethod
     def fetch_messages(limit: int = 1000, timeout: int = 5) -> List[dict]:
         """
-        使用 SDK 拉取消息
+        使用 SDK 拉取消息，并立即保存新的 seq
 
         Args:
             limit: 每次拉取的最大条数
@@ -284,12 +299,25 @@ class WeComService:
         Returns:
             解密后的消息列表
         """
+        messages, next_seq = WeComService.fetch_page(limit=limit, timeout=timeout)
+        if next_seq:
+            save_last_seq_to_file(next_seq)
+        return messages
+
+    @staticmethod
+    def fetch_page(limit: int = 1000, timeout: int = 5) -> Tuple[List[dict], Optional[int]]:
+        """
+        使用 SDK 拉取一页消息，不保存 seq（由调用方在消息落库后保存）
+
+        Returns:
+            (解密后的消息列表, 新的 seq；未前进或拉取出错时为 None)
+        """
         if not _sdk_lib:
-            return []
+            return [], None
 
         sdk = _ensure_sdk_init()
         if not sdk:
-            return []
+            return [], None
 
         messages = []
         seq = get_last_seq_from_file()
@@ -304,12 +332,12 @@ class WeComService:
             if result != 0:
                 logger_polling.error(f"[WeCom] GetChatData failed: code={result}")
                 _sdk_lib.FreeSlice(slice_ptr)
-                return []
+                return [], None
 
             data_ptr = _sdk_lib.GetContentFromSlice(slice_ptr)
             if not data_ptr:
                 _sdk_lib.FreeSlice(slice_ptr)
-                return []
+                return [], None
 
             data_len = _sdk_lib.GetSliceLen(slice_ptr)
             data_str = ctypes.string_at(data_ptr, data_len).decode("utf-8")
@@ -319,7 +347,7 @@ class WeComService:
             chat_data = data.get("chatdata", [])
 
             if not chat_data:
-                return []
+                return [], None
 
             # 获取机器人自己的UserID，用于过滤消息
             bot_userid = os.getenv("WECOM_BOT_USERID")
@@ -350,14 +378,14 @@ class WeComService:
                 else:
                     logger_polling.warning(f"[WeCom] 解密失败: msgid={msg.get('msgid')}")
 
-            # 如果成功拉取到新消息，更新seq
+            # 如果成功拉取到新消息，返回新的 seq
             if max_seq > seq:
-                save_last_seq_to_file(max_seq)
+                return messages, max_seq
 
         except Exception as e:
             logger_polling.error(f"[WeCom] 获取消息异常: {e}")
 
-        return messages
+        return messages, None
 
 
 def _get_access_token() -> Optional[str]:
@@ -397,26 +425,71 @@ def _get_access_token() -> Optional[str]:
         return None
 
 
-def download_image(media_id: str, msg_id: str = "", seq: int = 0, roomid: str = "", file_extension: str = "jpg", original_name: str = "") -> Optional[str]:
+def iter_media_chunks(media_id: str, max_iterations: int = 100) -> Iterator[bytes]:
     """
-    从企业微信服务器下载媒体文件（使用 SDK）
+    按分片拉取媒体数据（GetMediaData），逐片产出 bytes
 
-    Args:
-        media_id: 媒体的 sdkfileid
-        msg_id: 消息 ID
-        seq: 消息序号
-        roomid: 群聊 ID
-        file_extension: 文件扩展名 (默认 jpg)
-        original_name: 原始文件名 (可选)
-
-    Returns:
-        本地文件路径或 None
+    Raises:
+        RuntimeError: SDK 未加载 / 初始化失败 / 分片拉取失败
     """
-    logger.info(f"[WeCom] download_image: media_id={media_id[:30] if media_id else 'None'}..., msg_id={msg_id}")
+    if not _sdk_lib:
+        raise RuntimeError("SDK 未加载")
+    sdk = _ensure_sdk_init()
+    if not sdk:
+        raise RuntimeError("SDK 未初始化")
+
+    # 使用 MediaData_t 结构体（SDK 1.8+）
+    media_data_ptr = _sdk_lib.NewMediaData()
+    if not media_data_ptr:
+        raise RuntimeError("NewMediaData 失败")
+
+    try:
+        indexbuf = b""  # 首次为空
+        total = 0
+        for iteration in range(max_iterations):  # 防止无限循环
+            result = _sdk_lib.GetMediaData(
+                sdk,
+                indexbuf,
+                media_id.encode('utf-8'),
+                b"",
+                b"",
+                30,
+                media_data_ptr
+            )
+
+            if result != 0:
+                raise RuntimeError(f"GetMediaData 第{iteration+1}次调用失败: code={result}")
+
+            data_ptr = _sdk_lib.GetData(media_data_ptr)
+            data_len = _sdk_lib.GetDataLen(media_data_ptr)
+            is_finish = _sdk_lib.IsMediaDataFinish(media_data_ptr)
+
+            if data_ptr and data_len > 0:
+                total += data_len
+                logger.debug(f"[WeCom] 第{iteration+1}次: {data_len} bytes, 累计: {total}")
+                yield ctypes.string_at(data_ptr, data_len)
+            else:
+                logger.warning(f"[WeCom] 第{iteration+1}次返回空数据")
+
+            if is_finish:
+                logger.info(f"[WeCom] 媒体拉取完成，总大小: {total} bytes")
+                return
+
+            # 获取下一次请求需要的 outindexbuf
+            media_data = media_data_ptr.contents
+            outindexbuf = media_data.outindexbuf
+            outindexbuf_len = media_data.out_len
+            if outindexbuf and outindexbuf_len > 0:
+                indexbuf = ctypes.string_at(outindexbuf, outindexbuf_len)
+            else:
+                logger.warning("[WeCom] 无法获取下一分片 outindexbuf")
+                return
+    finally:
+        _sdk_lib.FreeMediaData(media_data_ptr)
 
-    # 确保保存目录存在
-    os.makedirs(IMAGE_SAVE_DIR, exist_ok=True)
 
+def _media_local_path(media_id: str, msg_id: str = "", file_extension: str = "jpg", original_name: str = "") -> str:
+    """生成媒体文件的本地保存路径（媒体缓存中的分片目录）"""
     # 生成文件名
     timestamp = int(time.time() * 1000)
     prefix = "media"
@@ -434,103 +507,143 @@ def download_image(media_id: str, msg_id: str = "", seq: int = 0, roomid: str =
     else:
         filename = f"{base_name}.{file_extension}"
 
-    local_path = os.path.join(IMAGE_SAVE_DIR, filename)
-    logger.info(f"[WeCom] 文件保存路径: {local_path}")
+    return media_cache.path_for(filename)
 
-    # 优先使用 SDK 下载
-    if _sdk_lib:
-        logger.info(f"[WeCom] 使用 SDK 下载...")
-        sdk = _ensure_sdk_init()
-        if sdk:
-            try:
-                # 使用 MediaData_t 结构体（SDK 1.8+）
-                media_data_ptr = _sdk_lib.NewMediaData()
-                if not media_data_ptr:
-                    logger.error("[WeCom] NewMediaData 失败")
-                    return None
-
-                all_data = b""
-                indexbuf = b""  # 首次为空
-                max_iterations = 100  # 防止无限循环
-
-                for iteration in range(max_iterations):
-                    result = _sdk_lib.GetMediaData(
-                        sdk,
-                        indexbuf,
-                        media_id.encode('utf-8'),
-                        b"",
-                        b"",
-                        30,
-                        media_data_ptr
-                    )
-
-                    if result != 0:
-                        logger.error(f"[WeCom] GetMediaData 第{iteration+1}次调用失败: code={result}")
-                        _sdk_lib.FreeMediaData(media_data_ptr)
-                        return None
-
-                    data_ptr = _sdk_lib.GetData(media_data_ptr)
-                    data_len = _sdk_lib.GetDataLen(media_data_ptr)
-                    is_finish = _sdk_lib.IsMediaDataFinish(media_data_ptr)
-
-                    if data_ptr and data_len > 0:
-                        chunk = ctypes.string_at(data_ptr, data_len)
-                        all_data += chunk
-                        logger.info(f"[WeCom] 第{iteration+1}次: {data_len} bytes, 累计: {len(all_data)}")
-                    else:
-                        logger.warning(f"[WeCom] 第{iteration+1}次返回空数据")
-
-                    if is_finish:
-                        logger.info(f"[WeCom] 下载完成，总大小: {len(all_data)} bytes")
-                        break
-
-                    # 获取下一次请求需要的 outindexbuf
-                    media_data = media_data_ptr.contents
-                    outindexbuf = media_data.outindexbuf
-                    outindexbuf_len = media_data.out_len
-                    if outindexbuf and outindexbuf_len > 0:
-                        indexbuf = ctypes.string_at(outindexbuf, outindexbuf_len)
-                    else:
-                        logger.warning("[WeCom] 无法获取下一分片 outindexbuf")
-                        break
 
-                # 保存文件
-                if all_data:
-                    with open(local_path, "wb") as f:
-                        f.write(all_data)
+def download_image(media_id: str, msg_id: str = "", seq: int = 0, roomid: str = "", file_extension: str = "jpg", original_name: str = "") -> Optional[str]:
+    """
+    从企业微信服务器下载媒体文件（使用 SDK）
 
-                    file_size = os.path.getsize(local_path)
-                    logger.info(f"[WeCom] 下载成功: {local_path} ({file_size} bytes)")
-                    _sdk_lib.FreeMediaData(media_data_ptr)
-                    return local_path
+    Args:
+        media_id: 媒体的 sdkfileid
+        msg_id: 消息 ID
+        seq: 消息序号
+        roomid: 群聊 ID
+        file_extension: 文件扩展名 (默认 jpg)
+        original_name: 原始文件名 (可选)
 
-                logger.error("[WeCom] 未获取到任何数据")
-                _sdk_lib.FreeMediaData(media_data_ptr)
+    Returns:
+        本地文件路径或 None
+    """
+    logger.info(f"[WeCom] download_image: media_id={media_id[:30] if media_id else 'None'}..., msg_id={msg_id}")
 
-            except Exception as e:
-                logger.error(f"[WeCom] SDK 下载异常: {e}")
-                import traceback
-                traceback.print_exc()
+    local_path = _media_local_path(media_id, msg_id, file_extension, original_name)
+    logger.info(f"[WeCom] 文件保存路径: {local_path}")
 
-        logger.warning("[WeCom] SDK 下载失败")
-    else:
+    if not _sdk_lib:
         logger.warning("[WeCom] SDK 未加载")
+        return None
 
+    # 分片边拉取边写入，不在内存中拼接整个文件
+    file_size = 0
+    try:
+        with open(local_path, "wb") as f:
+            for chunk in iter_media_chunks(media_id):
+                f.write(chunk)
+                file_size += len(chunk)
+    except Exception as e:
+        logger.error(f"[WeCom] SDK 下载异常: {e}")
+        file_size = 0
+
+    if file_size:
+        logger.info(f"[WeCom] 下载成功: {local_path} ({file_size} bytes)")
+        media_cache.add(local_path)
+        return local_path
+
+    logger.error("[WeCom] 未获取到任何数据")
+    if os.path.exists(local_path):
+        os.remove(local_path)
+    logger.warning("[WeCom] SDK 下载失败")
     return None
 
 
+async def pipe_media_to_cos(media_id: str, msg_id: str = "", file_extension: str = "jpg", original_name: str = "") -> Optional[str]:
+    """
+    媒体直传 COS：GetMediaData 的分片直接作为分块上传的数据，不落盘（在上传线程池中执行）
+
+    MEDIA_PIPE_KEEP_LOCAL=true 时同时写一份本地副本（不再从磁盘读回）。
+
+    Returns:
+        COS 访问 URL，失败返回 None
+    """
+    from src.services.upload_service import get_upload_service
+
+    local_path = None
+    if MEDIA_PIPE_KEEP_LOCAL:
+        local_path = _media_local_path(media_id, msg_id, file_extension, original_name)
+    ext = os.path.splitext(original_name)[1] if original_name else f".{file_extension}"
+    label = local_path or f"wecom:{msg_id or media_id[:16]}"
+    url = await get_upload_service().upload_stream(iter_media_chunks(media_id), ext, label, local_copy=local_path)
+    if local_path:
+        media_cache.add(local_path, pinned=False)
+    return url
+
+
 # 便捷函数
 def fetch_messages(limit: int = 1000, timeout: int = 5) -> List[dict]:
     """获取消息（便捷函数）"""
     return WeComService.fetch_messages(limit=limit, timeout=timeout)
 
 
+def fetch_page(limit: int = 1000, timeout: int = 5) -> Tuple[List[dict], Optional[int]]:
+    """获取一页消息与新的 seq，不保存 seq（便捷函数）"""
+    return WeComService.fetch_page(limit=limit, timeout=timeout)
+
+
+async def fetch_media(msg_type: str, media_data: dict, msg_id: str = "") -> Optional[str]:
+    """
+    拉取消息中的媒体（sdkfileid）：MEDIA_PIPE_TYPES 中的类型直传 COS，否则（或直传失败时）下载到本地
+
+    拉取与上传都在线程中执行，不阻塞事件循环。
+
+    Returns:
+        COS URL 或本地路径，失败返回 None
+    """
+    sdkfileid = media_data.get("sdkfileid")
+    if not sdkfileid:
+        return None
+
+    ext = "jpg"
+    original_name = ""
+    if msg_type == "file":
+        ext = media_data.get("fileext", "bin")
+        original_name = media_data.get("filename", "")
+    elif msg_type == "video":
+        ext = "mp4"
+    elif msg_type == "voice":
+        ext = "amr"
+
+    if msg_type in MEDIA_PIPE_TYPES:
+        # 直传 COS，content 为 URL，转发时不再上传
+        media_url = await pipe_media_to_cos(
+            media_id=sdkfileid,
+            msg_id=msg_id,
+            file_extension=ext,
+            original_name=original_name
+        )
+        if media_url:
+            return media_url
+        logger_polling.warning(f"[WeCom Parser] 媒体直传失败，改为下载到本地: {msg_id}")
+
+    local_path = await asyncio.to_thread(
+        download_image,
+        media_id=sdkfileid,
+        msg_id=msg_id,
+        file_extension=ext,
+        original_name=original_name
+    )
+    if not local_path:
+        logger_polling.warning(f"[WeCom Parser] 下载媒体失败: {msg_id}")
+    return local_path
+
+
 # --- 新增轮询相关功能 ---
-import asyncio
 from src.models.chat_record import UnifiedMessage
-from src.services.message_processor import process_message
+from src.services import composite
+from src.services.composite import COMPOSITE_TYPES
+from src.services.dispatcher import get_dispatcher
 
-def parse_wecom_message(msg: dict) -> Optional[UnifiedMessage]:
+async def parse_wecom_message(msg: dict) -> Optional[UnifiedMessage]:
     """
     解析企微消息字典为 UnifiedMessage
     """
@@ -547,36 +660,12 @@ def parse_wecom_message(msg: dict) -> Optional[UnifiedMessage]:
         if msg_type in ["text", "markdown"]:
             content = msg.get(msg_type, {}).get("content", "")
         elif msg_type in ["image", "video", "voice", "file"]:
-            # 媒体消息：尝试下载文件并获取本地路径
+            # 媒体消息：直传 COS 或下载到本地
             media_data = msg.get(msg_type, {})
-            sdkfileid = media_data.get("sdkfileid")
-
-            if sdkfileid:
-                ext = "jpg"
-                original_name = ""
-                if msg_type == "file":
-                    ext = media_data.get("fileext", "bin")
-                    original_name = media_data.get("filename", "")
-                elif msg_type == "video":
-                    ext = "mp4"
-                elif msg_type == "voice":
-                    ext = "amr"
-
-                # 下载文件 (调用 wecom.py 内部的 download_image)
-                local_path = download_image(
-                    media_id=sdkfileid,
-                    msg_id=msg_id,
-                    file_extension=ext,
-                    original_name=original_name
-                )
-
-                if local_path:
-                    content = local_path
-                else:
-                    logger_polling.warning(f"[WeCom Parser] 下载媒体失败: {msg_id}")
-                    content = json.dumps(media_data)
-            else:
-                content = json.dumps(media_data)
+            content = await fetch_media(msg_type, media_data, msg_id) or json.dumps(media_data)
+        elif msg_type in COMPOSITE_TYPES:
+            # 合并转发 / 图文混排：子项媒体在转发时并发拉取，这里只记录文本摘要
+            content = composite.summary(msg_type, msg.get(msg_type, {}))
         elif msg_type == "link":
             content = msg.get("link", {}).get("link_url", "")
         else:
@@ -604,6 +693,9 @@ def parse_wecom_message(msg: dict) -> Optional[UnifiedMessage]:
 async def run_wecom_polling():
     """
     企微消息轮询主循环
+
+    一页消息落库并提交给分发器后才保存 seq：关闭时若轮询在解析（拉取媒体）中途被取消，
+    下次启动会重新拉取这一页（已落库的消息由去重过滤）。
     """
     logger_polling.info(">>> WeCom Polling Service Starting... <<<")
 
@@ -612,28 +704,38 @@ async def run_wecom_polling():
         logger_polling.warning("[WeCom Polling] SDK 未加载或被禁用，轮询服务已停止。")
         return
 
-    while True:
+    dispatcher = get_dispatcher()
+    while not dispatcher.stopping:
         try:
-            # 使用 to_thread 在异步事件循环中运行同步的 fetch_messages
+            # 使用 to_thread 在异步事件循环中运行同步的 fetch_page
             # 将超时延长至20秒，提高长轮询效率
-            messages = await asyncio.to_thread(fetch_messages, limit=100, timeout=20)
+            messages, next_seq = await asyncio.to_thread(fetch_page, limit=100, timeout=20)
 
             if messages:
                 logger_polling.info(f"[WeCom Polling] 拉取到 {len(messages)} 条消息")
+                batch = []
                 for msg_data in messages:
                     msg_type = msg_data.get("msgtype", "unknown")
                     from_user = msg_data.get("from", "unknown")
                     content_preview = msg_data.get("text", {}).get("content", "")[:100] if msg_data.get("text") else ""
                     logger_polling.info(f"[WeCom] 消息: from={from_user}, type={msg_type}, content={content_preview}")
 
-                    unified_msg = parse_wecom_message(msg_data)
+                    unified_msg = await parse_wecom_message(msg_data)
                     if unified_msg:
-                        asyncio.create_task(process_message(unified_msg))
+                        batch.append(unified_msg)
                     else:
                         logger_polling.warning(f"[WeCom Polling] 解析失败: {msg_data.get('msgid')}")
+
+                # 整页一次落库去重，新消息进入有界队列；队列满时在此等待，暂停拉取
+                if batch:
+                    await dispatcher.submit(batch)
             else:
                 await asyncio.sleep(1)
 
+            # 整页已落库（或写入 pending_messages）后再前进 seq；只含被过滤消息的页也要前进
+            if next_seq:
+                save_last_seq_to_file(next_seq)
+
         except Exception as e:
             logger_polling.error(f"[WeCom Polling] 轮询错误: {e}", exc_info=True)
             await asyncio.sleep(15)
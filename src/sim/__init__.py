@@ -0,0 +1,5 @@
+"""
+本地模拟服务模块
+
+用于离线压测与联调，替代外部依赖（Craft API 等）
+"""
@@ -0,0 +1,238 @@
+"""
+Craft API 本地模拟服务
+
+实现 /links/{link_id}/api/v1/blocks 的 GET / POST 接口形状，
+支持配置响应延迟、按比例注入 429 / 5xx 错误，并记录收到的 blocks。
+
+用法:
+    python -m src.sim.craft_server --port 9100 --latency-ms 50 --rate-429 0.05
+
+然后将 CRAFT_API_BASE_URL 指向 http://127.0.0.1:9100/links
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+
+class FakeCraftState:
+    """模拟服务状态：文档内容、请求统计与故障注入配置"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """清空记录的文档与统计"""
+        with self._lock:
+            # (link_id, document_id) -> 根 page block
+            self.documents: Dict[tuple, Dict[str, Any]] = {}
+            # block_id -> block，便于按 pageId 追加到子页面
+            self.blocks_by_id: Dict[str, Dict[str, Any]] = {}
+            self.stats = {
+                "get": 0,
+                "post": 0,
+                "blocks": 0,
+                "injected_429": 0,
+                "injected_5xx": 0,
+                "unauthorized": 0,
+            }
+
+    def delay(self) -> float:
+        """计算本次请求的模拟延迟（秒）"""
+        latency = self.latency_ms
+        if self.jitter_ms:
+            latency += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(latency, 0) / 1000
+
+    def pick_fault(self) -> Optional[int]:
+        """按配置比例决定是否注入错误，返回状态码"""
+        roll = self._random.random()
+        if roll < self.rate_429:
+            self.stats["injected_429"] += 1
+            return 429
+        if roll < self.rate_429 + self.rate_5xx:
+            self.stats["injected_5xx"] += 1
+            return self._random.choice((502, 503, 504))
+        return None
+
+    def get_document(self, link_id: str, document_id: str) -> Dict[str, Any]:
+        """获取（必要时创建）文档根 page"""
+        key = (link_id, document_id)
+        doc = self.documents.get(key)
+        if doc is None:
+            doc = {
+                "id": document_id,
+                "type": "page",
+                "markdown": f"Fake Document {document_id}",
+                "content": [],
+            }
+            self.documents[key] = doc
+            self.blocks_by_id[document_id] = doc
+        return doc
+
+    def append_blocks(self, link_id: str, page_id: str, blocks: List[Dict], position: str) -> List[Dict]:
+        """追加 blocks 到指定 page，递归分配 id"""
+        with self._lock:
+            parent = self.blocks_by_id.get(page_id) or self.get_document(link_id, page_id)
+            children = parent.setdefault("content", [])
+            created = [self._assign_ids(block) for block in blocks]
+            if position == "start":
+                children[0:0] = created
+            else:
+                children.extend(created)
+            return created
+
+    def _assign_ids(self, block: Dict) -> Dict:
+        block = dict(block)
+        block.setdefault("id", uuid.uuid4().hex)
+        self.blocks_by_id[block["id"]] = block
+        self.stats["blocks"] += 1
+        if isinstance(block.get("content"), list):
+            block["content"] = [self._assign_ids(child) for child in block["content"]]
+        return block
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前记录，供压测脚本校验"""
+        with self._lock:
+            return {
+                "stats": dict(self.stats),
+                "documents": [
+                    {"link_id": link_id, "document_id": doc_id, "blocks": len(doc.get("content", []))}
+                    for (link_id, doc_id), doc in self.documents.items()
+                ],
+            }
+
+
+def _trim_depth(block: Dict, depth: int) -> Dict:
+    """按 maxDepth 裁剪返回的 block 树（负数表示不限制）"""
+    if depth == 0:
+        return {k: v for k, v in block.items() if k != "content"}
+    result = dict(block)
+    if isinstance(block.get("content"), list):
+        result["content"] = [_trim_depth(child, depth - 1) for child in block["content"]]
+    return result
+
+
+def create_app(state: Optional[FakeCraftState] = None) -> FastAPI:
+    """创建模拟 Craft API 应用"""
+    state = state or FakeCraftState()
+    app = FastAPI(title="Fake Craft API", docs_url=None, redoc_url=None)
+    app.state.craft = state
+
+    async def _before_request(request: Request):
+        delay = state.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            state.stats["unauthorized"] += 1
+            return JSONResponse({"error": "unauthorized"}, status_code=401)
+        fault = state.pick_fault()
+        if fault == 429:
+            return JSONResponse({"error": "Too Many Requests"}, status_code=429)
+        if fault:
+            return PlainTextResponse("Service Unavailable", status_code=fault)
+        return None
+
+    @app.get("/links/{link_id}/api/v1/blocks")
+    async def get_blocks(link_id: str, request: Request, id: str, maxDepth: int = -1):
+        state.stats["get"] += 1
+        error = await _before_request(request)
+        if error:
+            return error
+        with state._lock:
+            doc = state.blocks_by_id.get(id) or state.get_document(link_id, id)
+            return _trim_depth(doc, maxDepth if maxDepth >= 0 else -1)
+
+    @app.post("/links/{link_id}/api/v1/blocks")
+    async def post_blocks(link_id: str, request: Request):
+        state.stats["post"] += 1
+        error = await _before_request(request)
+        if error:
+            return error
+        body = await request.json()
+        blocks = body.get("blocks") or []
+        position = body.get("position") or {}
+        page_id = position.get("pageId")
+        if not page_id:
+            return JSONResponse({"error": "position.pageId is required"}, status_code=400)
+        created = state.append_blocks(link_id, page_id, blocks, position.get("position", "end"))
+        return {"items": created}
+
+    @app.get("/_sim/stats")
+    async def sim_stats():
+        return state.snapshot()
+
+    @app.post("/_sim/reset")
+    async def sim_reset():
+        state.reset()
+        return {"status": "success"}
+
+    return app
+
+
+class BackgroundServer:
+    """在后台线程中运行 uvicorn，供压测脚本内嵌启动"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 9100):
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.base_url = f"http://{host}:{port}"
+
+    def start(self, timeout: float = 10) -> "BackgroundServer":
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Fake Craft server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Craft API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的随机抖动范围")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="注入 429 的比例 (0-1)")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="注入 5xx 的比例 (0-1)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    state = FakeCraftState(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+网页元数据本地模拟服务
+
+/pages/{page_id} 返回带 og:title / og:description / og:image 的 HTML 页面，
+/plain/{page_id} 只有 <title>，/binary/{page_id} 返回非 HTML 内容，/missing/{page_id} 返回 404；
+支持配置响应延迟，并统计每个路径被请求的次数，用于测试链接预览的缓存与并发限制。
+
+用法:
+    python -m src.sim.link_server --port 9200 --latency-ms 100
+
+然后设置 LINK_PREVIEW_ALLOW_PRIVATE=true（默认拒绝抓取内网地址），转发 http://127.0.0.1:9200/pages/1 这样的链接
+"""
+import argparse
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
+
+
+class FakeLinkState:
+    """模拟服务状态：延迟配置与请求统计"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits: Counter = Counter()
+            # 当前 / 峰值并发请求数
+            self.active = 0
+            self.max_active = 0
+
+    def enter(self, path: str) -> None:
+        with self._lock:
+            self.hits[path] += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": sum(self.hits.values()),
+                "unique_paths": len(self.hits),
+                "max_active": self.max_active,
+            }
+
+
+def create_app(state: FakeLinkState = None) -> FastAPI:
+    """创建模拟网页服务"""
+    state = state or FakeLinkState()
+    app = FastAPI(title="Fake Link Pages", docs_url=None, redoc_url=None)
+    app.state.links = state
+
+    async def _serve(path: str, response: Response) -> Response:
+        state.enter(path)
+        try:
+            if state.latency_ms:
+                await asyncio.sleep(state.latency_ms / 1000)
+            return response
+        finally:
+            state.leave()
+
+    @app.get("/pages/{page_id}")
+    async def page(page_id: str):
+        html = f"""<!DOCTYPE html>
+<html><head>
+<meta charset="utf-8">
+<title>Page {page_id} | Fake Site</title>
+<meta property="og:title" content="Fake article {page_id}">
+<meta property="og:description" content="Description of fake article {page_id}">
+<meta property="og:image" content="/images/{page_id}.jpg">
+</head><body>{"<p>lorem ipsum</p>" * 200}</body></html>"""
+        return await _serve(f"/pages/{page_id}", HTMLResponse(html))
+
+    @app.get("/plain/{page_id}")
+    async def plain(page_id: str):
+        html = f"<html><head><title>  Plain page\n {page_id} </title></head><body></body></html>"
+        return await _serve(f"/plain/{page_id}", HTMLResponse(html))
+
+    @app.get("/binary/{page_id}")
+    async def binary(page_id: str):
+        return await _serve(f"/binary/{page_id}", Response(b"\x00" * 1024, media_type="application/octet-stream"))
+
+    @app.get("/missing/{page_id}")
+    async def missing(page_id: str):
+        return await _serve(f"/missing/{page_id}", PlainTextResponse("Not Found", status_code=404))
+
+    @app.get("/_sim/stats")
+    async def sim_stats():
+        return state.snapshot()
+
+    @app.post("/_sim/reset")
+    async def sim_reset():
+        state.reset()
+        return {"status": "success"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake web pages for link preview tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(FakeLinkState(latency_ms=args.latency_ms)), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
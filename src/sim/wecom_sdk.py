@@ -0,0 +1,301 @@
+"""
+企业微信会话存档 SDK 模拟器
+
+与 libWeWorkFinanceSdk_C.so 在 wecom._load_sdk_lib 中声明的 ctypes 接口保持一致
+(NewSdk / Init / GetChatData / DecryptData / GetMediaData 及 Slice / MediaData 辅助函数)，
+可直接替换 _sdk_lib，在没有厂商库的环境中运行真实的轮询、解密与下载流程。
+
+- chatdata 中的 encrypt_random_key 使用私钥对应公钥做 RSA PKCS#1 v1.5 加密，
+  因此 wecom._decrypt_message 无需任何修改
+- encrypt_chat_msg 使用随机密钥做 AES-256-CBC 加密，由 DecryptData 解密
+- 媒体按分片返回，分片大小与文件大小可配置
+
+通过 WECOM_SDK_SIMULATOR=true 启用，其余参数见 SimulatedFinanceSdk.from_env。
+"""
+import base64
+import ctypes
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from Crypto.Cipher import AES, PKCS1_v1_5
+from Crypto.PublicKey import RSA
+from Crypto.Util.Padding import pad, unpad
+
+from src.services.wecom import MediaData_t, Slice_t
+
+# 与 SDK 返回码保持一致的错误码
+SDK_OK = 0
+SDK_ERR_DECRYPT = 10001
+SDK_ERR_MEDIA = 10002
+
+_SAMPLE_TEXT = (
+    "会议纪要 今天讨论了新版本的发布计划 请大家按时提交 "
+    "the quick brown fox jumps over the lazy dog "
+)
+
+
+class SimulatedFinanceSdk:
+    """模拟的 Finance SDK，按配置速率生成消息"""
+
+    def __init__(
+        self,
+        private_key_pem: Optional[str] = None,
+        rate: float = 20.0,
+        total: int = 0,
+        text_size: int = 64,
+        media_size: int = 256 * 1024,
+        chunk_size: int = 512 * 1024,
+        users: int = 5,
+        types: Optional[List[str]] = None,
+        latency_ms: float = 0,
+        seed: int = 0,
+    ):
+        if private_key_pem:
+            key = RSA.import_key(private_key_pem)
+        else:
+            key = RSA.generate(2048)
+        self.private_key_pem = key.export_key().decode()
+        self._rsa = PKCS1_v1_5.new(key.publickey())
+
+        self.rate = rate
+        self.total = total
+        self.text_size = text_size
+        self.media_size = media_size
+        self.chunk_size = chunk_size
+        self.users = max(users, 1)
+        self.types = types or ["text", "image", "file", "link"]
+        self.latency_ms = latency_ms
+        self.seed = seed
+
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+        # 保持 ctypes 缓冲区存活，key 为结构体地址
+        self._buffers: Dict[int, ctypes.Array] = {}
+        self.stats = {"chat_calls": 0, "messages": 0, "media_calls": 0, "media_bytes": 0}
+
+    @classmethod
+    def from_env(cls, private_key_pem: Optional[str] = None) -> "SimulatedFinanceSdk":
+        """从环境变量读取模拟参数"""
+        types = os.getenv("WECOM_SIM_TYPES", "text,image,file,link")
+        return cls(
+            private_key_pem=private_key_pem or None,
+            rate=float(os.getenv("WECOM_SIM_RATE", "20")),
+            total=int(os.getenv("WECOM_SIM_TOTAL", "0")),
+            text_size=int(os.getenv("WECOM_SIM_TEXT_SIZE", "64")),
+            media_size=int(os.getenv("WECOM_SIM_MEDIA_SIZE", str(256 * 1024))),
+            chunk_size=int(os.getenv("WECOM_SIM_CHUNK_SIZE", str(512 * 1024))),
+            users=int(os.getenv("WECOM_SIM_USERS", "5")),
+            types=[t.strip() for t in types.split(",") if t.strip()],
+            latency_ms=float(os.getenv("WECOM_SIM_LATENCY_MS", "0")),
+            seed=int(os.getenv("WECOM_SIM_SEED", "0")),
+        )
+
+    # ---- 消息生成 ----
+
+    def available_seq(self) -> int:
+        """当前时刻已“产生”的最大 seq"""
+        produced = int((time.time() - self._started_at) * self.rate)
+        if self.total:
+            produced = min(produced, self.total)
+        return produced
+
+    def build_message(self, seq: int) -> dict:
+        """按 seq 确定性地生成一条解密后的消息"""
+        rnd = random.Random(self.seed * 1_000_003 + seq)
+        msg_type = self.types[seq % len(self.types)]
+        msg = {
+            "msgid": f"sim{seq:012d}",
+            "action": "send",
+            "from": f"sim_user_{seq % self.users}",
+            "tolist": ["sim_bot"],
+            "roomid": "",
+            "msgtime": int(time.time() * 1000),
+            "msgtype": msg_type,
+        }
+        sdkfileid = base64.urlsafe_b64encode(f"sim:{seq}:{self.media_size}".encode()).decode()
+        if msg_type == "text":
+            repeat = self.text_size // len(_SAMPLE_TEXT) + 1
+            msg["text"] = {"content": f"#{seq} " + (_SAMPLE_TEXT * repeat)[:self.text_size]}
+        elif msg_type == "image":
+            msg["image"] = {"md5sum": hashlib.md5(sdkfileid.encode()).hexdigest(),
+                            "filesize": self.media_size, "sdkfileid": sdkfileid}
+        elif msg_type == "video":
+            msg["video"] = {"md5sum": hashlib.md5(sdkfileid.encode()).hexdigest(),
+                            "filesize": self.media_size, "play_length": rnd.randint(1, 60),
+                            "sdkfileid": sdkfileid}
+        elif msg_type == "voice":
+            msg["voice"] = {"md5sum": hashlib.md5(sdkfileid.encode()).hexdigest(),
+                            "voice_size": self.media_size, "play_length": rnd.randint(1, 60),
+                            "sdkfileid": sdkfileid}
+        elif msg_type == "file":
+            msg["file"] = {"md5sum": hashlib.md5(sdkfileid.encode()).hexdigest(),
+                           "filename": f"report_{seq}.pdf", "fileext": "pdf",
+                           "filesize": self.media_size, "sdkfileid": sdkfileid}
+        elif msg_type == "link":
+            msg["link"] = {"title": f"Sim article {seq}", "description": "simulated link",
+                           "link_url": f"https://example.com/sim/{seq}", "image_url": ""}
+        elif msg_type == "mixed":
+            msg["mixed"] = {"item": [
+                {"type": "text", "content": json.dumps({"content": f"#{seq} 图文混排"}, ensure_ascii=False)},
+                {"type": "image", "content": json.dumps(self._child_media(seq, 0))},
+                {"type": "image", "content": json.dumps(self._child_media(seq, 1))},
+            ]}
+        elif msg_type == "chatrecord":
+            msgtime = msg["msgtime"] // 1000
+            nested = {"title": "嵌套的聊天记录", "item": [
+                {"type": "ChatRecordText", "msgtime": msgtime,
+                 "content": json.dumps({"content": "nested text"})},
+            ]}
+            msg["chatrecord"] = {"title": f"sim_user_{seq % self.users} 的聊天记录", "item": [
+                {"type": "ChatRecordText", "msgtime": msgtime, "from_chatroom": False,
+                 "content": json.dumps({"content": f"#{seq} 合并转发"}, ensure_ascii=False)},
+                {"type": "ChatRecordImage", "msgtime": msgtime, "from_chatroom": False,
+                 "content": json.dumps(self._child_media(seq, 0))},
+                {"type": "ChatRecordFile", "msgtime": msgtime, "from_chatroom": False,
+                 "content": json.dumps(dict(self._child_media(seq, 1), filename=f"record_{seq}.pdf", fileext="pdf"))},
+                {"type": "ChatRecordLink", "msgtime": msgtime, "from_chatroom": False,
+                 "content": json.dumps({"title": f"Sim article {seq}", "description": "simulated link",
+                                        "link_url": f"https://example.com/sim/{seq}", "image_url": ""})},
+                {"type": "ChatRecordChatRecord", "msgtime": msgtime, "from_chatroom": False,
+                 "content": json.dumps(nested, ensure_ascii=False)},
+            ]}
+        return msg
+
+    def _child_media(self, seq: int, index: int) -> dict:
+        """合并转发 / 图文混排中的媒体子项"""
+        sdkfileid = base64.urlsafe_b64encode(f"sim:{seq}.{index}:{self.media_size}".encode()).decode()
+        return {"md5sum": hashlib.md5(sdkfileid.encode()).hexdigest(), "filesize": self.media_size,
+                "sdkfileid": sdkfileid}
+
+    def _encrypt(self, message: dict) -> dict:
+        """生成与真实 chatdata 相同结构的加密条目"""
+        random_key = os.urandom(16).hex().encode()  # 32 字节 ASCII 密钥
+        cipher = AES.new(random_key, AES.MODE_CBC, iv=random_key[:16])
+        body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        return {
+            "publickey_ver": 1,
+            "encrypt_random_key": base64.b64encode(self._rsa.encrypt(random_key)).decode(),
+            "encrypt_chat_msg": base64.b64encode(cipher.encrypt(pad(body, AES.block_size))).decode(),
+        }
+
+    def _media_bytes(self, sdkfileid: str, offset: int, length: int) -> bytes:
+        """确定性地生成媒体内容片段"""
+        block = hashlib.sha256(sdkfileid.encode()).digest() * 64  # 2 KB 模式块
+        start = offset % len(block)
+        repeat = (start + length) // len(block) + 1
+        return (block * repeat)[start:start + length]
+
+    def _simulate_latency(self) -> None:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    # ---- SDK 接口 ----
+
+    def NewSdk(self) -> int:
+        return id(self)
+
+    def Init(self, sdk, corp_id: bytes, secret: bytes) -> int:
+        return SDK_OK
+
+    def DestroySdk(self, sdk) -> None:
+        pass
+
+    def GetChatData(self, sdk, seq: int, limit: int, proxy, passwd, timeout: int, slice_ptr) -> int:
+        self._simulate_latency()
+        limit = max(0, min(int(limit), 1000))
+        upper = min(self.available_seq(), int(seq) + limit)
+        chatdata = []
+        for current in range(int(seq) + 1, upper + 1):
+            message = self.build_message(current)
+            item = {"seq": current, "msgid": message["msgid"]}
+            item.update(self._encrypt(message))
+            chatdata.append(item)
+
+        with self._lock:
+            self.stats["chat_calls"] += 1
+            self.stats["messages"] += len(chatdata)
+        payload = json.dumps({"errcode": 0, "errmsg": "ok", "chatdata": chatdata}).encode()
+        self._fill_slice(slice_ptr, payload)
+        return SDK_OK
+
+    def DecryptData(self, key: bytes, encrypt_msg: bytes, slice_ptr) -> int:
+        try:
+            cipher = AES.new(key, AES.MODE_CBC, iv=key[:16])
+            plain = unpad(cipher.decrypt(base64.b64decode(encrypt_msg)), AES.block_size)
+        except (ValueError, KeyError):
+            return SDK_ERR_DECRYPT
+        self._fill_slice(slice_ptr, plain)
+        return SDK_OK
+
+    def GetMediaData(self, sdk, indexbuf: bytes, sdkfileid: bytes, proxy, passwd, timeout: int, media_ptr) -> int:
+        self._simulate_latency()
+        try:
+            file_id = sdkfileid.decode()
+            _, _, size = base64.urlsafe_b64decode(file_id).decode().split(":")
+            size = int(size)
+            offset = int(indexbuf or b"0")
+        except ValueError:
+            return SDK_ERR_MEDIA
+
+        length = max(0, min(self.chunk_size, size - offset))
+        chunk = self._media_bytes(file_id, offset, length)
+        next_offset = offset + length
+
+        media = media_ptr.contents
+        buffer = ctypes.create_string_buffer(chunk, length or 1)
+        with self._lock:
+            self._buffers[ctypes.addressof(media)] = buffer
+            self.stats["media_calls"] += 1
+            self.stats["media_bytes"] += length
+        media.data = ctypes.cast(buffer, ctypes.c_char_p)
+        media.data_len = length
+        media.outindexbuf = str(next_offset).encode()
+        media.out_len = len(media.outindexbuf)
+        media.is_finish = 1 if next_offset >= size else 0
+        return SDK_OK
+
+    def NewSlice(self):
+        return ctypes.pointer(Slice_t())
+
+    def FreeSlice(self, slice_ptr) -> None:
+        with self._lock:
+            self._buffers.pop(ctypes.addressof(slice_ptr.contents), None)
+
+    def GetContentFromSlice(self, slice_ptr):
+        buffer = self._buffers.get(ctypes.addressof(slice_ptr.contents))
+        return ctypes.addressof(buffer) if buffer is not None else None
+
+    def GetSliceLen(self, slice_ptr) -> int:
+        return slice_ptr.contents.len
+
+    def NewMediaData(self):
+        return ctypes.pointer(MediaData_t())
+
+    def FreeMediaData(self, media_ptr) -> None:
+        with self._lock:
+            self._buffers.pop(ctypes.addressof(media_ptr.contents), None)
+
+    def GetData(self, media_ptr):
+        buffer = self._buffers.get(ctypes.addressof(media_ptr.contents))
+        return ctypes.addressof(buffer) if buffer is not None else None
+
+    def GetDataLen(self, media_ptr) -> int:
+        return media_ptr.contents.data_len
+
+    def GetOutIndexBuf(self, media_ptr) -> bytes:
+        return media_ptr.contents.outindexbuf
+
+    def IsMediaDataFinish(self, media_ptr) -> int:
+        return media_ptr.contents.is_finish
+
+    def _fill_slice(self, slice_ptr, payload: bytes) -> None:
+        buffer = ctypes.create_string_buffer(payload, len(payload) or 1)
+        with self._lock:
+            self._buffers[ctypes.addressof(slice_ptr.contents)] = buffer
+        slice_ptr.contents.buf = ctypes.cast(buffer, ctypes.c_char_p)
+        slice_ptr.contents.len = len(payload)
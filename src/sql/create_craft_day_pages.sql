@@ -0,0 +1,9 @@
+-- 按天分组写入时每天对应的 Craft 子页面，避免重复创建 / 查询
+CREATE TABLE IF NOT EXISTS craft_day_pages (
+    craft_link_id TEXT NOT NULL,
+    craft_document_id TEXT NOT NULL,
+    day TEXT NOT NULL,                       -- 本地日期 YYYY-MM-DD
+    page_id TEXT NOT NULL,                   -- 子页面 block id
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (craft_link_id, craft_document_id, day)
+);
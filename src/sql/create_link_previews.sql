@@ -0,0 +1,12 @@
+-- 链接预览缓存：按规范化 URL 记录标题 / 描述 / 封面图，过期后重新获取
+CREATE TABLE IF NOT EXISTS link_previews (
+    url TEXT PRIMARY KEY,                    -- 规范化后的 URL
+    title TEXT,
+    description TEXT,
+    image_url TEXT,
+    origin TEXT NOT NULL,                    -- payload（消息自带）/ fetch（抓取页面）/ none（抓取失败）
+    fetched_at INTEGER NOT NULL,             -- Unix 秒
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_link_previews_expires ON link_previews(expires_at);
@@ -0,0 +1,12 @@
+-- 媒体对象清单：按内容 sha256 记录已上传到存储后端的对象，重复媒体直接复用
+CREATE TABLE IF NOT EXISTS media_objects (
+    sha256 TEXT PRIMARY KEY,
+    cos_key TEXT NOT NULL,                   -- 对象名（相对存储根）
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,         -- 命中清单、跳过上传的次数
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at DATETIME
+);
+
+-- backend 列（对象所在的存储后端）由迁移 0006_media_objects_backend 添加
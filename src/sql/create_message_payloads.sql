@@ -0,0 +1,16 @@
+-- 消息原始数据旁路表：压缩后的 raw_data，按 unified_messages.id 关联
+CREATE TABLE IF NOT EXISTS message_payloads (
+    message_id INTEGER PRIMARY KEY,          -- unified_messages.id
+    codec TEXT NOT NULL,                     -- zlib / zstd / none
+    dict_id INTEGER,                         -- zstd 共享字典 id (payload_dicts.id)
+    raw_size INTEGER NOT NULL,               -- 压缩前字节数
+    data BLOB NOT NULL
+);
+
+-- zstd 共享字典
+CREATE TABLE IF NOT EXISTS payload_dicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,9 @@
+-- 消息统计汇总：按 天 × 来源 × 发送者 × 类型 计数，写入路径增量维护
+CREATE TABLE IF NOT EXISTS message_stats_daily (
+    day TEXT NOT NULL,                       -- 本地日期 YYYY-MM-DD
+    source TEXT NOT NULL,
+    from_user TEXT NOT NULL,
+    msg_type TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, source, from_user, msg_type)
+) WITHOUT ROWID;
@@ -0,0 +1,7 @@
+-- 消息全文索引：rowid = unified_messages.id，文本由 search.segment() 预分词（CJK 二元组）
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,                                 -- 文本 / 链接消息内容
+    title,                                   -- 链接标题与描述
+    filename,                                -- 文件名
+    tokenize = 'unicode61 remove_diacritics 2'
+);
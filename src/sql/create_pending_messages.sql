@@ -0,0 +1,8 @@
+-- 关闭时未处理完的消息（已落库去重，待重新分发），下次启动时重放
+CREATE TABLE IF NOT EXISTS pending_messages (
+    source TEXT NOT NULL,
+    msg_id TEXT NOT NULL,
+    payload TEXT NOT NULL,                   -- UnifiedMessage JSON
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, msg_id)
+);
@@ -9,5 +9,7 @@ CREATE TABLE IF NOT EXISTS unified_messages (
     created_at TEXT
 );
 
-CREATE INDEX IF NOT EXISTS idx_unified_msg_id ON unified_messages(msg_id);
-CREATE INDEX IF NOT EXISTS idx_unified_source ON unified_messages(source);
\ No newline at end of file
+-- (source, msg_id) 唯一索引由 database.py 中的迁移 0001_unique_source_msg_id 创建
+-- （需先清理历史重复数据）
+-- created_ts / seq 列及 (from_user, created_ts)、(msg_type, created_ts) 索引
+-- 由迁移 0003_epoch_seq_columns 添加并回填
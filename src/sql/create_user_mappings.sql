@@ -12,5 +12,28 @@ CREATE TABLE IF NOT EXISTS user_mappings (
     UNIQUE(wecom_openid)
 );
 
+-- image_max_dimension / image_quality 列由迁移 0005_binding_image_settings 添加
+-- group_mode 列由迁移 0007_binding_group_mode 添加
+
 -- 索引
 CREATE INDEX IF NOT EXISTS idx_wecom_openid ON user_mappings(wecom_openid);
+
+-- 绑定版本号：user_mappings 的任何变更都会递增，供进程内绑定缓存判断是否失效
+CREATE TABLE IF NOT EXISTS binding_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO binding_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_user_mappings_insert AFTER INSERT ON user_mappings
+BEGIN
+    UPDATE binding_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_user_mappings_update AFTER UPDATE ON user_mappings
+BEGIN
+    UPDATE binding_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_user_mappings_delete AFTER DELETE ON user_mappings
+BEGIN
+    UPDATE binding_version SET version = version + 1 WHERE id = 1;
+END;
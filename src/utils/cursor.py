@@ -0,0 +1,22 @@
+"""
+分页游标工具
+
+游标是 keyset 分页中上一页最后一行的排序键，编码为不透明的 urlsafe base64 JSON。
+"""
+import base64
+import json
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """解析分页游标（应包含 size 个排序键），格式错误时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    return values